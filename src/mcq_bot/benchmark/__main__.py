@@ -0,0 +1,89 @@
+import argparse
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from typing import get_args
+
+from mcq_bot.db.connection import STORAGE_PROFILES, get_engine
+from mcq_bot.db.migrations import migrate
+from mcq_bot.settings import Settings, StorageProfileName
+from mcq_bot.utils.logger import setup_logging
+
+from .data import DataSize
+from .runner import compare, run
+
+_logger = logging.getLogger(__name__)
+
+
+def main():
+    setup_logging()
+    # Logging every statement would dominate the timings
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
+
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmark managers and handlers against a database of synthetic data."
+    )
+    arg_parser.add_argument("--users", type=int, default=100)
+    arg_parser.add_argument("--questions", type=int, default=5000)
+    arg_parser.add_argument(
+        "--attempts", type=int, default=500, help="Questions attempted per user"
+    )
+    arg_parser.add_argument(
+        "--iterations", type=int, default=200, help="Calls per benchmark"
+    )
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--only", help="Only run benchmarks whose name contains this"
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="append",
+        choices=get_args(StorageProfileName),
+        help="Storage profile to benchmark (can be repeated). Defaults to every profile, each on its own database.",
+    )
+    arg_parser.add_argument(
+        "--db",
+        type=Path,
+        help="Database file to create (must not exist), with a single --profile. Defaults to a temporary file.",
+    )
+    arg_parser.add_argument(
+        "--out", type=Path, help="File to save the results to, as a JSON list"
+    )
+    args = arg_parser.parse_args()
+
+    profiles: list[StorageProfileName] = args.profile or list(STORAGE_PROFILES)
+    if args.db and len(profiles) > 1:
+        arg_parser.error("--db needs a single --profile")
+
+    size = DataSize(args.users, args.questions, args.attempts)
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in profiles:
+            db_path: Path = args.db or Path(tmp_dir) / f"benchmark_{profile}.db"
+            if db_path.exists():
+                _logger.error("%s already exists", db_path)
+                sys.exit(1)
+
+            # All managers use the default engine
+            Settings.DB_PATH = db_path
+            Settings.DB_PROFILE = profile
+            get_engine.cache_clear()
+            migrate(get_engine())
+
+            _logger.info("Benchmarking the %s storage profile", profile)
+            reports.append(run(size, args.iterations, args.seed, args.only))
+            get_engine().dispose()
+
+    if len(reports) > 1:
+        _logger.info("Comparison:\n%s", "\n".join(compare(reports)))
+
+    if args.out:
+        args.out.write_text(json.dumps(reports, indent=2))
+        _logger.info("Saved results to %s", args.out)
+
+
+if __name__ == "__main__":
+    main()
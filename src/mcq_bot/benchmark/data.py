@@ -0,0 +1,121 @@
+import logging
+import random
+from datetime import UTC, date, datetime, timedelta
+from itertools import batched
+from typing import NamedTuple
+
+from mcq_bot.db.db_types import AnswerType, ProcessedRow, QuestionType
+from mcq_bot.db.schema import Answer, Attempt, User
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.utils import with_session
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+_logger = logging.getLogger(__name__)
+
+# Questions are spread over this many files
+FILES = 10
+# Attempts are spread over this many days before now
+ATTEMPT_DAYS = 30
+
+
+class DataSize(NamedTuple):
+    users: int
+    questions: int
+    # Distinct questions attempted by each user
+    attempts_per_user: int
+
+
+def make_question_rows(start: int, count: int) -> list[ProcessedRow]:
+    """Return `count` synthetic questions with 5 answers each, numbered from `start`."""
+    return [
+        ProcessedRow(
+            question=QuestionType(
+                text=f"Synthetic question {i}: which of the following is correct?",
+                explanation=f"Explanation for synthetic question {i}.",
+            ),
+            answers=[
+                AnswerType(
+                    is_correct=key == i % 5,
+                    key=key,
+                    text=f"Answer {key} to synthetic question {i}",
+                )
+                for key in range(5)
+            ],
+        )
+        for i in range(start, start + count)
+    ]
+
+
+def filename(idx: int) -> str:
+    return f"synthetic_{idx % FILES}.xlsx"
+
+
+class _Generator:
+    @classmethod
+    @with_session
+    def add_users_and_attempts(
+        cls, s: Session, size: DataSize, rng: random.Random
+    ) -> list[int]:
+        """Add users and their attempts (each at a different question, mostly the correct answer), returning the user ids."""
+        answers_by_question: dict[int, list[tuple[int, bool]]] = {}
+        for answer_id, question_id, is_correct in s.execute(
+            select(Answer.id, Answer.question_id, Answer.is_correct)
+        ):
+            answers_by_question.setdefault(question_id, []).append(
+                (answer_id, is_correct)
+            )
+        question_ids = list(answers_by_question)
+
+        user_ids = list(range(1, size.users + 1))
+        exam_dt = date.today() + timedelta(days=90)
+        s.execute(insert(User), [{"id": u, "exam_dt": exam_dt} for u in user_ids])
+
+        # Naive UTC, like the other datetimes in the database
+        now = datetime.now(UTC).replace(tzinfo=None)
+        attempts = []
+        for user_id in user_ids:
+            count = min(size.attempts_per_user, len(question_ids))
+            for question_id in rng.sample(question_ids, count):
+                choices = answers_by_question[question_id]
+                correct = next(a for a, is_correct in choices if is_correct)
+                answer_id = correct if rng.random() < 0.7 else rng.choice(choices)[0]
+                attempt_dt = now - timedelta(
+                    seconds=rng.uniform(0, ATTEMPT_DAYS * 86400)
+                )
+                attempts.append(
+                    {
+                        "user_id": user_id,
+                        "answer_id": answer_id,
+                        "attempt_dt": attempt_dt,
+                    }
+                )
+        for chunk in batched(attempts, 10_000):
+            s.execute(insert(Attempt), list(chunk))
+        s.commit()
+        return user_ids
+
+
+def generate(size: DataSize, seed: int = 0) -> list[int]:
+    """
+    Fill the (empty) database with synthetic questions, users and attempts, returning the user ids.
+
+    Progress counters are rebuilt and the catalog is loaded, as at startup.
+    """
+    rng = random.Random(seed)
+    for start in range(0, size.questions, 1000):
+        rows = make_question_rows(start, min(1000, size.questions - start))
+        for idx in range(FILES):
+            QuestionManager.bulk_add(rows[idx::FILES], filename(idx))
+    user_ids = _Generator.add_users_and_attempts(size, rng)
+    ProgressManager.rebuild()
+    CatalogManager.reload()
+    _logger.info(
+        "Generated %s questions, %s users with %s attempts each",
+        size.questions,
+        size.users,
+        size.attempts_per_user,
+    )
+    return user_ids
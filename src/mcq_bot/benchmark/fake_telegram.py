@@ -0,0 +1,86 @@
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from typing import Any, Iterator
+from unittest import mock
+
+
+class FakeMessage:
+    """Stand-in for a Telethon `Message`, with the attributes and methods used by the handlers."""
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        chat_id: int,
+        text: str,
+        sender_id: int | None = None,
+        buttons: Any = None,
+    ) -> None:
+        self.client = client
+        self.chat_id = chat_id
+        self.text = text
+        self.sender_id = sender_id if sender_id is not None else chat_id
+        self.buttons = buttons
+
+    async def get_sender(self):
+        return SimpleNamespace(id=self.sender_id, username=f"user{self.sender_id}")
+
+    async def reply(self, message: str, **kwargs) -> "FakeMessage":
+        return await self.client.send_message(self.chat_id, message, **kwargs)
+
+    async def respond(self, message: str, **kwargs) -> "FakeMessage":
+        return await self.client.send_message(self.chat_id, message, **kwargs)
+
+    async def edit(self, text: str | None = None, buttons: Any = None, **kwargs):
+        self.client.requests += 1
+        if text is not None:
+            self.text = text
+        self.buttons = buttons
+        return self
+
+
+class FakeCallbackEvent:
+    """Stand-in for a Telethon `CallbackQuery.Event` on a message, with `data_match` already decoded by the handler's filter."""
+
+    def __init__(self, message: FakeMessage, data_match: Any) -> None:
+        self.message = message
+        self.data_match = data_match
+        self.sender_id = message.chat_id
+
+    async def get_message(self) -> FakeMessage:
+        return self.message
+
+    async def answer(self, *args, **kwargs):
+        self.message.client.requests += 1
+
+
+class FakeClient:
+    """Stand-in for the `TelegramClient`, which keeps the messages sent instead of sending them, and counts requests."""
+
+    def __init__(self) -> None:
+        self.sent: list[FakeMessage] = []
+        self.requests = 0
+
+    async def send_message(
+        self, entity: int, message: str = "", buttons: Any = None, **kwargs
+    ) -> FakeMessage:
+        self.requests += 1
+        sent = FakeMessage(self, entity, message, sender_id=0, buttons=buttons)
+        self.sent.append(sent)
+        return sent
+
+    def message(self, user_id: int, text: str) -> FakeMessage:
+        """Return an incoming message from the user."""
+        return FakeMessage(self, user_id, text)
+
+
+# Modules which get the client with `get_client()`
+_CLIENT_USERS = ("mcq_bot.senders.send_question", "mcq_bot.senders.send_nudge")
+
+
+@contextmanager
+def use_fake_client(client: FakeClient) -> Iterator[FakeClient]:
+    """Make the senders use the fake client within the block."""
+    with ExitStack() as stack:
+        for module in _CLIENT_USERS:
+            stack.enter_context(mock.patch(f"{module}.get_client", return_value=client))
+        yield client
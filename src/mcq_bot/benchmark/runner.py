@@ -0,0 +1,317 @@
+import asyncio
+import inspect
+import logging
+import platform
+import random
+import sqlite3
+import subprocess
+from datetime import UTC, datetime, timedelta
+from time import perf_counter
+from typing import Any, Awaitable, Callable, NamedTuple, TypedDict, cast
+
+from mcq_bot.db.connection import get_engine, pragmas
+from mcq_bot.db.query_recorder import record_queries
+from mcq_bot.handlers.admin import handle_admin
+from mcq_bot.handlers.next_question import handle_next_question_callback
+from mcq_bot.handlers.question import handle_question
+from mcq_bot.handlers.question_callback import handle_question_callback
+from mcq_bot.handlers.register import in_unit_of_work
+from mcq_bot.handlers.stats import handle_stats
+from mcq_bot.managers.answer import AnswerManager
+from mcq_bot.managers.attempt import AttemptManager
+from mcq_bot.managers.attempt_writer import attempt_writer
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.schedule import ScheduleManager
+from mcq_bot.managers.stats import StatsManager
+from mcq_bot.managers.user import UserManager
+from mcq_bot.senders.send_nudge import send_nudge
+from mcq_bot.senders.sender_types import AnswerCallback
+from mcq_bot.settings import Settings
+from mcq_bot.utils.dates import local_today
+from telethon.custom import Message
+from telethon.events import StopPropagation
+
+from .data import FILES, DataSize, filename, generate, make_question_rows
+from .fake_telegram import FakeCallbackEvent, FakeClient, use_fake_client
+
+_logger = logging.getLogger(__name__)
+
+
+class BenchmarkResult(TypedDict):
+    name: str
+    iterations: int
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    queries_per_call: float
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Called with the result of `setup` (if any). May return an awaitable, which is awaited as part of the call.
+    call: Callable[..., Any]
+    # Called before each call, outside the timing, returning the call's arguments
+    setup: Callable[[], Awaitable[tuple]] | None = None
+    # Fewer iterations for slow calls, e.g. over all users or questions
+    max_iterations: int | None = None
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    idx = max(
+        0, min(len(sorted_values) - 1, round(percentile / 100 * len(sorted_values)) - 1)
+    )
+    return sorted_values[idx]
+
+
+async def _measure(benchmark: Benchmark, iterations: int) -> BenchmarkResult:
+    if benchmark.max_iterations is not None:
+        iterations = min(iterations, benchmark.max_iterations)
+
+    durations: list[float] = []
+    queries = 0
+    for _ in range(iterations):
+        args = await benchmark.setup() if benchmark.setup else ()
+        with record_queries() as recorded:
+            start = perf_counter()
+            try:
+                result = benchmark.call(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except StopPropagation:
+                pass
+            durations.append(perf_counter() - start)
+        queries += len(recorded)
+
+    durations.sort()
+    return {
+        "name": benchmark.name,
+        "iterations": iterations,
+        "p50_ms": _percentile(durations, 50) * 1000,
+        "p99_ms": _percentile(durations, 99) * 1000,
+        "mean_ms": sum(durations) / iterations * 1000,
+        "queries_per_call": queries / iterations,
+    }
+
+
+def _benchmarks(
+    user_ids: list[int], client: FakeClient, rng: random.Random
+) -> list[Benchmark]:
+    def user() -> int:
+        return rng.choice(user_ids)
+
+    def question_id() -> int:
+        return rng.choice(CatalogManager.question_ids())
+
+    def answer_id() -> int:
+        question = CatalogManager.get_question(question_id())
+        assert question
+        return rng.choice(question.answers).id
+
+    async def answer_callback_setup():
+        """Send a question, and click one of its answers."""
+        user_id = user()
+        question = CatalogManager.get_question(question_id())
+        assert question
+        message = await client.send_message(user_id, question.html)
+        answer = rng.choice(question.answers)
+        callback = AnswerCallback(user_id, answer.id, question.id)
+        return (FakeCallbackEvent(message, callback),)
+
+    async def next_question_setup():
+        user_id = user()
+        message = await client.send_message(user_id, "Nudge")
+        return (FakeCallbackEvent(message, user_id),)
+
+    new_questions = iter(range(10**9, 2 * 10**9, 100))
+
+    return [
+        # Managers
+        Benchmark(
+            "QuestionManager.fetch_random_single",
+            lambda: QuestionManager.fetch_random_single(user()),
+        ),
+        Benchmark(
+            "QuestionManager.fetch_random_single(filename)",
+            lambda: QuestionManager.fetch_random_single(
+                user(), filename(rng.randrange(FILES))
+            ),
+        ),
+        Benchmark(
+            "QuestionManager.fetch_random_id",
+            lambda: QuestionManager.fetch_random_id(user()),
+        ),
+        Benchmark(
+            "QuestionManager.fetch", lambda: QuestionManager.fetch(question_id())
+        ),
+        Benchmark("QuestionManager.count", QuestionManager.count),
+        Benchmark(
+            "QuestionManager.count(filename)",
+            lambda: QuestionManager.count(filename(rng.randrange(FILES))),
+        ),
+        Benchmark(
+            "AnswerManager.get_correct_answer",
+            lambda: AnswerManager.get_correct_answer(question_id()),
+        ),
+        Benchmark(
+            "AttemptManager.get_attempted", lambda: AttemptManager.get_attempted(user())
+        ),
+        Benchmark(
+            "AttemptManager.get_attempted(only_correct)",
+            lambda: AttemptManager.get_attempted(user(), only_correct=True),
+        ),
+        Benchmark(
+            "AttemptManager.get_attempt_stats",
+            lambda: AttemptManager.get_attempt_stats(
+                user(),
+                since_dt=datetime.now(UTC).replace(tzinfo=None) - timedelta(days=1),
+            ),
+        ),
+        Benchmark(
+            "AttemptManager.add_or_update_user_attempt",
+            lambda: AttemptManager.add_or_update_user_attempt(user(), answer_id()),
+        ),
+        Benchmark(
+            "StatsManager.get_user_stats",
+            lambda: StatsManager.get_user_stats(user(), local_today()),
+        ),
+        Benchmark(
+            "StatsManager.get_all_user_stats",
+            lambda: StatsManager.get_all_user_stats(local_today()),
+            max_iterations=20,
+        ),
+        Benchmark("UserManager.get_user", lambda: UserManager.get_user(user())),
+        Benchmark("ScheduleManager.get", lambda: ScheduleManager.get(user())),
+        Benchmark(
+            "ScheduleManager.get_scheduled",
+            ScheduleManager.get_scheduled,
+            max_iterations=20,
+        ),
+        # Handlers, sharing one session per update as registered
+        Benchmark(
+            "handle_question",
+            lambda: in_unit_of_work(handle_question)(
+                cast(Message, client.message(user(), "/question"))
+            ),
+        ),
+        Benchmark(
+            "handle_question_callback",
+            in_unit_of_work(handle_question_callback),
+            setup=answer_callback_setup,
+        ),
+        Benchmark(
+            "handle_next_question_callback",
+            in_unit_of_work(handle_next_question_callback),
+            setup=next_question_setup,
+        ),
+        Benchmark(
+            "handle_stats",
+            lambda: in_unit_of_work(handle_stats)(
+                cast(Message, client.message(user(), "/stats"))
+            ),
+        ),
+        Benchmark(
+            "handle_admin",
+            lambda: in_unit_of_work(handle_admin)(
+                cast(Message, client.message(user(), "/admin"))
+            ),
+            max_iterations=20,
+        ),
+        Benchmark("send_nudge", lambda: send_nudge(user())),
+        # These replace the catalog (and users' question pools), so run them last
+        Benchmark(
+            "QuestionManager.bulk_add(100)",
+            lambda: QuestionManager.bulk_add(
+                make_question_rows(next(new_questions), 100), "benchmark.xlsx"
+            ),
+            max_iterations=20,
+        ),
+        Benchmark("CatalogManager.reload", CatalogManager.reload, max_iterations=20),
+    ]
+
+
+async def run_benchmarks(
+    size: DataSize, iterations: int, seed: int = 0, only: str | None = None
+) -> list[BenchmarkResult]:
+    """
+    Generate synthetic data of the given size in the current (empty) database, then time each benchmark over `iterations` calls.
+
+    only: Only run benchmarks whose name contains this.
+    """
+    rng = random.Random(seed)
+    user_ids = generate(size, seed)
+
+    results: list[BenchmarkResult] = []
+    # Attempts are written in the background, as in the bot
+    attempt_writer.start()
+    with use_fake_client(FakeClient()) as client:
+        for benchmark in _benchmarks(user_ids, client, rng):
+            if only and only not in benchmark.name:
+                continue
+            result = await _measure(benchmark, iterations)
+            _logger.info(
+                "%-45s p50 %8.3fms  p99 %8.3fms  %5.1f queries/call",
+                result["name"],
+                result["p50_ms"],
+                result["p99_ms"],
+                result["queries_per_call"],
+            )
+            results.append(result)
+    await attempt_writer.stop()
+    return results
+
+
+def environment() -> dict[str, str | None]:
+    """Describe where the benchmarks ran, so results can be compared across commits."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def run(
+    size: DataSize, iterations: int, seed: int = 0, only: str | None = None
+) -> dict[str, Any]:
+    """Run the benchmarks on the default engine, returning the results with their configuration (including the storage profile and the PRAGMAs in effect), as saved to JSON."""
+    results = asyncio.run(run_benchmarks(size, iterations, seed, only))
+    return {
+        "config": {
+            **size._asdict(),
+            "iterations": iterations,
+            "seed": seed,
+            "profile": Settings.DB_PROFILE,
+            "pragmas": pragmas(get_engine()),
+        },
+        "environment": environment(),
+        "results": results,
+    }
+
+
+def compare(reports: list[dict[str, Any]]) -> list[str]:
+    """Return a table of each benchmark's p50 latency under each report's storage profile, one line per benchmark."""
+    profiles = [report["config"]["profile"] for report in reports]
+    p50s: dict[str, dict[str, float]] = {}
+    for profile, report in zip(profiles, reports):
+        for result in report["results"]:
+            p50s.setdefault(result["name"], {})[profile] = result["p50_ms"]
+
+    lines = [f"{'p50 (ms)':45}" + "".join(f"{p:>12}" for p in profiles)]
+    for name, by_profile in p50s.items():
+        lines.append(
+            f"{name:45}"
+            + "".join(f"{by_profile.get(p, float('nan')):12.3f}" for p in profiles)
+        )
+    return lines
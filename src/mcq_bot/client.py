@@ -3,11 +3,21 @@ from functools import cache
 from telethon import TelegramClient
 
 from mcq_bot.settings import Settings
+from mcq_bot.utils.metrics import TELEGRAM_REQUEST_SECONDS
+
+
+class InstrumentedTelegramClient(TelegramClient):
+    """TelegramClient which records the time taken by each request to Telegram (every high-level method such as `send_message` goes through `__call__`)."""
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        name = "batch" if isinstance(request, list) else type(request).__name__
+        with TELEGRAM_REQUEST_SECONDS.time(name):
+            return await super().__call__(request, ordered, flood_sleep_threshold)
 
 
 @cache
 def get_client():
-    client = TelegramClient(
+    client = InstrumentedTelegramClient(
         Settings.SESSION_FILE,
         Settings.API_ID,
         Settings.API_HASH.get_secret_value(),
@@ -1,35 +1,128 @@
 import logging
-from functools import cache
+from functools import cache, partial
 from pathlib import Path
+from typing import Any, Literal, NamedTuple
 
 from sqlalchemy import event
 from sqlalchemy.engine import URL, Engine, create_engine
 from sqlalchemy.engine.interfaces import DBAPIConnection
+from sqlalchemy.pool import StaticPool
 
-from mcq_bot.settings import Settings
+from mcq_bot.settings import Settings, StorageProfileName
 
 logger = logging.getLogger(__file__)
 
 
+class StorageProfile(NamedTuple):
+    """SQLite and connection pool settings. See https://www.sqlite.org/pragma.html for the PRAGMAs."""
+
+    # FULL syncs the WAL on every commit. NORMAL syncs only at checkpoints, so the last commits can be lost on power failure (but the database is never corrupted).
+    synchronous: Literal["FULL", "NORMAL"]
+    # Page cache per connection, in KiB
+    cache_size_kib: int
+    # Bytes of the database file read through memory mapping instead of read() calls (0 to disable)
+    mmap_size: int
+    # Where temporary tables and indices (e.g. for ORDER BY, GROUP BY) are kept
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"]
+    # How long to wait for another connection's lock before failing with "database is locked"
+    busy_timeout_ms: int
+    # Connections kept open, and extra ones allowed under load. Ignored for in-memory databases, which share one connection.
+    pool_size: int
+    max_overflow: int
+    # Compiled SQL kept by SQLAlchemy per engine, and prepared statements kept by sqlite3 per connection
+    query_cache_size: int
+    cached_statements: int
+
+
+STORAGE_PROFILES: dict[StorageProfileName, StorageProfile] = {
+    # Every commit is on disk before it returns
+    "durable": StorageProfile(
+        synchronous="FULL",
+        cache_size_kib=16 * 1024,
+        mmap_size=0,
+        temp_store="DEFAULT",
+        busy_timeout_ms=5000,
+        pool_size=5,
+        max_overflow=10,
+        query_cache_size=500,
+        cached_statements=128,
+    ),
+    # Fewer syncs, and more of the database kept in memory
+    "throughput": StorageProfile(
+        synchronous="NORMAL",
+        cache_size_kib=64 * 1024,
+        mmap_size=256 * 1024 * 1024,
+        temp_store="MEMORY",
+        busy_timeout_ms=10000,
+        pool_size=5,
+        max_overflow=10,
+        query_cache_size=1000,
+        cached_statements=256,
+    ),
+}
+
+# Reported by `pragmas`
+_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "foreign_keys",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+)
+
+
 @cache
-def get_engine(db_path: Path | None = None):
-    connection_url = URL.create(
-        "sqlite",
-        database=str(db_path) if db_path else str(Settings.DB_PATH),
-    )
-    engine = create_engine(connection_url)
+def get_engine(db_path: Path | None = None, profile: StorageProfileName | None = None):
+    """Return the engine for the database (Settings.DB_PATH if None), configured with the named storage profile (Settings.DB_PROFILE if None)."""
+    database = str(db_path) if db_path else str(Settings.DB_PATH)
+    storage = STORAGE_PROFILES[profile or Settings.DB_PROFILE]
+    connection_url = URL.create("sqlite", database=database)
+    connect_args: dict[str, Any] = {"cached_statements": storage.cached_statements}
+    if database == ":memory:":
+        # Share the one in-memory database with the db thread (see `run_db`), instead of one per thread
+        engine = create_engine(
+            connection_url,
+            poolclass=StaticPool,
+            connect_args={**connect_args, "check_same_thread": False},
+            query_cache_size=storage.query_cache_size,
+        )
+    else:
+        engine = create_engine(
+            connection_url,
+            connect_args=connect_args,
+            pool_size=storage.pool_size,
+            max_overflow=storage.max_overflow,
+            query_cache_size=storage.query_cache_size,
+        )
+    event.listen(engine, "connect", partial(set_sqlite_pragma, storage))
     logger.info("Connected to db at %s", connection_url)
     return engine
 
 
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection: DBAPIConnection, _):
+def set_sqlite_pragma(storage: StorageProfile, dbapi_connection: DBAPIConnection, _):
     """
-    Run all sqlite3 connections in WAL mode; reading and writing can be concurrent. See https://www.sqlite.org/wal.html for more info.
+    Run all sqlite3 connections in WAL mode; reading and writing can be concurrent. See https://www.sqlite.org/wal.html for more info. The other PRAGMAs are set from the engine's storage profile.
 
     `PoolEvents.connect()`: https://docs.sqlalchemy.org/en/14/core/events.html#sqlalchemy.events.PoolEvents.connect
     """
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA synchronous={storage.synchronous}")
+    # Negative sizes are in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{storage.cache_size_kib}")
+    cursor.execute(f"PRAGMA mmap_size={storage.mmap_size}")
+    cursor.execute(f"PRAGMA temp_store={storage.temp_store}")
+    cursor.execute(f"PRAGMA busy_timeout={storage.busy_timeout_ms}")
     cursor.close()
+
+
+def pragmas(engine: Engine) -> dict[str, Any]:
+    """Return the PRAGMAs in effect on a connection of the engine, e.g. to check that the storage profile was applied."""
+    with engine.connect() as conn:
+        return {
+            pragma: conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in _PRAGMAS
+        }
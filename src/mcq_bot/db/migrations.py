@@ -0,0 +1,68 @@
+import logging
+from typing import Callable
+
+from sqlalchemy import Connection, Engine, inspect
+
+from .schema import Base
+
+_logger = logging.getLogger(__name__)
+
+type Migration = Callable[[Connection], None]
+
+
+def _add_lookup_indexes(conn: Connection):
+    """Add indexes for a user's attempts by time, a question's correct answer, and a file's questions."""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_attempt_user_id_attempt_dt ON attempt (user_id, attempt_dt)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_answer_question_id_is_correct ON answer (question_id, is_correct)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_question_filename_id ON question (filename_id)"
+    )
+
+
+def _add_spaced_repetition(conn: Connection):
+    """Add the opt-in flag for spaced repetition to users (the review table is new, so it is created with its index)."""
+    columns = {c["name"] for c in inspect(conn).get_columns("user")}
+    # SQLite has no ADD COLUMN IF NOT EXISTS
+    if "spaced_repetition" not in columns:
+        conn.exec_driver_sql(
+            'ALTER TABLE "user" ADD COLUMN spaced_repetition BOOLEAN DEFAULT 0 NOT NULL'
+        )
+
+
+# Append only: migration N (1-indexed) brings a database from version N-1 to N. Versions are stored in `PRAGMA user_version`.
+MIGRATIONS: list[Migration] = [
+    _add_lookup_indexes,
+    _add_spaced_repetition,
+]
+
+
+def get_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar_one()
+
+
+def migrate(engine: Engine) -> int:
+    """
+    Create any missing tables, then bring an existing database up to date by running the migrations it hasn't had yet. Returns the new version.
+
+    A new database already matches the schema, so it is just marked as the latest version.
+    """
+    with engine.begin() as conn:
+        version = get_version(conn)
+        is_new = version == 0 and not inspect(conn).get_table_names()
+        Base.metadata.create_all(conn)
+
+        if is_new:
+            version = len(MIGRATIONS)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            _logger.info("Created db at version %s", version)
+            return version
+
+        for version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            _logger.info("Migrated db to version %s: %s", version, migration.__doc__)
+        return version
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Iterator
 
 from mcq_bot.db.db_types import ProcessedRow
 
@@ -12,3 +13,11 @@ class BaseParser(ABC):
 
         Also strips out whitespace from question and answer text.
         """
+
+    def iter_parse(self, path: Path) -> Iterator[ProcessedRow]:
+        """
+        Yield the processed rows of a file one at a time.
+
+        Parsers that can stream their input should override this, so that the whole file never has to be held in memory. By default, this just iterates over `parse`.
+        """
+        yield from self.parse(path)
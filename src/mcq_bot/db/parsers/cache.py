@@ -0,0 +1,91 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Iterable, TypedDict
+
+from mcq_bot.db.db_types import ProcessedRow
+
+_logger = logging.getLogger(__name__)
+
+
+class CacheStats(TypedDict):
+    hits: int
+    misses: int
+
+
+class ParseCache:
+    """
+    On-disk cache of rows parsed by an LLM, in a SQLite file separate from the main database.
+
+    Entries are keyed by a hash of the formatted row, the model and the prompt, so changing either of the latter invalidates them. Only successful parses are stored.
+
+    It also records which rows each request in an offline batch file contains (see `OpenAiParser.batch_requests`), so the results can be stored when they come back.
+
+    The file can be shared by several processes (e.g. the parsing pool in `add_questions`).
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parsed_row (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_request (custom_id TEXT PRIMARY KEY, keys TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(formatted_row: dict[str, str], model: str, prompt: str) -> str:
+        """Return the cache key for a row sent to `model` with `prompt`."""
+        payload = json.dumps([formatted_row, model, prompt], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> ProcessedRow | None:
+        """Return the cached row for the key (counting a hit), or None (counting a miss)."""
+        result = self._conn.execute(
+            "SELECT value FROM parsed_row WHERE key = ?", (key,)
+        ).fetchone()
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ProcessedRow.model_validate_json(result[0])
+
+    def set(self, key: str, row: ProcessedRow):
+        self.set_many([(key, row)])
+
+    def set_many(self, items: Iterable[tuple[str, ProcessedRow]]):
+        """Store several rows by key, in one transaction."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO parsed_row (key, value) VALUES (?, ?)",
+            ((key, row.model_dump_json()) for key, row in items),
+        )
+        self._conn.commit()
+
+    def add_batch(self, custom_id: str, keys: list[str]):
+        """Record the keys of the rows in a batch file request, in order."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO batch_request (custom_id, keys) VALUES (?, ?)",
+            (custom_id, json.dumps(keys)),
+        )
+        self._conn.commit()
+
+    def get_batch(self, custom_id: str) -> list[str] | None:
+        """Return the keys of the rows in a batch file request, or None if it is unknown."""
+        result = self._conn.execute(
+            "SELECT keys FROM batch_request WHERE custom_id = ?", (custom_id,)
+        ).fetchone()
+        return json.loads(result[0]) if result else None
+
+    def stats(self) -> CacheStats:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._conn.close()
@@ -1,10 +1,11 @@
+import re
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Iterator, NamedTuple, Self
 
 from openpyxl import load_workbook
-from openpyxl.cell import Cell
 
 from mcq_bot.db.db_types import (
+    ANSWER_LETTER_TO_INT,
     VALID_ANSWER_LETTERS,
     AnswerKeys,
     AnswerType,
@@ -16,6 +17,66 @@ from mcq_bot.db.db_types import (
 from .base import BaseParser
 from .utils import validate_only_one_correct_answer
 
+type Row = tuple[Any, ...]
+
+_QUESTION_HEADER = re.compile(r"^(questions?|question text|qn|stem)$")
+_OPTION_HEADER = re.compile(r"^(?:option|choice|answer)?\s*\(?([a-e])\)?$")
+_ANSWER_HEADER = re.compile(r"^(correct )?(answer|ans|key)( key)?$")
+_EXPLANATION_HEADER = re.compile(r"^(explanations?|rationale)$")
+
+
+class ColumnMapping(NamedTuple):
+    """Column indices of the fields in a sheet's rows."""
+
+    question: int
+    # Index of the column for each answer letter, or None if there is no such column
+    answers: tuple[int | None, ...]
+    answer: int
+    explanation: int | None
+
+    @property
+    def width(self) -> int:
+        """Minimum number of columns in a row."""
+        columns = (self.question, *self.answers, self.answer, self.explanation)
+        return max(i for i in columns if i is not None) + 1
+
+    @classmethod
+    def infer(cls, headers: Row) -> Self | None:
+        """
+        Infer the mapping from the header row, e.g. "Question", "A".."E" (or "Option A"), "Answer" and "Explanation" (case-insensitive).
+
+        Returns None if there is no question or answer column, or fewer than 2 answer option columns.
+        """
+        question = answer = explanation = None
+        answers: list[int | None] = [None] * len(VALID_ANSWER_LETTERS)
+
+        for idx, header in enumerate(headers):
+            name = " ".join(str(header).lower().split()) if header else ""
+            option = _OPTION_HEADER.match(name)
+            letter = ANSWER_LETTER_TO_INT[option[1].upper()] if option else None  # type: ignore[index]
+            if _QUESTION_HEADER.match(name) and question is None:
+                question = idx
+            elif letter is not None and answers[letter] is None:
+                answers[letter] = idx
+            elif _ANSWER_HEADER.match(name) and answer is None:
+                answer = idx
+            elif _EXPLANATION_HEADER.match(name) and explanation is None:
+                explanation = idx
+
+        if (
+            question is None
+            or answer is None
+            or sum(a is not None for a in answers) < 2
+        ):
+            return None
+        return cls(question, tuple(answers), answer, explanation)
+
+
+# The format expected by `ExcelParser`
+DEFAULT_COLUMNS = ColumnMapping(
+    question=1, answers=(2, 3, 4, 5, 6), answer=7, explanation=8
+)
+
 
 class ExcelParser(BaseParser):
     """
@@ -27,23 +88,31 @@ class ExcelParser(BaseParser):
     2-6: Answers
     7: Answer
     8: Explanation
+
+    The workbook is opened read-only and rows are read as plain values, so `iter_parse` streams a file of any size in constant memory.
     """
 
-    def _extract_question(self, row: Tuple[Cell, ...]):
+    def _extract_question(self, row: Row, columns: ColumnMapping):
+        explanation = (
+            row[columns.explanation] if columns.explanation is not None else ""
+        )
         question = QuestionType(
-            text=str(row[1].value).strip(),
-            explanation=str(row[8].value).strip(),
+            text=str(row[columns.question]).strip(),
+            explanation=str(explanation).strip(),
         )
         return question
 
     def _process_row(
-        self, row: Tuple[Cell, ...], answer_keys: list[AnswerKeys]
+        self,
+        row: Row,
+        answer_keys: list[AnswerKeys],
+        columns: ColumnMapping = DEFAULT_COLUMNS,
     ) -> ProcessedRow:
         """
         Process a single row and return the question and the answer.
         """
-        question = self._extract_question(row)
-        correct_letter = str(row[7].value).upper().strip()
+        question = self._extract_question(row, columns)
+        correct_letter = str(row[columns.answer]).upper().strip()
 
         if not correct_letter or correct_letter not in VALID_ANSWER_LETTERS:
             raise NoCorrectAnswerException(
@@ -52,8 +121,9 @@ class ExcelParser(BaseParser):
 
         answers: list[AnswerType] = []
 
-        for idx, cell in enumerate(row[2:7]):
-            val = str(cell.value).strip() if cell.value else None
+        for idx, column in enumerate(columns.answers):
+            cell = row[column] if column is not None else None
+            val = str(cell).strip() if cell else None
 
             # If the cell is blank there is no answer for that index
             if not val:
@@ -78,25 +148,37 @@ class ExcelParser(BaseParser):
 
         return ProcessedRow(question=question, answers=answers)
 
-    def parse(self, path: Path) -> list[ProcessedRow]:
+    def iter_parse(self, path: Path) -> Iterator[ProcessedRow]:
         """
-        Given an excel file containing questions, return the questions, explanations and answers.
+        Given an excel file containing questions, lazily yield the questions, explanations and answers row by row.
         """
 
-        wb = load_workbook(path)
-        sheet = wb[wb.sheetnames[0]]
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = wb[wb.sheetnames[0]]
+
+            for idx, r in enumerate(sheet.iter_rows(min_row=2, values_only=True)):
+                r = pad_row(r, DEFAULT_COLUMNS.width)
+                try:
+                    # Skip rows without questions
+                    if r[1] is None:
+                        continue
+                    yield self._process_row(r, VALID_ANSWER_LETTERS)
+                except NoCorrectAnswerException as e:
+                    raise NoCorrectAnswerException(
+                        f"Error while processing row {idx + 2} for file {path}"
+                    ) from e
+        finally:
+            # Read-only workbooks keep the file open until closed
+            wb.close()
 
-        processed_rows: list[ProcessedRow] = []
+    def parse(self, path: Path) -> list[ProcessedRow]:
+        """
+        Given an excel file containing questions, return the questions, explanations and answers.
+        """
+        return list(self.iter_parse(path))
 
-        for idx, r in enumerate(sheet.iter_rows(min_row=2)):
-            try:
-                # Skip rows without questions
-                if r[1].value is None:
-                    continue
-                processed_rows.append(self._process_row(r, VALID_ANSWER_LETTERS))
-            except NoCorrectAnswerException as e:
-                raise NoCorrectAnswerException(
-                    f"Error while processing row {idx + 2} for file {path}"
-                ) from e
 
-        return processed_rows
+def pad_row(row: Row, width: int) -> Row:
+    """Pad a row with empty cells to at least `width` columns, as read-only sheets may omit trailing empty cells."""
+    return row + (None,) * (width - len(row)) if len(row) < width else row
@@ -0,0 +1,79 @@
+import logging
+from pathlib import Path
+from typing import Any, Iterator
+
+from mcq_bot.db.db_types import (
+    VALID_ANSWER_LETTERS,
+    NoCorrectAnswerException,
+    ProcessedRow,
+)
+from mcq_bot.db.parsers.excel import ColumnMapping, ExcelParser, Row, pad_row
+from mcq_bot.db.parsers.openai import OpenAiParser
+
+_logger = logging.getLogger(__name__)
+
+
+class HybridParser(OpenAiParser):
+    """
+    Parses an excel file by inferring the columns from its headers (see `ColumnMapping.infer`), falling back to the LLM only for rows that can't be parsed that way.
+
+    Rows are parsed locally like `ExcelParser`, and must have exactly one correct answer. Rows without a question are skipped. If the columns can't be inferred, every row is sent to the LLM, as with `OpenAiParser`.
+
+    Note: Use a new instance for each file.
+    """
+
+    def _parse_locally(
+        self, path: Path
+    ) -> tuple[list[ProcessedRow | None], list[dict[str, str]]]:
+        """Return the rows parsed locally (None for rows which need the LLM), and the formatted rows for the LLM, both in sheet order."""
+        headers, rows = self._read_sheet(path)
+        columns = ColumnMapping.infer(headers)
+        if columns is None:
+            _logger.info(
+                "Could not infer the columns of %s from its headers", path.name
+            )
+
+        local: list[ProcessedRow | None] = []
+        fallback: list[dict[str, str]] = []
+        for row in rows:
+            if columns is not None:
+                row = pad_row(row, columns.width)
+                # Skip rows without questions
+                if row[columns.question] is None:
+                    continue
+            result = self._parse_row_locally(row, columns)
+            local.append(result)
+            if result is None:
+                fallback.append(self._format_row_to_dict(row, headers))
+
+        _logger.info(
+            "Parsed %s rows of %s locally, %s need the LLM",
+            len(local) - len(fallback),
+            path.name,
+            len(fallback),
+        )
+        return local, fallback
+
+    def _parse_row_locally(
+        self, row: Row, columns: ColumnMapping | None
+    ) -> ProcessedRow | None:
+        if columns is None:
+            return None
+        try:
+            return ExcelParser()._process_row(row, VALID_ANSWER_LETTERS, columns)
+        except (NoCorrectAnswerException, ValueError):
+            return None
+
+    def batch_requests(self, path: Path) -> Iterator[dict[str, Any]]:
+        """Yield Batch API requests for the rows that can't be parsed locally (see `OpenAiParser.batch_requests`)."""
+        _, fallback = self._parse_locally(path)
+        yield from self._batch_requests(fallback)
+
+    async def _parse(self, path: Path) -> list[ProcessedRow]:
+        local, fallback = self._parse_locally(path)
+        llm_results = iter(
+            await self._parse_rows(fallback, path.name) if fallback else []
+        )
+        results = [r if r is not None else next(llm_results) for r in local]
+        # In sheet order, without the rows that failed
+        return [r for r in results if r is not None]
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+_logger = logging.getLogger(__name__)
+
+
+class AimdLimiter:
+    """
+    Concurrency limit that adapts to the API: additive increase, multiplicative decrease (AIMD).
+
+    Each request that completes within `latency_target` seconds raises the limit by 1/limit (about +1 per round of requests). A rate limit, timeout or slow response multiplies it by `decrease_factor`, at most once per `cooldown` seconds so a burst of failures from the same round only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        latency_target: float = 30,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1,
+    ) -> None:
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._loop = asyncio.get_running_loop()
+        self._last_decrease = -cooldown
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait until there is room under the current limit, and hold a slot for the duration of the block."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.on_overload()
+            return
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_overload(self):
+        now = self._loop.time()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        _logger.info("Reduced concurrency to %s", int(self.limit))
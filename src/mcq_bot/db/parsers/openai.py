@@ -1,139 +1,423 @@
 import asyncio
+import hashlib
 import json
 import logging
+import random
+from itertools import batched
 from pathlib import Path
+from typing import Any, Iterator
 
-from openai import AsyncOpenAI
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    ContentFilterFinishReasonError,
+    InternalServerError,
+    LengthFinishReasonError,
+    RateLimitError,
+)
 from openpyxl import load_workbook
-from openpyxl.cell import Cell
+from pydantic import BaseModel, ValidationError
 from tqdm import tqdm
 
 from mcq_bot.db.db_types import ProcessedRow
 from mcq_bot.db.parsers.base import BaseParser
+from mcq_bot.db.parsers.cache import ParseCache
+from mcq_bot.db.parsers.limiter import AimdLimiter
 from mcq_bot.settings import Settings
 
 _logger = logging.getLogger(__name__)
 
+# Errors worth retrying the same request for
+_TRANSIENT_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+# Errors caused by the rows in a request (e.g. too many for the output limit, or one the model can't parse), which would happen again if it were resent as is
+_BATCH_ERRORS = (
+    LengthFinishReasonError,
+    ContentFilterFinishReasonError,
+    ValidationError,
+)
+
+type Row = tuple[Any, ...]
+# (cache key, formatted row)
+type PendingRow = tuple[str, dict[str, str]]
+
 
 class LlmFailedToParseError(Exception):
-    """LLM failed to parse the question."""
+    """LLM failed to parse the question (or a request's rows), in a way that would happen again if they were resent together."""
+
+
+class ParsedBatchRow(BaseModel):
+    index: int
+    row: ProcessedRow | None
+
+
+class ParsedBatch(BaseModel):
+    """Response schema for a request containing several rows."""
+
+    rows: list[ParsedBatchRow]
+
+
+def _strict_json_schema(schema: Any) -> Any:
+    """Return the JSON schema with extra properties disallowed on every object, as structured outputs require in strict mode."""
+    if isinstance(schema, list):
+        return [_strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    strict = {key: _strict_json_schema(value) for key, value in schema.items()}
+    if strict.get("type") == "object":
+        strict["additionalProperties"] = False
+    return strict
+
+
+def response_format(model: type[BaseModel]) -> dict[str, Any]:
+    """Return the `response_format` of a Chat Completions request (e.g. for the Batch API) whose response must match the model."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "schema": _strict_json_schema(model.model_json_schema()),
+            "strict": True,
+        },
+    }
 
 
 class OpenAiParser(BaseParser):
     """
     Parses an excel file containing questions, answers and explanations in each row.
 
-    Each row is passed as a JSON dict to the LLM, with the keys being the cells in the first row of the file (the headers).
+    Each row is passed as a JSON dict to the LLM, with the keys being the cells in the first row of the file (the headers). Rows are sent `batch_size` at a time, each tagged with its index in the request.
 
     As a result, the format can be variable.
 
+    Parsed rows are cached on disk (see `ParseCache`), so unchanged rows are not sent again on later runs, and identical rows within a file are only sent once.
+
+    Requests are retried with jittered exponential backoff on transient errors, and their concurrency adapts to rate limits and latency (see `AimdLimiter`). Rows missing from a batch response are retried on their own. A batch the LLM can't parse as a whole (e.g. it hits the output limit, or one row fails validation) is split in half until the rows that fail are on their own. A batch whose request still fails after retrying transient errors is not split up. The output is in sheet order.
+
+    Instead of calling the API, rows can also be written to a file for the Batch API with `batch_requests`, and the results file stored in the cache with `ingest_batch_results`. Parsing the file afterwards then only sends the rows that are still missing.
+
     Note: Use a new instance for each file.
     """
 
     MODEL = "gpt-4o-mini"
-    USER_MESSAGE_PREFIX = "Parse this dictionary containing questions, answer options, answers and explanations into the provided schema. Don't repeat the answer choices in the question text. If the question is empty, you should refuse the request."
+    USER_MESSAGE_PREFIX = "Parse each row in this list of dictionaries containing questions, answer options, answers and explanations into the provided schema, keeping its index. Don't repeat the answer choices in the question text. If the question in a row is empty, set that row to null."
 
-    def __init__(self, concurrent_requests: int = 10) -> None:
+    def __init__(
+        self,
+        concurrent_requests: int = 10,
+        client: AsyncOpenAI | None = None,
+        cache: ParseCache | None = None,
+        batch_size: int = 10,
+        max_attempts: int = 5,
+        retry_delay: float = 1,
+    ) -> None:
         """
         Return an OpenAIParser.
 
-        concurrent_requests: Max simultaneous/pending requests to OpenAI.
+        concurrent_requests: Max simultaneous requests to OpenAI. Requests start at half of this, adapting to the API's responses.
+        client: OpenAI client to use. Defaults to one using Settings.OPENAI_API_KEY.
+        cache: Cache of parsed rows. Defaults to one at Settings.OPENAI_CACHE_PATH.
+        batch_size: Rows sent per request.
+        max_attempts: Attempts per request on transient errors (e.g. rate limits).
+        retry_delay: Base delay in seconds before retrying, doubled on each attempt.
         """
-        self.client = AsyncOpenAI(api_key=Settings.OPENAI_API_KEY.get_secret_value())
-        self.queue: asyncio.Queue[dict[str, str]] = asyncio.Queue()
+        self.client = client or AsyncOpenAI(
+            api_key=Settings.OPENAI_API_KEY.get_secret_value(),
+            # Retried by `_request_batch`, so rate limits reach the `AimdLimiter`
+            max_retries=0,
+        )
+        self.cache = cache or ParseCache(Settings.OPENAI_CACHE_PATH)
         self.concurrent_requests = concurrent_requests
-        self.raw_results: list[ProcessedRow | None] = []
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
 
-    def _format_row_to_dict(
-        self, row: tuple[Cell, ...], headers: tuple[Cell, ...]
-    ) -> dict[str, str]:
+    def _format_row_to_dict(self, row: Row, headers: Row) -> dict[str, str]:
         """
         Add headers to the row and returns a dict with header columns as the keys and the row values as the value.
 
         If there are less headers than rows, uses "Unnamed column {index of row}" as the key.
         """
         result: dict[str, str] = {}
-        for idx, r in enumerate(row):
-            if len(headers) >= idx and (header_val := headers[idx].value):
+        for idx, value in enumerate(row):
+            if idx < len(headers) and (header_val := headers[idx]):
                 key = str(header_val)
             else:
                 key = f"Unnamed column {idx}"
-            result[key] = str(r.value) if r.value else "Empty"
+            result[key] = str(value) if value else "Empty"
         return result
 
-    async def _llm_parse_row(
-        self, formatted_row: dict[str, str]
-    ) -> ProcessedRow | None:
-        """Try to parse an Openpyxl row with the llm. Returns None if failed."""
+    def _read_sheet(self, path: Path) -> tuple[Row, list[Row]]:
+        """Return the header row and the other rows of the first sheet, in order, skipping blank rows."""
+        wb = load_workbook(path, read_only=True, data_only=True)
         try:
-            completion = await self.client.beta.chat.completions.parse(
-                model=self.MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {
-                        "role": "user",
-                        "content": f"{json.dumps(formatted_row, indent=2)}\n{self.USER_MESSAGE_PREFIX}",
-                    },
-                ],
-                response_format=ProcessedRow,
-            )
-            message = completion.choices[0].message
-            parsed = message.parsed
+            sheet = wb[wb.sheetnames[0]]
+            rows = sheet.iter_rows(values_only=True)
+            headers = next(rows, ())
+            return headers, [
+                row for row in rows if any(value is not None for value in row)
+            ]
+        finally:
+            wb.close()
 
-            if parsed and message.parsed:
-                return message.parsed
-            else:
-                _logger.error(
-                    "Failed to parse row:\n%s\n\n%s",
-                    json.dumps(formatted_row, indent=2),
-                    message.refusal,
+    def _read_rows(self, path: Path) -> list[dict[str, str]]:
+        """Return the formatted rows of the first sheet, in order, skipping blank rows."""
+        headers, rows = self._read_sheet(path)
+        return [self._format_row_to_dict(row, headers) for row in rows]
+
+    def _messages(self, batch: tuple[PendingRow, ...]) -> list[dict[str, str]]:
+        rows = [{"index": idx, "row": row} for idx, (_, row) in enumerate(batch)]
+        return [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {
+                "role": "user",
+                "content": f"{json.dumps(rows, indent=2)}\n{self.USER_MESSAGE_PREFIX}",
+            },
+        ]
+
+    async def _request_batch(
+        self, batch: tuple[PendingRow, ...], limiter: AimdLimiter
+    ) -> dict[int, ProcessedRow | None] | None:
+        """
+        Send a batch of rows to the LLM, retrying transient errors. Returns the parsed rows by index in the batch, or None if the request failed.
+
+        Raises LlmFailedToParseError if the LLM couldn't parse the rows together (see `_BATCH_ERRORS`), or refused to.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.max_attempts + 1):
+            async with limiter.slot():
+                start = loop.time()
+                try:
+                    completion = await self.client.beta.chat.completions.parse(
+                        model=self.MODEL,
+                        messages=self._messages(batch),  # type: ignore[arg-type]
+                        response_format=ParsedBatch,
+                    )
+                except _BATCH_ERRORS as e:
+                    raise LlmFailedToParseError(
+                        f"Failed to parse {len(batch)} rows"
+                    ) from e
+                except _TRANSIENT_ERRORS as e:
+                    if isinstance(e, (RateLimitError, APITimeoutError)):
+                        limiter.on_overload()
+                    _logger.warning(
+                        "Request for %s rows failed (attempt %s/%s): %r",
+                        len(batch),
+                        attempt,
+                        self.max_attempts,
+                        e,
+                    )
+                except Exception:
+                    _logger.exception(
+                        "Failed to send %s rows for processing", len(batch)
+                    )
+                    return None
+                else:
+                    limiter.on_success(loop.time() - start)
+                    message = completion.choices[0].message
+                    if message.parsed is None:
+                        raise LlmFailedToParseError(
+                            f"LLM refused to parse {len(batch)} rows: {message.refusal}"
+                        )
+                    return {r.index: r.row for r in message.parsed.rows}
+
+            if attempt < self.max_attempts:
+                # Full jitter, so retries from the same burst don't line up again
+                await asyncio.sleep(
+                    random.uniform(0, self.retry_delay * 2 ** (attempt - 1))
                 )
-                return None
+        return None
 
-        except Exception:
-            _logger.exception(
-                "Failed to send row for processing:\n%s\n\n%s",
-                json.dumps(formatted_row, indent=2),
+    async def _parse_batch(
+        self,
+        batch: tuple[PendingRow, ...],
+        limiter: AimdLimiter,
+        parsed: dict[str, ProcessedRow],
+        pbar: tqdm,
+    ):
+        """
+        Parse a batch of rows into `parsed` (by cache key), retrying rows missing from the response on their own.
+
+        If the LLM couldn't parse the rows together, the batch is split in half and each half is parsed on its own, until the rows that fail are logged and skipped by themselves. If the whole request failed (after `_request_batch`'s retries), its rows are logged and skipped rather than split up, which would only send more requests to a failing API. Skipped rows are sent again the next time the file is parsed.
+        """
+        try:
+            results = await self._request_batch(batch, limiter)
+        except LlmFailedToParseError as e:
+            if len(batch) == 1:
+                _logger.error(
+                    "%s (%s):\n%s",
+                    e,
+                    e.__cause__ or "refused",
+                    json.dumps(batch[0][1], indent=2),
+                )
+                pbar.update()
+                return
+            half = len(batch) // 2
+            _logger.warning("%s, splitting the batch in half", e)
+            await asyncio.gather(
+                self._parse_batch(batch[:half], limiter, parsed, pbar),
+                self._parse_batch(batch[half:], limiter, parsed, pbar),
+            )
+            return
+        if results is None:
+            _logger.error(
+                "Failed to parse %s rows:\n%s",
+                len(batch),
+                json.dumps([row for _, row in batch], indent=2),
             )
-            return None
+            pbar.update(len(batch))
+            return
 
-    async def _worker(self, pbar: tqdm):
-        while True:
-            formatted_row = await self.queue.get()
-            result = await self._llm_parse_row(formatted_row)
-            self.raw_results.append(result)
-            pbar.update()
-            self.queue.task_done()
+        retry: list[PendingRow] = []
+        new: list[tuple[str, ProcessedRow]] = []
+        for idx, (key, row) in enumerate(batch):
+            if idx in results:
+                if (result := results[idx]) is not None:
+                    parsed[key] = result
+                    new.append((key, result))
+                else:
+                    _logger.error(
+                        "LLM refused to parse row:\n%s", json.dumps(row, indent=2)
+                    )
+                pbar.update()
+            elif len(batch) > 1:
+                retry.append((key, row))
+            else:
+                _logger.error("Failed to parse row:\n%s", json.dumps(row, indent=2))
+                pbar.update()
+        self.cache.set_many(new)
 
-    async def _parse(self, path: Path) -> list[ProcessedRow]:
-        wb = load_workbook(path)
-        sheet = wb[wb.sheetnames[0]]
-        processed_rows: list[ProcessedRow] = []
-        headers = list(sheet.rows)[0]
+        await asyncio.gather(
+            *(self._parse_batch((item,), limiter, parsed, pbar) for item in retry)
+        )
 
-        total = len(list(sheet.rows)) - 1  # Don't count the header row
+    def _lookup_rows(
+        self, rows: list[dict[str, str]]
+    ) -> tuple[list[str], dict[str, ProcessedRow], dict[str, dict[str, str]]]:
+        """Return the cache key of each row, the rows found in the cache, and the (distinct) rows that still need to be sent, by key."""
+        keys = [
+            ParseCache.key(row, self.MODEL, self.USER_MESSAGE_PREFIX) for row in rows
+        ]
+        parsed: dict[str, ProcessedRow] = {}
+        to_send: dict[str, dict[str, str]] = {}
+        for key, row in zip(keys, rows):
+            if key in parsed or key in to_send:
+                # Identical row earlier in the file
+                self.cache.hits += 1
+            elif (cached := self.cache.get(key)) is not None:
+                parsed[key] = cached
+            else:
+                to_send[key] = row
+        return keys, parsed, to_send
 
-        with tqdm(total=total, desc=path.name) as pbar:
-            workers = [
-                asyncio.create_task(self._worker(pbar))
-                for _ in range(self.concurrent_requests)
-            ]
+    def batch_requests(self, path: Path) -> Iterator[dict[str, Any]]:
+        """
+        Yield Batch API requests (lines of a .jsonl batch file) for the rows in the excel file at path that aren't in the cache.
 
-            for row in sheet.iter_rows(min_row=2):
-                formatted_row = self._format_row_to_dict(row, headers)
-                await self.queue.put(formatted_row)
+        Each request's custom_id is recorded in the cache with the rows it contains, for `ingest_batch_results`.
+        """
+        yield from self._batch_requests(self._read_rows(path))
 
-            await self.queue.join()
-            [w.cancel() for w in workers]
+    def _batch_requests(self, rows: list[dict[str, str]]) -> Iterator[dict[str, Any]]:
+        _, _, to_send = self._lookup_rows(rows)
+        batch_format = response_format(ParsedBatch)
+        for batch in batched(to_send.items(), self.batch_size):
+            keys = [key for key, _ in batch]
+            custom_id = hashlib.sha256("".join(keys).encode()).hexdigest()
+            self.cache.add_batch(custom_id, keys)
+            yield {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.MODEL,
+                    "messages": self._messages(batch),
+                    "response_format": batch_format,
+                },
+            }
 
-            processed_rows = [r for r in self.raw_results if r is not None]
+    def ingest_batch_results(self, path: Path) -> int:
+        """
+        Store the rows in a Batch API results (.jsonl) file in the cache, returning how many were stored.
 
-        return processed_rows
+        Failed requests and rows are logged and skipped, so they will be sent again the next time the file is parsed (or written to a batch file).
+        """
+        stored = 0
+        with path.open("r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                custom_id = result["custom_id"]
+                keys = self.cache.get_batch(custom_id)
+                if keys is None:
+                    _logger.warning("Unknown batch request %s, skipping", custom_id)
+                    continue
 
-    def parse(self, path: Path) -> list[ProcessedRow]:
-        """Process the excel file at path. Note: due to the nature of LLMs, some rows may fail to be parsed. They will not appear in the output."""
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code") != 200:
+                    _logger.warning(
+                        "Batch request %s failed: %s",
+                        custom_id,
+                        result.get("error") or response.get("status_code"),
+                    )
+                    continue
 
-        loop = asyncio.get_event_loop()
-        result = loop.run_until_complete(self._parse(path))
+                message = response["body"]["choices"][0]["message"]
+                try:
+                    parsed = ParsedBatch.model_validate_json(message["content"] or "")
+                except ValidationError:
+                    _logger.warning(
+                        "Batch request %s returned an invalid response: %s",
+                        custom_id,
+                        message.get("refusal") or message["content"],
+                    )
+                    continue
 
-        return result
+                rows = [
+                    (keys[r.index], r.row)
+                    for r in parsed.rows
+                    if r.row is not None and 0 <= r.index < len(keys)
+                ]
+                self.cache.set_many(rows)
+                stored += len(rows)
+
+        _logger.info("Stored %s rows from %s", stored, path.name)
+        return stored
+
+    async def _parse_rows(
+        self, rows: list[dict[str, str]], name: str
+    ) -> list[ProcessedRow | None]:
+        """Parse formatted rows, returning the result for each row in order (None if it failed)."""
+        keys, parsed, to_send = self._lookup_rows(rows)
+
+        limiter = AimdLimiter(
+            initial=max(1, self.concurrent_requests // 2),
+            maximum=self.concurrent_requests,
+        )
+        with tqdm(total=len(to_send), desc=name) as pbar:
+            await asyncio.gather(
+                *(
+                    self._parse_batch(batch, limiter, parsed, pbar)
+                    for batch in batched(to_send.items(), self.batch_size)
+                )
+            )
+
+        stats = self.cache.stats()
+        _logger.info(
+            "Parsed %s: %s rows from cache, %s sent to %s",
+            name,
+            stats["hits"],
+            stats["misses"],
+            self.MODEL,
+        )
+
+        return [parsed.get(key) for key in keys]
+
+    async def _parse(self, path: Path) -> list[ProcessedRow]:
+        results = await self._parse_rows(self._read_rows(path), path.name)
+        # In sheet order, without the rows that failed
+        return [r for r in results if r is not None]
+
+    def parse(self, path: Path) -> list[ProcessedRow]:
+        """Process the excel file at path. Note: due to the nature of LLMs, some rows may fail to be parsed. They will not appear in the output."""
+        return asyncio.run(self._parse(path))
@@ -0,0 +1,117 @@
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterator, NamedTuple
+
+from sqlalchemy import Engine, event
+
+from .connection import get_engine
+
+
+class RecordedQuery(NamedTuple):
+    statement: str
+    parameters: Any
+
+
+@contextmanager
+def record_queries(engine: Engine | None = None) -> Iterator[list[RecordedQuery]]:
+    """
+    Record the SQL statements executed on the engine (the default engine if None) within the block.
+
+    Usage:
+
+    ```python
+    with record_queries() as queries:
+        QuestionManager.count()
+    assert len(queries) == 1
+    ```
+    """
+    engine = engine or get_engine()
+    queries: list[RecordedQuery] = []
+
+    def _before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        queries.append(RecordedQuery(statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def duplicate_queries(queries: list[RecordedQuery]) -> list[tuple[RecordedQuery, int]]:
+    """Return the statements executed more than once with the same parameters, with the number of times each was. These are usually a query in a loop (N+1), or a lookup which could reuse an earlier result."""
+    counts = Counter((q.statement, repr(q.parameters)) for q in queries)
+    seen: set[tuple[str, str]] = set()
+    duplicates = []
+    for query in queries:
+        key = (query.statement, repr(query.parameters))
+        if counts[key] > 1 and key not in seen:
+            seen.add(key)
+            duplicates.append((query, counts[key]))
+    return duplicates
+
+
+def _report(queries: list[RecordedQuery]) -> str:
+    lines = [f"{len(queries)} queries:"]
+    lines += [f"  {q.statement.strip()} {q.parameters!r}" for q in queries]
+    duplicates = duplicate_queries(queries)
+    if duplicates:
+        lines.append("Duplicates:")
+        lines += [
+            f"  {count}x {q.statement.strip()} {q.parameters!r}"
+            for q, count in duplicates
+        ]
+    return "\n".join(lines)
+
+
+@contextmanager
+def assert_max_queries(
+    limit: int, engine: Engine | None = None, allow_duplicates: bool = False
+) -> Iterator[list[RecordedQuery]]:
+    """
+    Fail with `QueryBudgetExceeded` if the block executes more than `limit` statements, or (unless `allow_duplicates`) any identical statement more than once. The error lists the statements, so a regression shows what was added.
+
+    Usage:
+
+    ```python
+    with assert_max_queries(1):
+        await handle_stats(message)
+    ```
+    """
+    with record_queries(engine) as queries:
+        yield queries
+    if len(queries) > limit:
+        raise QueryBudgetExceeded(f"Expected at most {limit}. {_report(queries)}")
+    if not allow_duplicates and duplicate_queries(queries):
+        raise QueryBudgetExceeded(f"Duplicate queries. {_report(queries)}")
+
+
+def query_plan(query: RecordedQuery, engine: Engine | None = None) -> list[str]:
+    """Return the steps of SQLite's `EXPLAIN QUERY PLAN` for a recorded query, e.g. "SEARCH attempt USING INDEX ix_attempt_user_id_attempt_dt (user_id=?)"."""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {query.statement}", query.parameters
+        )
+        return [row.detail for row in rows]
+
+
+def full_scans(query: RecordedQuery, engine: Engine | None = None) -> list[str]:
+    """Return the steps of a query's plan which read every row of a table (or every entry of an index). Scans of subquery results are not included."""
+    plan = query_plan(query, engine)
+    subqueries = {
+        step.split()[1]
+        for step in plan
+        if step.startswith(("MATERIALIZE ", "CO-ROUTINE "))
+    }
+    return [
+        step
+        for step in plan
+        if step.startswith("SCAN ") and step.split()[1] not in subqueries
+    ]
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, false
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -11,6 +11,7 @@ class Base(DeclarativeBase): ...
 
 
 # All datetime objects are in UTC.
+# Changes to existing tables also need a migration (see migrations.py).
 
 
 class Question(Base):
@@ -19,7 +20,10 @@ class Question(Base):
     # Prevent duplicate questions by checking both columns
     # Checking text alone is insufficient as some questions are similar
     # E.g. "Which of the following are false:"
-    __table_args__ = (UniqueConstraint("text", "explanation"),)
+    __table_args__ = (
+        UniqueConstraint("text", "explanation"),
+        Index("ix_question_filename_id", "filename_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     text: Mapped[str] = mapped_column()
@@ -40,7 +44,11 @@ class Answer(Base):
     __tablename__ = "answer"
 
     # At most one answer per answer key (A, B, C, etc)
-    __table_args__ = (UniqueConstraint("key", "question_id"),)
+    __table_args__ = (
+        UniqueConstraint("key", "question_id"),
+        # For looking up a question's (correct) answers
+        Index("ix_answer_question_id_is_correct", "question_id", "is_correct"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     question_id: Mapped[int] = mapped_column(ForeignKey("question.id"))
@@ -65,6 +73,8 @@ class Attempt(Base):
     __table_args__ = (
         # A user can submit multiple answers (as attempts) for a question.
         UniqueConstraint("user_id", "answer_id"),
+        # For a user's attempts in a time range
+        Index("ix_attempt_user_id_attempt_dt", "user_id", "attempt_dt"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -84,6 +94,68 @@ class User(Base):
     joined_dt: Mapped[datetime] = mapped_column(server_default=func.now())
     exam_dt: Mapped[date]
     is_scheduled: Mapped[bool] = mapped_column(default=True)
+    # Opted in to spaced repetition with /review, see `ReviewManager`
+    spaced_repetition: Mapped[bool] = mapped_column(
+        default=False, server_default=false()
+    )
+
+
+class UserProgress(Base):
+    """Running counters of a user's progress, kept up to date as attempts are added. See `ProgressManager`."""
+
+    __tablename__ = "user_progress"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+
+    # Number of distinct questions attempted, and answered correctly
+    attempted: Mapped[int] = mapped_column(default=0)
+    correct: Mapped[int] = mapped_column(default=0)
+
+
+class UserDailyProgress(Base):
+    """Number of attempts a user made on each day (in Settings.TZ)."""
+
+    __tablename__ = "user_daily_progress"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(primary_key=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+
+
+class Review(Base):
+    """When a user should next review a question they attempted with spaced repetition on, and the SM-2 state it was scheduled from. See `ReviewManager`."""
+
+    __tablename__ = "review"
+    __table_args__ = (
+        # For a user's most overdue review
+        Index("ix_review_user_id_due_dt", "user_id", "due_dt"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    question_id: Mapped[int] = mapped_column(
+        ForeignKey("question.id"), primary_key=True
+    )
+
+    due_dt: Mapped[datetime]
+    # Days from the last attempt to `due_dt`, correct attempts in a row, and how quickly the interval grows
+    interval_days: Mapped[float] = mapped_column(default=0)
+    repetitions: Mapped[int] = mapped_column(default=0)
+    ease: Mapped[float] = mapped_column(default=2.5)
+
+
+class NudgeSchedule(Base):
+    """A user's nudge settings, overriding Settings.DAILY_NUDGE_TIMES and Settings.TZ, and when they were last nudged."""
+
+    __tablename__ = "nudge_schedule"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+
+    # Comma separated local times, e.g. "07:00,21:00". None for the default.
+    times: Mapped[str | None]
+    # IANA time zone, e.g. "Asia/Singapore". None for the default.
+    tz: Mapped[str | None]
+    # When the scheduler last ran a nudge for the user, whether or not one was sent. Used to catch up on nudges missed during a restart.
+    last_nudge_dt: Mapped[datetime | None]
 
 
 def _test_create(tables_to_drop: list[Base]):
@@ -1,30 +1,51 @@
-from mcq_bot.managers.user import UserManager
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.utils import run_db
+from mcq_bot.utils import metrics
 from mcq_bot.utils.message import (
+    extract_command_content,
     format_stats_message,
-    get_attempted_today,
-    get_stats,
+    get_all_stats,
     get_user_id,
+    paginate,
 )
 from telethon.custom import Message
 from telethon.events import StopPropagation
 
 
 async def handle_admin(message: Message):
+    """
+    `/admin`: Report every user's stats.
+
+    `/admin reload`: Reload the question catalog, e.g. after importing questions.
+
+    `/admin metrics`: Summarise handler, database and Telegram latencies since startup.
+    """
     user_id = get_user_id(message)
+    command = extract_command_content(message.text) if message.text else None
+
+    if command == "reload":
+        count = await run_db(CatalogManager.reload)
+        await message.reply(f"Reloaded {count} questions.")
+        raise StopPropagation
+
+    if command == "metrics":
+        for page in paginate(metrics.summarize()):
+            await message.reply(page)
+        raise StopPropagation
 
     msg: list[str] = []
 
-    users = UserManager.get_all_users()
-    for user in users:
-        stats = get_stats(user.id)
+    all_stats = await run_db(get_all_stats)
+    for stats_user_id, stats in all_stats.items():
         stats_message = format_stats_message(stats)
-        attempted_today = get_attempted_today(user.id)
 
         msg.append(
-            f"**{"You" if user_id == user.id else f"{user.id}"}**:\n"
+            f"**{"You" if user_id == stats_user_id else f"{stats_user_id}"}**:\n"
             f"{stats_message}\n"
-            f"Attempted today: {attempted_today}"
+            f"Attempted today: {stats["attempted_today"]}"
         )
 
-    await message.reply("\n\n".join(msg))
+    # Long reports are sent over several messages
+    for page in paginate(msg):
+        await message.reply(page)
     raise StopPropagation
@@ -3,6 +3,8 @@ from datetime import date
 
 from dateutil import parser
 from mcq_bot.managers.user import UserManager
+from mcq_bot.managers.utils import run_db
+from mcq_bot.schedule_job import nudge_scheduler
 from mcq_bot.utils.message import extract_command_content, get_user_id
 from sqlalchemy.exc import SQLAlchemyError
 from telethon.custom import Message
@@ -20,7 +22,7 @@ async def handle_exam_date(message: Message):
     extracted_date = extract_command_content(text)
 
     if not extracted_date:
-        user = UserManager.get_user(user_id)
+        user = await run_db(UserManager.get_user, user_id)
 
         await message.reply(
             f"""
@@ -36,7 +38,8 @@ async def handle_exam_date(message: Message):
     try:
         parsed_datetime = parser.parse(extracted_date, dayfirst=True, fuzzy=True)
         parsed_date = parsed_datetime.date()
-        UserManager.add_user(user_id, parsed_date)
+        await run_db(UserManager.add_user, user_id, parsed_date)
+        await nudge_scheduler.reschedule(user_id)
 
     except parser.ParserError as e:
         await message.reply(
@@ -7,7 +7,9 @@ from telethon.events import StopPropagation
 
 
 async def handle_next_question_callback(event: events.CallbackQuery.Event):
-    await send_question(int(event.data))
+    # Decoded by the handler's filter, see `register_handlers`
+    user_id = cast(int, event.data_match)
+    await send_question(user_id)
     message = cast(Message, await event.get_message())
     await message.edit(buttons=None)
     await event.answer()
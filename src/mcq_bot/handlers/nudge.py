@@ -0,0 +1,71 @@
+import logging
+from datetime import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from mcq_bot.managers.schedule import ScheduleManager
+from mcq_bot.managers.utils import run_db
+from mcq_bot.schedule_job import nudge_scheduler
+from mcq_bot.utils.message import extract_command_content, get_user_id
+from telethon.custom import Message
+from telethon.events import StopPropagation
+
+logger = logging.getLogger(__file__)
+
+_USAGE = """
+You can change when I remind you to do questions:
+
+`/nudge 07:00 21:00` to set your reminder times
+`/nudge tz Europe/London` to set your time zone
+`/nudge default` to go back to the default times
+"""
+
+
+async def handle_nudge(message: Message):
+    text = message.text
+    user_id = get_user_id(message)
+    if text is None:
+        raise StopPropagation
+
+    schedule = await run_db(ScheduleManager.get, user_id)
+    if not schedule:
+        await message.reply("Please set your exam date with `/exam` first.")
+        raise StopPropagation
+
+    content = extract_command_content(text)
+    args = content.split() if content else []
+
+    if not args:
+        times = ", ".join(t.strftime("%H:%M") for t in schedule.times)
+        await message.reply(f"I'll remind you at {times} ({schedule.tz}).\n{_USAGE}")
+        raise StopPropagation
+
+    if args[0] == "tz":
+        try:
+            tz = args[1]
+            ZoneInfo(tz)
+        except (IndexError, ValueError, ZoneInfoNotFoundError):
+            await message.reply(
+                "Sorry, I don't know that time zone. Try something like `/nudge tz Asia/Singapore`."
+            )
+            raise StopPropagation
+        await run_db(ScheduleManager.set_tz, user_id, tz)
+        reply = f"I've set your time zone to {tz}."
+
+    elif args[0] == "default":
+        await run_db(ScheduleManager.set_times, user_id, None)
+        reply = "I'll remind you at the default times."
+
+    else:
+        try:
+            times = sorted({time.fromisoformat(t) for t in args})
+        except ValueError:
+            await message.reply(
+                "Sorry, I couldn't understand those times. Try something like `/nudge 07:00 21:00`."
+            )
+            raise StopPropagation
+        await run_db(ScheduleManager.set_times, user_id, times)
+        reply = f"I'll remind you at {", ".join(t.strftime("%H:%M") for t in times)}."
+
+    await nudge_scheduler.reschedule(user_id)
+    await message.reply(reply)
+    raise StopPropagation
@@ -2,12 +2,12 @@ import logging
 from typing import cast
 
 from mcq_bot.db.db_types import ANSWER_INT_TO_LETTER
-from mcq_bot.db.schema import Answer, Question
-from mcq_bot.managers.answer import AnswerManager
-from mcq_bot.managers.attempt import AttemptManager
-from mcq_bot.managers.question import QuestionManager
-from mcq_bot.senders.sender_types import AnswerCallback
-from mcq_bot.utils.message import get_attempted_today, get_daily_target, get_user_name
+from mcq_bot.managers.attempt_writer import attempt_writer
+from mcq_bot.managers.catalog import CatalogAnswer, CatalogManager, CatalogQuestion
+from mcq_bot.managers.utils import run_db
+from mcq_bot.senders.send_question import prefetch_question
+from mcq_bot.senders.sender_types import AnswerCallback, encode_next_question
+from mcq_bot.utils.message import get_daily_target, get_stats, get_user_name
 from telethon import Button, events
 from telethon.custom import Message
 from telethon.events import StopPropagation
@@ -16,8 +16,9 @@ logger = logging.getLogger(__file__)
 
 
 def _get_daily_target_prompt(user_id: int):
-    target = get_daily_target(user_id)
-    attempted = get_attempted_today(user_id)
+    stats = get_stats(user_id)
+    target = get_daily_target(stats)
+    attempted = stats["attempted_today"]
     if attempted >= target:
         return (
             f"You've completed your target for today! ({attempted}/{target})\U0001f389"
@@ -26,12 +27,12 @@ def _get_daily_target_prompt(user_id: int):
     return f"{attempted} done so far, {remaining} to go for today!"
 
 
-def _get_answered_qn(question: Question, answer: Answer):
+def _get_answered_qn(question: CatalogQuestion, answer: CatalogAnswer):
     resp_str = f"Your answer: {ANSWER_INT_TO_LETTER[answer.key]}"
     feedback_str = (
         "✅"
         if answer.is_correct
-        else f"❌\nCorrect answer: {ANSWER_INT_TO_LETTER[AnswerManager.get_correct_answer(question.id).key]}"
+        else f"❌\nCorrect answer: {ANSWER_INT_TO_LETTER[question.correct_key]}"
     )
     explanation = question.explanation
 
@@ -50,9 +51,11 @@ async def _log(message: Message, user_id: int, question_id: int, answer_key: int
 
 
 async def handle_question_callback(event: events.CallbackQuery.Event):
-    answer_cb = AnswerCallback.model_validate_json(event.data)
-    question = QuestionManager.fetch(answer_cb.question_id)
-    answer = AnswerManager.get_answer(answer_cb.answer_id)
+    # Decoded by the handler's filter, see `register_handlers`
+    answer_cb = cast(AnswerCallback, event.data_match)
+    await CatalogManager.ensure_loaded()
+    question = CatalogManager.get_question(answer_cb.question_id)
+    answer = CatalogManager.get_answer(answer_cb.answer_id)
 
     # message.sender_id in this callback is that of the bot, not the user
     user_id = answer_cb.user_id
@@ -64,18 +67,21 @@ async def handle_question_callback(event: events.CallbackQuery.Event):
 
     message = cast(Message, await event.get_message())
 
-    AttemptManager.add_or_update_user_attempt(user_id=user_id, answer_id=answer.id)
+    await attempt_writer.record(user_id, answer)
 
     await _log(message, user_id, question.id, answer.key)
 
     answered_qn = _get_answered_qn(question, answer)
 
-    daily_target_prompt = _get_daily_target_prompt(user_id)
+    daily_target_prompt = await run_db(_get_daily_target_prompt, user_id)
 
     await message.edit(
         text=str(message.text) + "\n\n" + answered_qn + "\n\n" + daily_target_prompt,
-        buttons=Button.inline("Next question", user_id),
+        buttons=Button.inline("Next question", encode_next_question(user_id)),
     )
 
     await event.answer()
+
+    # Ready for when they tap "Next question"
+    prefetch_question(user_id)
     raise StopPropagation
@@ -1,47 +1,106 @@
+import functools
 import logging
+from time import perf_counter
+from typing import Any, Awaitable, Callable
 
-from mcq_bot.senders.sender_types import is_answer_callback
+from mcq_bot.managers.utils import unit_of_work
+from mcq_bot.senders.sender_types import decode_answer_callback, decode_next_question
+from mcq_bot.utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS
 from telethon import TelegramClient, events, functions, types
+from telethon.events import StopPropagation
 
 from .admin import handle_admin
 from .exam import handle_exam_date
 from .next_question import handle_next_question_callback
+from .nudge import handle_nudge
 from .question import handle_question
 from .question_callback import handle_question_callback
+from .review import handle_review
 from .start import handle_start
 from .stats import handle_stats
 
 logger = logging.getLogger(__file__)
 
 
+def timed[E](handler: Callable[[E], Awaitable[Any]]) -> Callable[[E], Awaitable[Any]]:
+    """Wrap a handler to record its latency, and whether it failed, in the metrics."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrap(event: E):
+        start = perf_counter()
+        try:
+            return await handler(event)
+        except StopPropagation:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(1, name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(perf_counter() - start, name)
+
+    return wrap
+
+
+def in_unit_of_work[E](
+    handler: Callable[[E], Awaitable[Any]],
+) -> Callable[[E], Awaitable[Any]]:
+    """Wrap a handler so its manager calls share one session (see `unit_of_work`)."""
+
+    @functools.wraps(handler)
+    async def wrap(event: E):
+        async with unit_of_work():
+            return await handler(event)
+
+    return wrap
+
+
+def _middleware[E](
+    handler: Callable[[E], Awaitable[Any]],
+) -> Callable[[E], Awaitable[Any]]:
+    return timed(in_unit_of_work(handler))
+
+
 def register_handlers(client: TelegramClient):
     """
     Registered handlers will be called in order, so add the most specific ones first.
 
     Raise a StopPropagation if no further handlers should handle the message.
+
+    Each handler's latency is recorded in the metrics (see `timed`), and its manager calls share one session (see `in_unit_of_work`).
     """
     # client.add_event_handler(_handle_cancel, events.CallbackQuery(data="cancel"))
     # client.add_event_handler(_handle_msg, events.NewMessage(incoming=True))
     client.add_event_handler(
-        handle_start, events.NewMessage(incoming=True, pattern="/start")
+        _middleware(handle_start), events.NewMessage(incoming=True, pattern="/start")
+    )
+    client.add_event_handler(
+        _middleware(handle_exam_date), events.NewMessage(incoming=True, pattern="/exam")
+    )
+    client.add_event_handler(
+        _middleware(handle_question),
+        events.NewMessage(incoming=True, pattern="/question"),
     )
     client.add_event_handler(
-        handle_exam_date, events.NewMessage(incoming=True, pattern="/exam")
+        _middleware(handle_stats), events.NewMessage(incoming=True, pattern="/stats")
     )
     client.add_event_handler(
-        handle_question, events.NewMessage(incoming=True, pattern="/question")
+        _middleware(handle_admin), events.NewMessage(incoming=True, pattern="/admin")
     )
     client.add_event_handler(
-        handle_stats, events.NewMessage(incoming=True, pattern="/stats")
+        _middleware(handle_nudge), events.NewMessage(incoming=True, pattern="/nudge")
     )
     client.add_event_handler(
-        handle_admin, events.NewMessage(incoming=True, pattern="/admin")
+        _middleware(handle_review), events.NewMessage(incoming=True, pattern="/review")
     )
+    # Callbacks are routed on the tag byte of their data, and decoded once by the filter (see `sender_types`)
     client.add_event_handler(
-        handle_next_question_callback, events.CallbackQuery(pattern=rb"\d+")
+        _middleware(handle_next_question_callback),
+        events.CallbackQuery(data=decode_next_question),
     )
     client.add_event_handler(
-        handle_question_callback, events.CallbackQuery(data=is_answer_callback)
+        _middleware(handle_question_callback),
+        events.CallbackQuery(data=decode_answer_callback),
     )
     logger.info("Registered handlers successfully.")
 
@@ -57,6 +116,12 @@ async def register_commands(client: TelegramClient):
                     command="question", description="Start doing questions"
                 ),
                 types.BotCommand(command="stats", description="Show your stats"),
+                types.BotCommand(
+                    command="nudge", description="Change when you are reminded"
+                ),
+                types.BotCommand(
+                    command="review", description="Turn spaced repetition on or off"
+                ),
             ],
         )
     )
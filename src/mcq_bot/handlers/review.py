@@ -0,0 +1,53 @@
+import logging
+from datetime import UTC, datetime
+
+from mcq_bot.managers.review import ReviewManager
+from mcq_bot.managers.utils import run_db
+from mcq_bot.utils.message import extract_command_content, get_user_id
+from telethon.custom import Message
+from telethon.events import StopPropagation
+
+logger = logging.getLogger(__file__)
+
+_USAGE = """
+With spaced repetition on, `/question` brings back the questions you've answered when they are due for review: soon if you got them wrong, and less often each time you get them right.
+
+`/review on` to turn it on
+`/review off` to go back to random questions
+"""
+
+
+async def handle_review(message: Message):
+    text = message.text
+    user_id = get_user_id(message)
+    if text is None:
+        raise StopPropagation
+
+    content = extract_command_content(text)
+    args = content.split() if content else []
+
+    if not args:
+        if await run_db(ReviewManager.is_enabled, user_id):
+            now = datetime.now(UTC).replace(tzinfo=None)
+            due = await run_db(ReviewManager.count_due, user_id, now)
+            status = f"Spaced repetition is on, with {due} questions due for review."
+        else:
+            status = "Spaced repetition is off."
+        await message.reply(f"{status}\n{_USAGE}")
+        raise StopPropagation
+
+    if args[0] not in ("on", "off"):
+        await message.reply(f"Sorry, I didn't understand that.\n{_USAGE}")
+        raise StopPropagation
+
+    enabled = args[0] == "on"
+    if not await run_db(ReviewManager.set_enabled, user_id, enabled):
+        await message.reply("Please set your exam date with `/exam` first.")
+        raise StopPropagation
+
+    await message.reply(
+        "Spaced repetition is on. Use `/question` to start reviewing."
+        if enabled
+        else "Spaced repetition is off."
+    )
+    raise StopPropagation
@@ -1,3 +1,4 @@
+from mcq_bot.managers.utils import run_db
 from mcq_bot.utils.message import format_stats_message, get_stats, get_user_id
 from telethon.custom import Message
 from telethon.events import StopPropagation
@@ -5,7 +6,7 @@ from telethon.events import StopPropagation
 
 async def handle_stats(message: Message):
     user_id = get_user_id(message)
-    stats = get_stats(user_id)
+    stats = await run_db(get_stats, user_id)
     stats_message = format_stats_message(stats)
 
     await message.reply(stats_message)
@@ -1,16 +1,44 @@
 import asyncio
+import logging
+import signal
 
 import uvloop
 from sqlalchemy_utils import create_database, database_exists
 
-from mcq_bot.db.connection import get_engine
-from mcq_bot.db.schema import Base
+from mcq_bot.db.connection import get_engine, pragmas
+from mcq_bot.db.migrations import migrate
 from mcq_bot.handlers.register import register_commands, register_handlers
+from mcq_bot.managers.attempt_writer import attempt_writer
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.managers.review import ReviewManager
+from mcq_bot.settings import Settings
 from mcq_bot.utils.logger import setup_logging
+from mcq_bot.utils.metrics import serve_metrics
+from mcq_bot.utils.tasks import log_exception
+from telethon import TelegramClient
 
 from .client import get_client
-from .schedule_job import schedule_jobs
-from .settings import Settings
+from .schedule_job import nudge_scheduler
+
+_logger = logging.getLogger(__name__)
+
+# Disconnects started by a signal, referenced so they aren't garbage collected
+_shutdown_tasks: set[asyncio.Future] = set()
+
+
+def _disconnect_on_signals(client: TelegramClient):
+    """Disconnect the client on SIGTERM (e.g. `docker stop`, as the bot runs as PID 1) and SIGINT, so `main` returns through its shutdown steps instead of the process being killed."""
+    loop = asyncio.get_running_loop()
+
+    def disconnect(sig: signal.Signals):
+        _logger.info("Received %s, shutting down", sig.name)
+        task = asyncio.ensure_future(client.disconnect())  # type: ignore[arg-type]
+        _shutdown_tasks.add(task)
+        task.add_done_callback(_shutdown_tasks.discard)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, disconnect, sig)
 
 
 async def main():
@@ -19,7 +47,15 @@ async def main():
     if not database_exists(engine.url):
         create_database(engine.url)
 
-    Base.metadata.create_all(engine, checkfirst=True)
+    migrate(engine)
+    _logger.info(
+        "Using the %s storage profile: %s", Settings.DB_PROFILE, pragmas(engine)
+    )
+    if ProgressManager.needs_backfill():
+        ProgressManager.rebuild()
+    CatalogManager.reload()
+    ReviewManager.reload()
+
     client = get_client()
 
     register_handlers(client)
@@ -27,12 +63,22 @@ async def main():
     await client.start()  # type: ignore
     await register_commands(client)
 
-    # Start scheduling jobs
-    asyncio.create_task(
-        schedule_jobs(asyncio.get_running_loop(), Settings.DAILY_NUDGE_TIMES)
-    )
+    if Settings.METRICS_PORT is not None:
+        metrics_server = await serve_metrics(  # noqa: F841
+            Settings.METRICS_HOST, Settings.METRICS_PORT
+        )
+
+    # Start scheduling jobs (keeping a reference, so the task isn't garbage collected)
+    scheduler_task = asyncio.create_task(nudge_scheduler.run())
+    scheduler_task.add_done_callback(log_exception)
 
-    await client.run_until_disconnected()  # type: ignore
+    attempt_writer.start()
+    _disconnect_on_signals(client)
+    try:
+        await client.run_until_disconnected()  # type: ignore
+    finally:
+        # Write the attempts still queued before exiting
+        await attempt_writer.stop()
 
 
 def start():
@@ -1,9 +1,13 @@
 import logging
-from datetime import datetime
-from typing import Sequence
+from datetime import date, datetime
+from typing import NamedTuple, Sequence
 
 from mcq_bot.db.schema import Answer, Attempt, Filename, Question
-from sqlalchemy import Row, func, select
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.managers.question_pool import question_pool
+from mcq_bot.managers.review import ReviewAnswer, ReviewManager
+from mcq_bot.utils.dates import local_today
+from sqlalchemy import Row, func, insert, select
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import Select
 
@@ -13,20 +17,105 @@ from .utils import with_session
 _logger = logging.getLogger(__name__)
 
 
+class NewAttempt(NamedTuple):
+    """An attempt to be recorded, with its effect on the progress counters worked out when it was made (see `AttemptWriter`)."""
+
+    user_id: int
+    answer_id: int
+    question_id: int
+    is_correct: bool
+    # Whether this is the user's first attempt at the question
+    new_question: bool
+    # Naive UTC, and the local day it counts towards
+    attempt_dt: datetime
+    day: date
+
+
 class AttemptManager(BaseManager):
+    @classmethod
+    def _attempted_answer_ids(
+        cls, s: Session, user_id: int, question_id: int
+    ) -> list[int]:
+        """Return the answers the user has already attempted for the question."""
+        return list(
+            s.scalars(
+                select(Attempt.answer_id)
+                .join_from(Attempt, Answer)
+                .where(Attempt.user_id == user_id)
+                .where(Answer.question_id == question_id)
+            )
+        )
+
+    @classmethod
+    @with_session
+    def get_attempted_answer_ids(
+        cls, s: Session, user_id: int, question_id: int
+    ) -> list[int]:
+        """Return the answers the user has already attempted for the question."""
+        return cls._attempted_answer_ids(s, user_id, question_id)
+
+    @classmethod
+    @with_session
+    def add_attempts(
+        cls,
+        s: Session,
+        attempts: Sequence[NewAttempt],
+        reviews: Sequence[ReviewAnswer] = (),
+    ):
+        """
+        Record several attempts and their progress counters, and reschedule any `reviews` (see `ReviewManager`), in one transaction, with one statement per table.
+
+        The attempts must not already be recorded, and each `new_question` must account for the others in the batch, as worked out by `AttemptWriter`.
+        """
+        if not attempts and not reviews:
+            return
+        if attempts:
+            s.execute(
+                insert(Attempt),
+                [
+                    {
+                        "user_id": a.user_id,
+                        "answer_id": a.answer_id,
+                        "attempt_dt": a.attempt_dt,
+                    }
+                    for a in attempts
+                ],
+            )
+            ProgressManager._record_attempts(
+                s, ((a.user_id, a.day, a.new_question, a.is_correct) for a in attempts)
+            )
+        ReviewManager._add_reviews(s, reviews)
+        s.commit()
+
     @classmethod
     @with_session
     def add_or_update_user_attempt(cls, s: Session, user_id: int, answer_id: int):
-        attempt = s.scalar(
-            select(Attempt)
-            .where(Attempt.user_id == user_id)
-            .where(Attempt.answer_id == answer_id)
+        """
+        Record a user's attempt at an answer, if it hasn't already been recorded.
+
+        The user's progress counters are updated in the same transaction, and correctly answered questions are removed from the user's `question_pool`.
+        """
+        answer = s.get(Answer, answer_id)
+        if not answer:
+            raise ValueError(f"No answer found for {answer_id=}")
+
+        attempted_answer_ids = cls._attempted_answer_ids(s, user_id, answer.question_id)
+        if answer_id in attempted_answer_ids:
+            return
+
+        s.add(Attempt(user_id=user_id, answer_id=answer_id))
+        ProgressManager._record_attempt(
+            s,
+            user_id,
+            day=local_today(),
+            new_question=not attempted_answer_ids,
+            is_correct=answer.is_correct,
         )
-        if not attempt:
-            attempt = Attempt(user_id=user_id, answer_id=answer_id)
-            s.add(attempt)
-            s.commit()
-            _logger.info("Added attempt for user %s, answer_id %s", user_id, answer_id)
+        s.commit()
+        _logger.info("Added attempt for user %s, answer_id %s", user_id, answer_id)
+
+        if answer.is_correct:
+            question_pool.discard(user_id, answer.question_id)
 
     @classmethod
     def _get_stats_query(cls) -> Select[tuple[bool, str, datetime, int]]:
@@ -56,7 +145,7 @@ class AttemptManager(BaseManager):
     @classmethod
     @with_session
     def get_attempted(cls, s: Session, user_id: int, only_correct: bool = False) -> int:
-        """Returns the number of questions a user has attempted.
+        """Returns the number of questions a user has attempted, computed from `attempt`. Prefer `StatsManager`, which reads the maintained counters.
 
         only_correct: Whether to return only questions where the user has gotten them correct (default False).
         """
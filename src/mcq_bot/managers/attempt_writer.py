@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import threading
+from contextlib import suppress
+from datetime import UTC, date, datetime
+from typing import NamedTuple
+
+from mcq_bot.settings import Settings
+from mcq_bot.utils.dates import local_today
+from sqlalchemy.exc import OperationalError
+
+from .attempt import AttemptManager, NewAttempt
+from .catalog import CatalogAnswer
+from .question_pool import question_pool
+from .review import ReviewAnswer, ReviewManager
+from .utils import run_db
+
+_logger = logging.getLogger(__name__)
+
+# Longest wait between retries of a failed write
+_MAX_RETRY_DELAY = 30.0
+# Writes tried by `stop` before giving up on what is left
+_STOP_ATTEMPTS = 3
+
+
+class PendingProgress(NamedTuple):
+    """Progress counter increments of attempts not yet written, to add to those read from the database."""
+
+    attempted: int
+    correct: int
+    attempted_today: int
+
+
+class AttemptWriter:
+    """
+    Records attempts write-behind, so answering a question doesn't wait for a commit (and its fsync).
+
+    `record` works out an attempt's effect on the progress counters, queues it, and updates the user's `question_pool` straight away. A background task writes the queue in one transaction once `flush_interval` seconds have passed since the first queued attempt, or once `batch_size` are queued. `stop` writes whatever is left, on shutdown.
+
+    If a write fails because of the database (e.g. it is locked), its batch goes back on the queue and is retried with exponential backoff from `retry_delay` seconds. Other errors are retried one attempt at a time, dropping only the attempts that still fail.
+
+    Attempts are de-duplicated on (user_id, answer_id) against both the queue and the database. Until they are written, `pending_progress` and `pending_correct` let stats and question pools include them.
+
+    For users with spaced repetition on, every answer (even a repeated one) also queues a review, written in the same transaction. `pending_reviews` lets question picking skip the questions they have just answered.
+    """
+
+    def __init__(
+        self, flush_interval: float, batch_size: int, retry_delay: float = 0.5
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        # Used from both the event loop and the db thread
+        self._lock = threading.Lock()
+        # Queued attempts by (user_id, answer_id), and the batch being written
+        self._pending: dict[tuple[int, int], NewAttempt] = {}
+        self._writing: list[NewAttempt] = []
+        # Likewise for answers to reschedule reviews of
+        self._reviews: list[ReviewAnswer] = []
+        self._writing_reviews: list[ReviewAnswer] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+
+    def _unwritten(self) -> list[NewAttempt]:
+        return [*self._writing, *self._pending.values()]
+
+    def _queue(
+        self, user_id: int, answer: CatalogAnswer
+    ) -> tuple[NewAttempt | None, bool]:
+        """
+        Queue the attempt (on the db thread, so no batch is committed between reading the recorded attempts and checking the queue), or return None if it is already recorded or queued.
+
+        Also queues a review if the user has spaced repetition on, returning whether it did.
+        """
+        recorded = AttemptManager.get_attempted_answer_ids(user_id, answer.question_id)
+        review = ReviewManager.is_enabled(user_id)
+        # Naive UTC, like the other datetimes in the database
+        now = datetime.now(UTC).replace(tzinfo=None)
+        with self._lock:
+            if review:
+                self._reviews.append(
+                    ReviewAnswer(user_id, answer.question_id, answer.is_correct, now)
+                )
+            attempted = set(recorded) | {
+                a.answer_id
+                for a in self._unwritten()
+                if a.user_id == user_id and a.question_id == answer.question_id
+            }
+            if answer.id in attempted:
+                return None, review
+            attempt = NewAttempt(
+                user_id=user_id,
+                answer_id=answer.id,
+                question_id=answer.question_id,
+                is_correct=answer.is_correct,
+                new_question=not attempted,
+                attempt_dt=now,
+                day=local_today(),
+            )
+            self._pending[(user_id, answer.id)] = attempt
+            return attempt, review
+
+    async def record(self, user_id: int, answer: CatalogAnswer) -> bool:
+        """
+        Queue a user's attempt at an answer, returning whether it is new (not already recorded or queued).
+
+        Until `start` is called (e.g. in scripts and tests), the attempt is written before returning.
+        """
+        attempt, review = await run_db(self._queue, user_id, answer)
+        if attempt is None and not review:
+            return False
+
+        if attempt is not None and attempt.is_correct:
+            question_pool.discard(user_id, attempt.question_id)
+
+        if self._task is None:
+            await self.flush()
+        else:
+            self._wakeup.set()
+            if len(self._pending) + len(self._reviews) >= self.batch_size:
+                self._full.set()
+        return attempt is not None
+
+    def _write(self, batch: list[NewAttempt], reviews: list[ReviewAnswer]) -> bool:
+        """Write a batch taken off the queue, returning False if any of it was put back on the queue to retry."""
+        retry: list[NewAttempt] = []
+        retry_reviews: list[ReviewAnswer] = []
+        try:
+            AttemptManager.add_attempts(batch, reviews)
+        except OperationalError:
+            # e.g. the database is locked, which says nothing about the attempts themselves
+            _logger.exception(
+                "Failed to write %s attempts and %s reviews, retrying later",
+                len(batch),
+                len(reviews),
+            )
+            retry, retry_reviews = batch, reviews
+        except Exception:
+            _logger.exception(
+                "Failed to write %s attempts, retrying one at a time", len(batch)
+            )
+            for attempt in batch:
+                try:
+                    AttemptManager.add_attempts([attempt])
+                except OperationalError:
+                    retry.append(attempt)
+                except Exception:
+                    _logger.exception("Dropped attempt %s", attempt)
+            try:
+                ReviewManager.add_reviews(reviews)
+            except OperationalError:
+                retry_reviews = reviews
+            except Exception:
+                _logger.exception("Dropped %s reviews", len(reviews))
+        finally:
+            # Cleared on the db thread, so reads there see the batch either here, in the database or back on the queue
+            with self._lock:
+                self._writing = []
+                self._writing_reviews = []
+                # Ahead of those queued since, so reviews are rescheduled in order
+                self._pending = {
+                    (a.user_id, a.answer_id): a for a in retry
+                } | self._pending
+                self._reviews = retry_reviews + self._reviews
+        if retry or retry_reviews:
+            return False
+        _logger.info("Wrote %s attempts and %s reviews", len(batch), len(reviews))
+        return True
+
+    async def flush(self) -> bool:
+        """Write all queued attempts, in one transaction. Returns False if the write failed, leaving them queued."""
+        async with self._flush_lock:
+            with self._lock:
+                self._wakeup.clear()
+                self._full.clear()
+                if not self._pending and not self._reviews:
+                    return True
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._writing = batch
+                reviews, self._reviews = self._reviews, []
+                self._writing_reviews = reviews
+            written = await run_db(self._write, batch, reviews)
+            if not written:
+                self._wakeup.set()
+            return written
+
+    def _backoff(self, failures: int) -> float:
+        return min(self.retry_delay * 2 ** (failures - 1), _MAX_RETRY_DELAY)
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                await self._wakeup.wait()
+                # Let more attempts join the transaction, unless there are already enough
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                # Shielded, so `stop` can't cancel a batch taken off the queue before it is written (e.g. while the db thread is busy). `stop`'s own flush waits for it.
+                if await asyncio.shield(self.flush()):
+                    failures = 0
+                    continue
+            except Exception:
+                _logger.exception("Failed to flush attempts")
+            failures += 1
+            await asyncio.sleep(self._backoff(failures))
+
+    def start(self):
+        """Start writing queued attempts in the background."""
+        # Bound to the running event loop
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task, then write any queued attempts (after waiting for a write in progress), retrying a few times if the write fails."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await self._task
+            self._task = None
+        for failures in range(1, _STOP_ATTEMPTS + 1):
+            if await self.flush():
+                return
+            if failures < _STOP_ATTEMPTS:
+                await asyncio.sleep(self._backoff(failures))
+        with self._lock:
+            _logger.error(
+                "Gave up writing %s attempts and %s reviews",
+                len(self._pending),
+                len(self._reviews),
+            )
+
+    def pending_progress(self, user_id: int, day: date) -> PendingProgress:
+        """Return the counter increments of the user's unwritten attempts, with `attempted_today` for `day`."""
+        with self._lock:
+            attempts = [a for a in self._unwritten() if a.user_id == user_id]
+        return PendingProgress(
+            attempted=sum(a.new_question for a in attempts),
+            correct=sum(a.is_correct for a in attempts),
+            attempted_today=sum(a.day == day for a in attempts),
+        )
+
+    def pending_correct(self, user_id: int) -> set[int]:
+        """Return the ids of questions the user has answered correctly in unwritten attempts."""
+        with self._lock:
+            return {
+                a.question_id
+                for a in self._unwritten()
+                if a.user_id == user_id and a.is_correct
+            }
+
+    def pending_reviews(self, user_id: int) -> set[int]:
+        """Return the ids of questions the user has answered in unwritten reviews."""
+        with self._lock:
+            return {
+                r.question_id
+                for r in [*self._writing_reviews, *self._reviews]
+                if r.user_id == user_id
+            }
+
+
+attempt_writer = AttemptWriter(
+    Settings.ATTEMPT_FLUSH_INTERVAL, Settings.ATTEMPT_FLUSH_SIZE
+)
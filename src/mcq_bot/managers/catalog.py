@@ -0,0 +1,113 @@
+import logging
+from typing import NamedTuple, Sequence
+
+from mcq_bot.db.db_types import ANSWER_INT_TO_LETTER
+from mcq_bot.db.schema import Question
+from mcq_bot.managers.question_pool import question_pool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .base import BaseManager
+from .utils import run_db, with_session
+
+_logger = logging.getLogger(__name__)
+
+
+class CatalogAnswer(NamedTuple):
+    id: int
+    question_id: int
+    key: int  # A=0, B=1, etc
+    text: str
+    is_correct: bool
+
+
+class CatalogQuestion(NamedTuple):
+    id: int
+    text: str
+    explanation: str | None
+    filename: str
+    answers: tuple[CatalogAnswer, ...]
+    correct_key: int
+    html: str  # The question as sent to the user
+
+
+def _render_html(text: str, answers: Sequence[CatalogAnswer], filename: str) -> str:
+    answers_html = "\n\n".join(
+        [f"<b>{ANSWER_INT_TO_LETTER[a.key]}.</b> {a.text}" for a in answers]
+    )
+    return f"<p>{text}<p>\n\n{answers_html}\n\n<i>From {filename}</i>"
+
+
+class CatalogManager(BaseManager):
+    """
+    Process-wide, read-only snapshot of all questions and answers, so sending and answering questions needs no queries.
+
+    Questions don't change while the bot runs, so the catalog is loaded once at startup. Call `reload` after importing questions.
+    """
+
+    _questions: dict[int, CatalogQuestion] | None = None
+    _answers: dict[int, CatalogAnswer] = {}
+
+    @classmethod
+    @with_session
+    def reload(cls, s: Session) -> int:
+        """(Re)load all questions from the database, returning the number loaded. Users' question pools are rebuilt on next use."""
+        questions: dict[int, CatalogQuestion] = {}
+        answers: dict[int, CatalogAnswer] = {}
+
+        for question in s.scalars(select(Question)).unique():
+            question_answers = tuple(
+                CatalogAnswer(a.id, a.question_id, a.key, a.text, a.is_correct)
+                for a in question.answers
+            )
+            correct_key = next((a.key for a in question_answers if a.is_correct), -1)
+            questions[question.id] = CatalogQuestion(
+                id=question.id,
+                text=question.text,
+                explanation=question.explanation,
+                filename=question.filename.path,
+                answers=question_answers,
+                correct_key=correct_key,
+                html=_render_html(
+                    question.text, question_answers, question.filename.path
+                ),
+            )
+            answers.update((a.id, a) for a in question_answers)
+
+        # Swap in the new snapshot at once, so readers never see a partial catalog
+        cls._questions, cls._answers = questions, answers
+        question_pool.invalidate()
+        _logger.info("Loaded %s questions into the catalog", len(questions))
+        return len(questions)
+
+    @classmethod
+    async def ensure_loaded(cls):
+        """Load the catalog on the db thread (see `run_db`) if it was invalidated, so the lookups below don't reload it on the event loop. Call before them from handlers."""
+        if cls._questions is None:
+            await run_db(cls.reload)
+
+    @classmethod
+    def _loaded(cls) -> dict[int, CatalogQuestion]:
+        if cls._questions is None:
+            cls.reload()
+        assert cls._questions is not None
+        return cls._questions
+
+    @classmethod
+    def question_ids(cls) -> list[int]:
+        return list(cls._loaded())
+
+    @classmethod
+    def get_question(cls, question_id: int) -> CatalogQuestion | None:
+        return cls._loaded().get(question_id)
+
+    @classmethod
+    def get_answer(cls, answer_id: int) -> CatalogAnswer | None:
+        cls._loaded()
+        return cls._answers.get(answer_id)
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the catalog (and users' question pools), so it is reloaded on next use."""
+        cls._questions, cls._answers = None, {}
+        question_pool.invalidate()
@@ -0,0 +1,170 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Iterable
+
+from mcq_bot.db.schema import Answer, Attempt, UserDailyProgress, UserProgress
+from mcq_bot.utils.dates import to_local_date
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .base import BaseManager
+from .utils import with_session
+
+_logger = logging.getLogger(__name__)
+
+
+# Counters which differ from those recomputed from `attempt`, as {counter: (stored, expected)}
+type ProgressMismatch = dict[str, tuple[int, int]]
+
+
+class ProgressManager(BaseManager):
+    """
+    Maintains the `user_progress` and `user_daily_progress` counters, so stats are primary key lookups instead of aggregations over `attempt`.
+
+    The counters are updated in the same transaction as the attempt (see `AttemptManager.add_or_update_user_attempt`). `check` and `rebuild` recompute them from `attempt`.
+    """
+
+    @classmethod
+    def _record_attempt(
+        cls,
+        s: Session,
+        user_id: int,
+        day: date,
+        new_question: bool,
+        is_correct: bool,
+    ):
+        """
+        Add a new attempt to the counters, without committing.
+
+        `new_question`: Whether this is the user's first attempt at the question.
+        `is_correct`: Whether the attempt was correct. As each question has one correct answer, this is also the first correct attempt.
+        """
+        cls._record_attempts(s, [(user_id, day, new_question, is_correct)])
+
+    @classmethod
+    def _record_attempts(
+        cls, s: Session, attempts: Iterable[tuple[int, date, bool, bool]]
+    ):
+        """Add new attempts, as `(user_id, day, new_question, is_correct)` (see `_record_attempt`), to the counters with one statement per table, without committing."""
+        progress: dict[int, tuple[int, int]] = {}
+        daily: Counter[tuple[int, date]] = Counter()
+        for user_id, day, new_question, is_correct in attempts:
+            attempted, correct = progress.get(user_id, (0, 0))
+            progress[user_id] = (attempted + new_question, correct + is_correct)
+            daily[(user_id, day)] += 1
+        if not progress:
+            return
+
+        progress_stmt = insert(UserProgress)
+        s.execute(
+            progress_stmt.on_conflict_do_update(
+                index_elements=[UserProgress.user_id],
+                set_={
+                    "attempted": UserProgress.attempted
+                    + progress_stmt.excluded.attempted,
+                    "correct": UserProgress.correct + progress_stmt.excluded.correct,
+                },
+            ),
+            [
+                {"user_id": user_id, "attempted": attempted, "correct": correct}
+                for user_id, (attempted, correct) in progress.items()
+            ],
+        )
+        daily_stmt = insert(UserDailyProgress)
+        s.execute(
+            daily_stmt.on_conflict_do_update(
+                index_elements=[UserDailyProgress.user_id, UserDailyProgress.day],
+                set_={
+                    "attempts": UserDailyProgress.attempts
+                    + daily_stmt.excluded.attempts
+                },
+            ),
+            [
+                {"user_id": user_id, "day": day, "attempts": attempts}
+                for (user_id, day), attempts in daily.items()
+            ],
+        )
+
+    @classmethod
+    def _compute(
+        cls, s: Session
+    ) -> tuple[dict[int, tuple[int, int]], dict[tuple[int, date], int]]:
+        """
+        Recompute all counters from `attempt`.
+
+        Returns `({user_id: (attempted, correct)}, {(user_id, day): attempts})`.
+        """
+        attempted = s.execute(
+            select(
+                Attempt.user_id,
+                func.count(Answer.question_id.distinct()),
+                func.count(Answer.question_id.distinct()).filter(Answer.is_correct),
+            )
+            .join_from(Attempt, Answer)
+            .group_by(Attempt.user_id)
+        ).all()
+        progress = {user_id: (a, c) for user_id, a, c in attempted}
+
+        # Days are local, so they are bucketed here rather than in SQL
+        daily: Counter[tuple[int, date]] = Counter()
+        for user_id, attempt_dt in s.execute(
+            select(Attempt.user_id, Attempt.attempt_dt)
+        ):
+            daily[(user_id, to_local_date(attempt_dt))] += 1
+
+        return progress, dict(daily)
+
+    @classmethod
+    @with_session
+    def check(cls, s: Session) -> dict[int, ProgressMismatch]:
+        """Compare the stored counters against `attempt`, returning the mismatches for each user_id (empty if consistent)."""
+        expected_progress, expected_daily = cls._compute(s)
+        stored_progress = {
+            p.user_id: (p.attempted, p.correct) for p in s.scalars(select(UserProgress))
+        }
+        stored_daily = {
+            (d.user_id, d.day): d.attempts for d in s.scalars(select(UserDailyProgress))
+        }
+
+        mismatches: dict[int, ProgressMismatch] = defaultdict(dict)
+        for user_id in expected_progress.keys() | stored_progress.keys():
+            stored = stored_progress.get(user_id, (0, 0))
+            expected = expected_progress.get(user_id, (0, 0))
+            for idx, counter in enumerate(("attempted", "correct")):
+                if stored[idx] != expected[idx]:
+                    mismatches[user_id][counter] = (stored[idx], expected[idx])
+        for user_id, day in expected_daily.keys() | stored_daily.keys():
+            stored = stored_daily.get((user_id, day), 0)
+            expected = expected_daily.get((user_id, day), 0)
+            if stored != expected:
+                mismatches[user_id][day.isoformat()] = (stored, expected)
+
+        return dict(mismatches)
+
+    @classmethod
+    @with_session
+    def rebuild(cls, s: Session):
+        """Replace all counters with ones recomputed from `attempt`, in a single transaction."""
+        progress, daily = cls._compute(s)
+        s.execute(delete(UserProgress))
+        s.execute(delete(UserDailyProgress))
+        s.add_all(
+            UserProgress(user_id=user_id, attempted=attempted, correct=correct)
+            for user_id, (attempted, correct) in progress.items()
+        )
+        s.add_all(
+            UserDailyProgress(user_id=user_id, day=day, attempts=attempts)
+            for (user_id, day), attempts in daily.items()
+        )
+        s.commit()
+        _logger.info("Rebuilt progress counters for %s users", len(progress))
+
+    @classmethod
+    @with_session
+    def needs_backfill(cls, s: Session) -> bool:
+        """Whether there are attempts but no counters, e.g. for a database created before `user_progress` existed."""
+        has_attempts = s.scalar(select(Attempt.id).limit(1)) is not None
+        has_progress = s.scalar(select(UserProgress.user_id).limit(1)) is not None
+        return has_attempts and not has_progress
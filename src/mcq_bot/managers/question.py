@@ -1,18 +1,26 @@
 import logging
+from datetime import UTC, datetime
 from typing import TypedDict
 
 from mcq_bot.db.db_types import ProcessedRow
 from mcq_bot.db.schema import Answer, Attempt, Filename, Question
+from mcq_bot.managers.attempt_writer import attempt_writer
+from mcq_bot.managers.catalog import CatalogManager
 from mcq_bot.managers.filename import FilenameManager
-from sqlalchemy import func, select
-from sqlalchemy.exc import IntegrityError
+from mcq_bot.managers.question_pool import question_pool
+from mcq_bot.managers.review import ReviewManager
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 
 from .base import BaseManager
 from .utils import with_session
 
 _logger = logging.getLogger(__name__)
 
+# (text, explanation) pairs per duplicate lookup, to stay under SQLite's limit of 999 variables per statement
+_LOOKUP_CHUNK_SIZE = 400
+
 
 class BulkAddResult(TypedDict):
     added: list[ProcessedRow]
@@ -51,32 +59,94 @@ class QuestionManager(BaseManager):
             raise ValueError
         return result
 
+    @classmethod
+    def _attempted_correct_qn_ids(cls, user_id: int) -> Select[tuple[int]]:
+        """Return a query of ids of questions the user has answered correctly."""
+        return (
+            select(Answer.question_id)
+            .where(Attempt.user_id == user_id)
+            .where(Answer.id == Attempt.answer_id)
+            .where(Answer.is_correct)
+        )
+
+    @classmethod
+    def _eligible_question_ids(cls, s: Session, user_id: int) -> list[int]:
+        """Ids of all questions in the catalog which have not been attempted by the user, or which were only attempted incorrectly (including attempts not yet written by `attempt_writer`)."""
+        attempted_correct = set(s.scalars(cls._attempted_correct_qn_ids(user_id)))
+        attempted_correct |= attempt_writer.pending_correct(user_id)
+        return [
+            qid for qid in CatalogManager.question_ids() if qid not in attempted_correct
+        ]
+
+    @classmethod
+    @with_session
+    def fetch_random_id(cls, s: Session, user_id: int) -> int | None:
+        """
+        Return the id of a random question, which has not been attempted by the user or which was incorrect.
+
+        The question is picked from the in-memory `question_pool`, which is only built from the database on first use for each user.
+
+        If there are no unattempted questions, returns None.
+        """
+        return question_pool.choice(
+            user_id, lambda: cls._eligible_question_ids(s, user_id)
+        )
+
+    @classmethod
+    @with_session
+    def fetch_next_id(cls, s: Session, user_id: int) -> int | None:
+        """
+        Return the id of the question to send the user next.
+
+        With spaced repetition on (see `ReviewManager`), that is their most overdue review; else a question they haven't reviewed yet, from `fetch_random_id`; else the review due soonest. Questions just answered (in reviews not yet written by `attempt_writer`) are skipped.
+
+        Otherwise, see `fetch_random_id`.
+        """
+        if not ReviewManager._is_enabled(s, user_id):
+            return cls.fetch_random_id(user_id)
+
+        now = datetime.now(UTC).replace(tzinfo=None)
+        answered = attempt_writer.pending_reviews(user_id)
+        review = ReviewManager._next_review(s, user_id, exclude=answered)
+        if review and review.due_dt <= now:
+            return review.question_id
+
+        while (question_id := cls.fetch_random_id(user_id)) is not None:
+            if question_id not in answered and not ReviewManager._is_reviewed(
+                s, user_id, question_id
+            ):
+                return question_id
+            # Scheduled by its review from now on, so don't pick it again
+            question_pool.discard(user_id, question_id)
+
+        return review.question_id if review else None
+
     @classmethod
     @with_session
     def fetch_random_single(cls, s: Session, user_id: int, filename: str | None = None):
         """
         Return a random question, which has not been attempted by the user or which was incorrect, optionally filtering by a filename.
 
+        Without a filename, see `fetch_random_id`.
+
         If there are no unattempted questions, returns None.
         """
-        attempted_correct_qn_ids = (
-            select(Answer.question_id)
-            .where(Attempt.user_id == user_id)
-            .where(Answer.id == Attempt.answer_id)
-            .where(Answer.is_correct)
-        )
+        if not filename:
+            question_id = cls.fetch_random_id(user_id)
+            return s.get(Question, question_id) if question_id else None
 
+        filename_id = (
+            select(Filename.id).where(Filename.path == filename).scalar_subquery()
+        )
         stmt = (
             select(Question)
-            .where(Question.id.not_in(attempted_correct_qn_ids))
+            .where(Question.id.not_in(cls._attempted_correct_qn_ids(user_id)))
+            .where(Question.filename_id == filename_id)
             .order_by(func.random())
             .limit(1)
         )
-        if filename:
-            filename_id = (
-                select(Filename.id).where(Filename.path == filename).scalar_subquery()
-            )
-            stmt = stmt.where(Question.filename_id == filename_id)
+        if pending_correct := attempt_writer.pending_correct(user_id):
+            stmt = stmt.where(Question.id.not_in(pending_correct))
 
         qn = s.scalar(stmt)
         return qn
@@ -94,6 +164,22 @@ class QuestionManager(BaseManager):
         s.commit()
         return question
 
+    @classmethod
+    def _existing_keys(
+        cls, s: Session, keys: list[tuple[str, str]]
+    ) -> set[tuple[str, str]]:
+        """Return which of the (text, explanation) keys already exist in the database."""
+        existing: set[tuple[str, str]] = set()
+        for i in range(0, len(keys), _LOOKUP_CHUNK_SIZE):
+            chunk = keys[i : i + _LOOKUP_CHUNK_SIZE]
+            stmt = select(Question.text, Question.explanation).where(
+                tuple_(Question.text, Question.explanation).in_(chunk)
+            )
+            existing.update(
+                (text, explanation) for text, explanation in s.execute(stmt)
+            )
+        return existing
+
     @classmethod
     @with_session
     def bulk_add(
@@ -102,6 +188,8 @@ class QuestionManager(BaseManager):
         """
         Add questions from ProcessedRows (the result of a Parser) with the given filename to the database, in a single transaction.
 
+        Questions with the same text and explanation as an existing one (or an earlier row) are skipped. Duplicates are found with one lookup, and questions and answers are inserted with executemany.
+
         Returns a dict of added and skipped (duplicated) ProcessedRows.
         """
 
@@ -109,44 +197,54 @@ class QuestionManager(BaseManager):
 
         filename_orm = FilenameManager.fetch_or_create(filename)
 
+        seen = cls._existing_keys(
+            s, [(row.question.text, row.question.explanation) for row in rows]
+        )
         for row in rows:
-            answers = row.answers
-            question_text = row.question.text
-            question = Question(
-                text=question_text,
-                explanation=row.question.explanation,
-                filename_id=filename_orm.id,
-            )
-
-            try:
-                s.add(question)
-                s.flush()
-
-            except IntegrityError:
-                s.rollback()  # This rollsback all progress
+            key = (row.question.text, row.question.explanation)
+            if key in seen:
                 _logger.warning(
                     "Skipped adding question '%s' in '%s' - already exists in DB",
-                    question.text,
+                    row.question.text,
                     filename,
                 )
                 summary["duplicate"].append(row)
                 continue
-            else:
-                for answer_type in answers:
-                    answer = Answer(
-                        question=question,
-                        is_correct=answer_type.is_correct,
-                        key=answer_type.key,
-                        text=answer_type.text,
-                    )
-                    s.add(answer)
-                s.commit()  # We need to commit here, otherwise all progress will be loss when the rollback() above happens
-                summary["added"].append(row)
-                _logger.info(
-                    "Added question %s... and %s answers to db",
-                    question.text[:20],
-                    len(answers),
-                )
-
+            seen.add(key)
+            summary["added"].append(row)
+
+        if not summary["added"]:
+            return summary
+
+        question_ids = s.scalars(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True),
+            [
+                {
+                    "text": row.question.text,
+                    "explanation": row.question.explanation,
+                    "filename_id": filename_orm.id,
+                }
+                for row in summary["added"]
+            ],
+        ).all()
+        s.execute(
+            insert(Answer),
+            [
+                {
+                    "question_id": question_id,
+                    "is_correct": answer.is_correct,
+                    "key": answer.key,
+                    "text": answer.text,
+                }
+                for question_id, row in zip(question_ids, summary["added"])
+                for answer in row.answers
+            ],
+        )
         s.commit()
+        _logger.info(
+            "Added %s questions to db from '%s'", len(summary["added"]), filename
+        )
+
+        # New questions are eligible for everyone
+        CatalogManager.invalidate()
         return summary
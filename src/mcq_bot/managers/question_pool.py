@@ -0,0 +1,103 @@
+import logging
+import random
+from array import array
+from threading import RLock
+from typing import Callable, Iterable
+
+_logger = logging.getLogger(__name__)
+
+
+class _EligibleSet:
+    """
+    Question ids stored in a dense array, with a map of id -> position in the array.
+
+    Removal swaps the last id into the removed slot, so adding, removing and picking a random id are all O(1).
+    """
+
+    __slots__ = ("_ids", "_positions")
+
+    def __init__(self, question_ids: Iterable[int]):
+        self._ids = array("q", question_ids)
+        self._positions = {qid: idx for idx, qid in enumerate(self._ids)}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, question_id: int):
+        return question_id in self._positions
+
+    def discard(self, question_id: int):
+        idx = self._positions.pop(question_id, None)
+        if idx is None:
+            return
+        last = self._ids.pop()
+        if idx < len(self._ids):
+            self._ids[idx] = last
+            self._positions[last] = idx
+
+    def choice(self) -> int | None:
+        if not self._ids:
+            return None
+        return self._ids[random.randrange(len(self._ids))]
+
+
+class QuestionPool:
+    """
+    In-memory index of the question ids each user is still eligible for (unattempted, or only attempted incorrectly).
+
+    A user's set is built from the database (via `loader`) the first time it is needed, e.g. after a restart, and is then kept up to date by `discard` as attempts are recorded.
+
+    Each user's eligibility has a `version`, which changes whenever it may have, so anything derived from it (e.g. a prefetched question) can be checked for staleness.
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._sets: dict[int, _EligibleSet] = {}
+        # Bumped by invalidating every pool, and per user by `discard` and `invalidate`
+        self._epoch = 0
+        self._versions: dict[int, int] = {}
+
+    def _bump(self, user_id: int):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _get_or_load(
+        self, user_id: int, loader: Callable[[], Iterable[int]]
+    ) -> _EligibleSet:
+        eligible = self._sets.get(user_id)
+        if eligible is None:
+            eligible = _EligibleSet(loader())
+            self._sets[user_id] = eligible
+            _logger.info(
+                "Built question pool for user %s (%s eligible)", user_id, len(eligible)
+            )
+        return eligible
+
+    def choice(self, user_id: int, loader: Callable[[], Iterable[int]]) -> int | None:
+        """Return a random eligible question id for the user, or None if there are none left."""
+        with self._lock:
+            return self._get_or_load(user_id, loader).choice()
+
+    def discard(self, user_id: int, question_id: int):
+        """Mark a question as no longer eligible for the user. No-op if the user's pool isn't loaded."""
+        with self._lock:
+            self._bump(user_id)
+            if (eligible := self._sets.get(user_id)) is not None:
+                eligible.discard(question_id)
+
+    def invalidate(self, user_id: int | None = None):
+        """Drop the pool for a user, or for all users if None. It will be rebuilt on next use."""
+        with self._lock:
+            if user_id is None:
+                self._sets.clear()
+                self._epoch += 1
+            else:
+                self._sets.pop(user_id, None)
+                self._bump(user_id)
+
+    def version(self, user_id: int) -> tuple[int, int]:
+        """Return the version of the user's eligibility. It is different after any change to it."""
+        with self._lock:
+            return (self._epoch, self._versions.get(user_id, 0))
+
+
+question_pool = QuestionPool()
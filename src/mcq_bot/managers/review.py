@@ -0,0 +1,208 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple
+
+from mcq_bot.db.schema import Review, User
+from mcq_bot.managers.question_pool import question_pool
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .base import BaseManager
+from .utils import with_session
+
+_logger = logging.getLogger(__name__)
+
+# SM-2 (https://super-memory.com/english/ol/sm2.htm), simplified to answers being right or wrong
+_INITIAL_EASE = 2.5
+_MIN_EASE = 1.3
+# Lost from the ease of a question answered incorrectly
+_LAPSE_PENALTY = 0.2
+# Intervals of the first and second correct reviews in a row, in days. Later ones are the previous interval times the ease.
+_FIRST_INTERVALS = (1.0, 6.0)
+# Until a question answered incorrectly is due again
+_RELEARN_DELAY = timedelta(minutes=10)
+
+
+class ReviewState(NamedTuple):
+    due_dt: datetime
+    interval_days: float
+    repetitions: int
+    ease: float
+
+
+class ReviewAnswer(NamedTuple):
+    """A user's answer to a question with spaced repetition on, to reschedule its review (see `AttemptWriter`)."""
+
+    user_id: int
+    question_id: int
+    is_correct: bool
+    # Naive UTC
+    answer_dt: datetime
+
+
+def schedule(
+    previous: ReviewState | None, is_correct: bool, now: datetime
+) -> ReviewState:
+    """Return when a question should next be reviewed, after answering it at `now`, given how it was scheduled before (None if it is new)."""
+    interval, repetitions, ease = (
+        (previous.interval_days, previous.repetitions, previous.ease)
+        if previous
+        else (0.0, 0, _INITIAL_EASE)
+    )
+    if not is_correct:
+        ease = max(_MIN_EASE, ease - _LAPSE_PENALTY)
+        return ReviewState(now + _RELEARN_DELAY, 0.0, 0, ease)
+
+    repetitions += 1
+    if repetitions <= len(_FIRST_INTERVALS):
+        interval = _FIRST_INTERVALS[repetitions - 1]
+    else:
+        interval *= ease
+    return ReviewState(now + timedelta(days=interval), interval, repetitions, ease)
+
+
+class NextReview(NamedTuple):
+    question_id: int
+    due_dt: datetime
+
+
+class ReviewManager(BaseManager):
+    """
+    Spaced repetition, for users who opt in with /review: every question they answer gets a `Review`, due again sooner if they got it wrong and later each time they get it right.
+
+    Reviews are picked in due order from the (user_id, due_dt) index, so finding the most overdue one is a single index seek, however many questions the user has reviewed.
+
+    Which users have opted in is kept in memory, so users who haven't need no queries. It is loaded on first use (or by `reload` at startup) and kept up to date by `set_enabled`.
+    """
+
+    _enabled: set[int] | None = None
+
+    @classmethod
+    def _load(cls, s: Session) -> set[int]:
+        cls._enabled = set(s.scalars(select(User.id).where(User.spaced_repetition)))
+        return cls._enabled
+
+    @classmethod
+    @with_session
+    def reload(cls, s: Session) -> int:
+        """(Re)load which users have spaced repetition on, returning how many have."""
+        return len(cls._load(s))
+
+    @classmethod
+    def invalidate(cls):
+        """Forget which users have spaced repetition on. It is reloaded on next use."""
+        cls._enabled = None
+
+    @classmethod
+    def _is_enabled(cls, s: Session, user_id: int) -> bool:
+        enabled = cls._enabled if cls._enabled is not None else cls._load(s)
+        return user_id in enabled
+
+    @classmethod
+    @with_session
+    def is_enabled(cls, s: Session, user_id: int) -> bool:
+        """Return whether the user has spaced repetition on."""
+        return cls._is_enabled(s, user_id)
+
+    @classmethod
+    @with_session
+    def set_enabled(cls, s: Session, user_id: int, enabled: bool) -> bool:
+        """Turn spaced repetition on or off for the user, returning False if there is no such user. Their reviews are kept while it is off."""
+        result = s.execute(
+            update(User).where(User.id == user_id).values(spaced_repetition=enabled)
+        )
+        if not result.rowcount:  # type: ignore[attr-defined]
+            return False
+        s.commit()
+
+        if cls._enabled is not None:
+            if enabled:
+                cls._enabled.add(user_id)
+            else:
+                cls._enabled.discard(user_id)
+        # Which question comes next has changed, e.g. for a prefetched one
+        question_pool.invalidate(user_id)
+        _logger.info("Set spaced repetition for user %s to %s", user_id, enabled)
+        return True
+
+    @classmethod
+    def _add_reviews(cls, s: Session, answers: Iterable[ReviewAnswer]):
+        """Reschedule the reviews of the answered questions, in order, without committing."""
+        answers = list(answers)
+        if not answers:
+            return
+        keys = {(a.user_id, a.question_id) for a in answers}
+        reviews = {
+            (r.user_id, r.question_id): r
+            for r in s.scalars(
+                select(Review).where(
+                    tuple_(Review.user_id, Review.question_id).in_(keys)
+                )
+            )
+        }
+        for answer in answers:
+            key = (answer.user_id, answer.question_id)
+            review = reviews.get(key)
+            if review is None:
+                previous = None
+                review = reviews[key] = Review(
+                    user_id=answer.user_id, question_id=answer.question_id
+                )
+                s.add(review)
+            else:
+                previous = ReviewState(
+                    review.due_dt, review.interval_days, review.repetitions, review.ease
+                )
+            state = schedule(previous, answer.is_correct, answer.answer_dt)
+            review.due_dt = state.due_dt
+            review.interval_days = state.interval_days
+            review.repetitions = state.repetitions
+            review.ease = state.ease
+
+    @classmethod
+    @with_session
+    def add_reviews(cls, s: Session, answers: Iterable[ReviewAnswer]):
+        """Reschedule the reviews of the answered questions, in one transaction."""
+        cls._add_reviews(s, answers)
+        s.commit()
+
+    @classmethod
+    def _next_review(
+        cls, s: Session, user_id: int, exclude: Iterable[int] = ()
+    ) -> NextReview | None:
+        """Return the user's review that is most overdue (or due soonest, if none are), skipping the `exclude`d questions."""
+        stmt = (
+            select(Review.question_id, Review.due_dt)
+            .where(Review.user_id == user_id)
+            .order_by(Review.due_dt)
+            .limit(1)
+        )
+        if exclude := set(exclude):
+            stmt = stmt.where(Review.question_id.not_in(exclude))
+        row = s.execute(stmt).first()
+        return NextReview(*row) if row else None
+
+    @classmethod
+    def _is_reviewed(cls, s: Session, user_id: int, question_id: int) -> bool:
+        return (
+            s.scalar(
+                select(Review.question_id)
+                .where(Review.user_id == user_id)
+                .where(Review.question_id == question_id)
+            )
+            is not None
+        )
+
+    @classmethod
+    @with_session
+    def count_due(cls, s: Session, user_id: int, now: datetime) -> int:
+        """Return how many of the user's reviews are due at `now` (naive UTC)."""
+        return (
+            s.scalar(
+                select(func.count())
+                .select_from(Review)
+                .where(Review.user_id == user_id)
+                .where(Review.due_dt <= now)
+            )
+            or 0
+        )
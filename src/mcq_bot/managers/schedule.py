@@ -0,0 +1,106 @@
+from datetime import date, datetime, time, timezone
+from typing import Iterable, NamedTuple
+
+from mcq_bot.db.schema import NudgeSchedule, User
+from mcq_bot.settings import Settings
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .base import BaseManager
+from .utils import with_session
+
+
+class UserSchedule(NamedTuple):
+    user_id: int
+    times: list[time]
+    tz: str
+    last_nudge_dt: datetime | None  # UTC
+
+
+def _parse_times(times: str) -> list[time]:
+    return [time.fromisoformat(t) for t in times.split(",")]
+
+
+class ScheduleManager(BaseManager):
+    @classmethod
+    def _schedules_query(cls):
+        return select(
+            User.id,
+            NudgeSchedule.times,
+            NudgeSchedule.tz,
+            NudgeSchedule.last_nudge_dt,
+        ).outerjoin(NudgeSchedule, NudgeSchedule.user_id == User.id)
+
+    @classmethod
+    def _to_schedule(cls, row) -> UserSchedule:
+        user_id, times, tz, last_nudge_dt = row
+        return UserSchedule(
+            user_id=user_id,
+            times=_parse_times(times) if times else Settings.DAILY_NUDGE_TIMES,
+            tz=tz or Settings.TZ,
+            # Stored without a time zone, but always in UTC
+            last_nudge_dt=last_nudge_dt.replace(tzinfo=timezone.utc)
+            if last_nudge_dt
+            else None,
+        )
+
+    @classmethod
+    @with_session
+    def get_scheduled(
+        cls, s: Session, user_ids: Iterable[int] | None = None
+    ) -> list[UserSchedule]:
+        """
+        Return the nudge schedules of users who are scheduled and whose exam is not over, with defaults filled in.
+
+        `user_ids`: Only return schedules for these users, or None for all.
+        """
+        stmt = (
+            cls._schedules_query()
+            .where(User.is_scheduled)
+            .where(User.exam_dt > date.today())
+        )
+        if user_ids is not None:
+            stmt = stmt.where(User.id.in_(list(user_ids)))
+        return [cls._to_schedule(row) for row in s.execute(stmt)]
+
+    @classmethod
+    @with_session
+    def get(cls, s: Session, user_id: int) -> UserSchedule | None:
+        """Return a user's nudge schedule with defaults filled in, or None if there is no such user."""
+        row = s.execute(cls._schedules_query().where(User.id == user_id)).one_or_none()
+        return cls._to_schedule(row) if row else None
+
+    @classmethod
+    def _upsert(cls, s: Session, rows: list[dict]):
+        """Insert or update NudgeSchedule rows (which must all have the same keys) in one executemany, and commit."""
+        if not rows:
+            return
+        stmt = insert(NudgeSchedule)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NudgeSchedule.user_id],
+            set_={k: stmt.excluded[k] for k in rows[0] if k != "user_id"},
+        )
+        s.execute(stmt, rows)
+        s.commit()
+
+    @classmethod
+    @with_session
+    def set_times(cls, s: Session, user_id: int, times: list[time] | None):
+        """Set the local times a user is nudged at, or None for the default."""
+        value = ",".join(t.strftime("%H:%M") for t in times) if times else None
+        cls._upsert(s, [{"user_id": user_id, "times": value}])
+
+    @classmethod
+    @with_session
+    def set_tz(cls, s: Session, user_id: int, tz: str | None):
+        """Set the time zone of a user's nudge times, or None for the default."""
+        cls._upsert(s, [{"user_id": user_id, "tz": tz}])
+
+    @classmethod
+    @with_session
+    def mark_nudged(cls, s: Session, user_ids: Iterable[int], nudge_dt: datetime):
+        """Record that the scheduler ran a nudge for the users at `nudge_dt`, in one transaction."""
+        # All datetime objects in the database are (naive) UTC
+        utc_dt = nudge_dt.astimezone(timezone.utc).replace(tzinfo=None)
+        cls._upsert(s, [{"user_id": u, "last_nudge_dt": utc_dt} for u in user_ids])
@@ -0,0 +1,81 @@
+from datetime import date
+from typing import TypedDict
+
+from mcq_bot.db.db_types import UserNotFound
+from mcq_bot.db.schema import Question, User, UserDailyProgress, UserProgress
+from sqlalchemy import Row, func, select
+from sqlalchemy.orm import Session
+
+from .attempt_writer import attempt_writer
+from .base import BaseManager
+from .utils import with_session
+
+
+class UserStats(TypedDict):
+    total: int
+    attempted: int
+    correct: int
+    exam_dt: date
+    attempted_today: int
+
+
+class StatsManager(BaseManager):
+    @classmethod
+    def _stats_query(cls, day: date):
+        """Return a query of the `UserStats` columns (and `user_id`) for each user, reading the counters maintained by `ProgressManager`."""
+        total = select(func.count()).select_from(Question).scalar_subquery()
+        return (
+            select(
+                User.id.label("user_id"),
+                total.label("total"),
+                func.coalesce(UserProgress.attempted, 0).label("attempted"),
+                func.coalesce(UserProgress.correct, 0).label("correct"),
+                User.exam_dt,
+                func.coalesce(UserDailyProgress.attempts, 0).label("attempted_today"),
+            )
+            .outerjoin(UserProgress, UserProgress.user_id == User.id)
+            .outerjoin(
+                UserDailyProgress,
+                (UserDailyProgress.user_id == User.id) & (UserDailyProgress.day == day),
+            )
+        )
+
+    @classmethod
+    def _to_user_stats(cls, row: Row, day: date) -> UserStats:
+        # Including attempts which haven't been written yet
+        pending = attempt_writer.pending_progress(row.user_id, day)
+        return {
+            "total": row.total,
+            "attempted": row.attempted + pending.attempted,
+            "correct": row.correct + pending.correct,
+            "exam_dt": row.exam_dt,
+            "attempted_today": row.attempted_today + pending.attempted_today,
+        }
+
+    @classmethod
+    @with_session
+    def get_user_stats(cls, s: Session, user_id: int, day: date) -> UserStats:
+        """
+        Return a user's question progress in a single query:
+
+        `total`: Number of questions.
+        `attempted`: Number of questions the user has attempted.
+        `correct`: Number of questions the user has gotten correct.
+        `exam_dt`: The user's exam date.
+        `attempted_today`: Number of attempts the user has made on `day` (in Settings.TZ).
+
+        Apart from `total`, these are read from the counters maintained by `ProgressManager`, plus those of attempts queued by `attempt_writer`.
+        """
+        row = s.execute(cls._stats_query(day).where(User.id == user_id)).one_or_none()
+
+        if not row:
+            raise UserNotFound(f"No user with {user_id=}")
+
+        return cls._to_user_stats(row, day)
+
+    @classmethod
+    @with_session
+    def get_all_user_stats(cls, s: Session, day: date) -> dict[int, UserStats]:
+        """Return the stats of every user (see `get_user_stats`) in a single query, keyed by user id."""
+        rows = s.execute(cls._stats_query(day).order_by(User.id)).all()
+        return {row.user_id: cls._to_user_stats(row, day) for row in rows}
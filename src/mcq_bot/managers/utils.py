@@ -1,14 +1,95 @@
-from typing import Callable, Concatenate
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import AsyncIterator, Callable, Concatenate
 
 from mcq_bot.db.connection import get_engine
+from mcq_bot.utils.metrics import DB_QUERIES, DB_QUERY_SECONDS, DB_SESSION_SECONDS
+from sqlalchemy import Connection, Engine, event
 from sqlalchemy.orm import Session
 
+# All database work from the event loop goes through this single thread, so a slow query or WAL checkpoint never blocks the loop, and SQLite only ever sees one connection in use at a time from the bot.
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+class _QueryTally:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Connection of each thread making manager calls (see `_connection`)
+_thread_connection = threading.local()
+
+# Session shared by the manager calls within the current `unit_of_work`, if any
+_current_session: contextvars.ContextVar[Session | None] = contextvars.ContextVar(
+    "current_session", default=None
+)
+
+# Statements executed by the current `with_session` call, for its metrics
+_query_tally: contextvars.ContextVar[_QueryTally | None] = contextvars.ContextVar(
+    "query_tally", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tally = _query_tally.get()
+    if tally is not None:
+        tally.count += 1
+        tally.seconds += perf_counter() - conn.info["query_start"]
+
+
+def _connection() -> Connection:
+    """
+    Return the current thread's connection to the default engine, opened on first use and kept open, so manager calls don't check one out of the pool (and reset it on return) each time.
+
+    All the bot's database work runs on the db thread (see `run_db`), so it uses a single connection, shared by every session there. Each call's transaction ends when it returns (see `_end_transaction`), so concurrent units of work never see or commit each other's changes.
+    """
+    engine = get_engine()
+    connection: Connection | None = getattr(_thread_connection, "connection", None)
+    if connection is None or connection.closed or connection.engine is not engine:
+        if connection is not None:
+            # E.g. the default engine was replaced
+            connection.close()
+        connection = _thread_connection.connection = engine.connect()
+    return connection
+
+
+def _session() -> Session:
+    return Session(_connection(), expire_on_commit=False)
+
+
+def _end_transaction(session: Session):
+    """
+    End the shared session's transaction after a manager call. Other units of work use the same connection while the handler awaits something else (e.g. a Telegram request), so a transaction left open would take in their changes, or theirs in its.
+
+    Changes the call left uncommitted are discarded, as closing its own session would have. Otherwise the (empty) transaction is committed, which unlike a rollback doesn't expire the objects the call returned.
+    """
+    if session.new or session.dirty or session.deleted:
+        session.rollback()
+    else:
+        session.commit()
+
 
 # TODO make the order of with_session arbitrary
 def with_session[**P, R, C](func: Callable[Concatenate[C, Session, P], R]):
     """
     Wrap a classmethod with a Session instance, providing the Session as the first argument.
 
+    Within a `unit_of_work`, the unit's session is provided. Otherwise each call gets its own session, closed when it returns. Either way it uses the thread's connection (see `_connection`), and a call made within another joins its transaction.
+
     Must be called after `@classmethod`.
 
     Usage:
@@ -20,8 +101,87 @@ def with_session[**P, R, C](func: Callable[Concatenate[C, Session, P], R]):
     ```
     """
 
+    name = func.__qualname__
+
     def wrap(_class: C, *args: P.args, **kwargs: P.kwargs) -> R:
-        with Session(get_engine(), expire_on_commit=False) as s:
-            return func(_class, s, *args, **kwargs)
+        # Record the call's time and queries (which also count towards the calling manager's, if nested)
+        parent = _query_tally.get()
+        tally = _QueryTally()
+        token = _query_tally.set(tally)
+        start = perf_counter()
+        try:
+            shared = _current_session.get()
+            if shared is None:
+                with _session() as s:
+                    return func(_class, s, *args, **kwargs)
+            if shared.bind is None:
+                shared.bind = _connection()
+            try:
+                result = func(_class, shared, *args, **kwargs)
+            except Exception:
+                # Discard the call's uncommitted changes, as closing its own session would have
+                shared.rollback()
+                raise
+            # Only after the outermost manager call, so nested ones stay in its transaction
+            if parent is None:
+                _end_transaction(shared)
+            return result
+        finally:
+            _query_tally.reset(token)
+            DB_SESSION_SECONDS.observe(perf_counter() - start, name)
+            DB_QUERIES.inc(tally.count, name)
+            DB_QUERY_SECONDS.inc(tally.seconds, name)
+            if parent is not None:
+                parent.count += tally.count
+                parent.seconds += tally.seconds
 
     return wrap
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[None]:
+    """
+    Share one session between the manager calls made (with `run_db`) within the block, e.g. those handling one Telegram update, instead of opening one per call.
+
+    Managers still commit their own writes as they go, and each call's transaction ends when it returns (see `_end_transaction`). The session is closed at the end of the block. A nested unit of work joins the outer one.
+
+    Usage:
+
+    ```python
+    async with unit_of_work():
+        user = await run_db(UserManager.get_user, user_id)
+        stats = await run_db(get_stats, user_id)
+    ```
+    """
+    if _current_session.get() is not None:
+        yield
+        return
+
+    # Bound to the connection of the thread it is first used on (see `with_session`)
+    session = Session(expire_on_commit=False)
+    token = _current_session.set(session)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+        # On the db thread, which the session's connection is used from
+        await run_db(session.close)
+
+
+async def run_db[**P, R](func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """
+    Run a blocking manager call (or any function making them) on the database thread, and await its result.
+
+    This is the async API for use in handlers. Scripts can keep calling managers directly.
+
+    Usage:
+
+    ```python
+    question = await run_db(QuestionManager.fetch, question_id)
+    ```
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _db_executor, functools.partial(ctx.run, func, *args, **kwargs)
+    )
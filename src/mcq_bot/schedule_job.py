@@ -1,37 +1,188 @@
 import asyncio
+import heapq
 import logging
-from asyncio import AbstractEventLoop
-from datetime import time
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-import schedule
-
-from mcq_bot.managers.user import UserManager
+from mcq_bot.managers.schedule import ScheduleManager, UserSchedule
+from mcq_bot.managers.utils import run_db
+from mcq_bot.senders.fan_out import fan_out
 from mcq_bot.senders.send_nudge import send_nudge
 from mcq_bot.settings import Settings
+from mcq_bot.utils.tasks import log_exception
 
 logger = logging.getLogger(__file__)
 
+# Nudges missed (e.g. during a restart) are sent on startup, unless they were missed by more than this
+MISSED_NUDGE_GRACE = timedelta(hours=3)
+# Before retrying after the database failed, e.g. while it was locked
+RETRY_DELAY = timedelta(seconds=30)
+
+
+def next_nudge_dt(times: list[time], tz: str, after: datetime) -> datetime | None:
+    """Return the first of the daily local `times` in `tz` strictly after `after` (aware), in UTC. None if there are no times."""
+    zone = ZoneInfo(tz)
+    local_day = after.astimezone(zone).date()
+    candidates = [
+        datetime.combine(local_day + timedelta(days=offset), t, tzinfo=zone)
+        for offset in range(3)
+        for t in times
+    ]
+    later = [c.astimezone(timezone.utc) for c in candidates if c > after]
+    return min(later, default=None)
+
+
+def last_nudge_dt(times: list[time], tz: str, before: datetime) -> datetime | None:
+    """Return the last of the daily local `times` in `tz` at or before `before` (aware), in UTC. None if there are no times."""
+    zone = ZoneInfo(tz)
+    local_day = before.astimezone(zone).date()
+    candidates = [
+        datetime.combine(local_day - timedelta(days=offset), t, tzinfo=zone)
+        for offset in range(3)
+        for t in times
+    ]
+    earlier = [c.astimezone(timezone.utc) for c in candidates if c <= before]
+    return max(earlier, default=None)
+
+
+async def _job(user_ids: list[int], nudge_dt: datetime):
+    summary = await fan_out(
+        user_ids,
+        send_nudge,
+        concurrency=Settings.NUDGE_CONCURRENCY,
+        rate=Settings.NUDGE_RATE,
+    )
+    await run_db(ScheduleManager.mark_nudged, user_ids, nudge_dt)
+    logger.info(
+        "Nudges: %s sent, %s skipped, %s failed",
+        summary["sent"],
+        summary["skipped"],
+        summary["failed"],
+    )
+
+
+class NudgeScheduler:
+    """
+    Sends each scheduled user a nudge at their nudge times (see `ScheduleManager`).
+
+    Keeps a heap of (next nudge time, user_id) and sleeps until the earliest one, or until a user is rescheduled. Users due at the same time are nudged together with `fan_out`.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime, int]] = []
+        # The current next nudge time of each user; heap entries which don't match it are stale
+        self._next: dict[int, datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _push(self, schedule: UserSchedule, after: datetime):
+        next_dt = next_nudge_dt(schedule.times, schedule.tz, after)
+        if next_dt is None:
+            self._next.pop(schedule.user_id, None)
+            return
+        self._next[schedule.user_id] = next_dt
+        heapq.heappush(self._heap, (next_dt, schedule.user_id))
+
+    def _schedule_on_startup(self, schedule: UserSchedule, now: datetime):
+        if schedule.last_nudge_dt is None:
+            self._push(schedule, now)
+            return
 
-async def _job():
-    scheduled_users = UserManager.get_scheduled_users()
-    for user in scheduled_users:
+        # A nudge due since the last one ran was missed while the bot wasn't running. Only the latest one is caught up on, however long it was down.
+        missed = last_nudge_dt(schedule.times, schedule.tz, now)
+        if (
+            missed
+            and missed > schedule.last_nudge_dt
+            and now - MISSED_NUDGE_GRACE <= missed
+        ):
+            logger.info("Catching up on missed nudge for user %s", schedule.user_id)
+            self._next[schedule.user_id] = now
+            heapq.heappush(self._heap, (now, schedule.user_id))
+        else:
+            self._push(schedule, now)
+
+    async def reschedule(self, user_id: int):
+        """Recompute a user's next nudge, e.g. after they change their nudge times or exam date."""
+        schedules = await run_db(ScheduleManager.get_scheduled, [user_id])
+        if schedules:
+            self._push(schedules[0], datetime.now(timezone.utc))
+        else:
+            self._next.pop(user_id, None)
+        self._wakeup.set()
+
+    def _pop_due(self, now: datetime) -> list[int]:
+        due: list[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            nudge_dt, user_id = heapq.heappop(self._heap)
+            if self._next.get(user_id) == nudge_dt:
+                due.append(user_id)
+        return due
+
+    async def _sleep_until_next(self):
+        self._wakeup.clear()
+        timeout = None
+        if self._heap:
+            timeout = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+        if timeout is not None and timeout <= 0:
+            return
         try:
-            await send_nudge(user.id)
-            logger.info("Nudge sent to %s", user.id)
-        except Exception as e:
-            logger.error(
-                "Failed to send scheduled question for user %s: %s", user.id, e
-            )
-
-
-async def schedule_jobs(loop: AbstractEventLoop, job_time: list[time]) -> None:
-    """Given a list of job times, schedules them and awaits schedule.run_pending() asynchronously."""
-    for t in job_time:
-        (
-            schedule.every()
-            .day.at(t.isoformat(), tz=Settings.TZ)
-            .do(lambda: loop.create_task(_job()))
-        )
-    while True:
-        schedule.run_pending()
-        await asyncio.sleep(1)
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    async def _run_due(self, now: datetime):
+        due = self._pop_due(now)
+        if not due:
+            return
+
+        # Users may have been unscheduled (or their exam passed) since they were added
+        try:
+            schedules = await run_db(ScheduleManager.get_scheduled, due)
+        except Exception:
+            self._retry(due, now + RETRY_DELAY)
+            raise
+        for schedule in schedules:
+            self._push(schedule, now)
+        for user_id in set(due) - {s.user_id for s in schedules}:
+            self._next.pop(user_id, None)
+
+        if schedules:
+            task = asyncio.create_task(_job([s.user_id for s in schedules], now))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(log_exception)
+
+    def _retry(self, user_ids: list[int], retry_dt: datetime):
+        """Put users popped by `_pop_due` back on the heap, to be nudged at `retry_dt` instead. Users rescheduled meanwhile keep their new time."""
+        for user_id in user_ids:
+            next_dt = self._next.get(user_id)
+            if next_dt is not None and next_dt < retry_dt:
+                self._next[user_id] = retry_dt
+                heapq.heappush(self._heap, (retry_dt, user_id))
+
+    async def _start(self):
+        while True:
+            try:
+                schedules = await run_db(ScheduleManager.get_scheduled)
+                break
+            except Exception:
+                logger.exception("Failed to load nudge schedules, retrying")
+                await asyncio.sleep(RETRY_DELAY.total_seconds())
+
+        now = datetime.now(timezone.utc)
+        for schedule in schedules:
+            self._schedule_on_startup(schedule, now)
+        logger.info("Scheduled nudges for %s users", len(self._next))
+
+    async def run(self):
+        """Nudge users until cancelled. Errors (e.g. the database being locked) are logged, and the users affected are retried after RETRY_DELAY."""
+        await self._start()
+        while True:
+            try:
+                await self._sleep_until_next()
+                await self._run_due(datetime.now(timezone.utc))
+            except Exception:
+                logger.exception("Failed to run due nudges")
+
+
+nudge_scheduler = NudgeScheduler()
@@ -1,21 +1,30 @@
+import argparse
 import json
 import logging
+import multiprocessing
+import os
 import sys
 from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from itertools import batched
 from pathlib import Path
-from typing import TypedDict
+from typing import Iterable, TypedDict
 
 from mcq_bot.db.connection import get_engine
 from mcq_bot.db.db_types import ProcessedRow
+from mcq_bot.db.migrations import migrate
 from mcq_bot.db.parsers.base import BaseParser
+from mcq_bot.db.parsers.hybrid import HybridParser
 from mcq_bot.db.parsers.openai import OpenAiParser
-from mcq_bot.db.schema import Base
 from mcq_bot.managers.question import QuestionManager
 from mcq_bot.utils.logger import setup_logging
 from pydantic_core import from_json, to_jsonable_python
 
 _logger = logging.getLogger(__name__)
 
+# Rows inserted per transaction, so only one chunk of a file is held in memory at a time
+CHUNK_SIZE = 1000
+
 
 class FileSummary(TypedDict):
     total: int
@@ -38,44 +47,113 @@ def _log_summary(summary: dict[str, FileSummary]):
         )
 
 
-def _parse_files(
-    files: list[Path], parser: type[BaseParser]
-) -> list[tuple[str, list[ProcessedRow]]]:
-    """Run parser over all the provided files."""
-    processed_files = []
-    for file in files:
-        processed_rows = parser().parse(file)
-        processed_files.append((file.name, processed_rows))
-        _logger.info(
-            "Parsed %s (%s questions) successfully", str(file), len(processed_rows)
-        )
-    return processed_files
+def _save_rows(rows: Iterable[ProcessedRow], path: Path) -> list[ProcessedRow]:
+    """Write the parsed rows to a .json file, returning them as a list."""
+    rows = list(rows)
+    with path.open("w") as f:
+        json.dump(to_jsonable_python(rows), f, indent=2)
+    return rows
+
+
+def _parse_file(
+    file: Path, parser: type[BaseParser], save_dir: Path | None
+) -> list[ProcessedRow]:
+    """Parse an .xlsx file (saving the rows to `save_dir` if provided). Run in a worker process."""
+    processed_rows = parser().iter_parse(file)
+    if save_dir:
+        return _save_rows(processed_rows, save_dir / f"{file.name}.json")
+    return list(processed_rows)
+
+
+def _load_json(file: Path) -> list[ProcessedRow]:
+    """Load a .json file of list[ProcessedRow]. Run in a worker process."""
+    with file.open("r") as f:
+        json_data: list = from_json(f.read())
+        return [ProcessedRow.model_validate(m) for m in json_data]
+
 
+def _process_rows(processed_rows: Iterable[ProcessedRow], filename: str) -> FileSummary:
+    """
+    Adds ProcessedRows to the DB, consuming them in chunks of `CHUNK_SIZE`.
 
-def _process_rows(processed_rows: list[ProcessedRow], filename: str) -> FileSummary:
-    """Adds a list[ProcessedRow] to the DB."""
+    Each chunk is committed separately, so if the rows stop partway (e.g. a parsing error), the earlier chunks are kept.
+    """
 
     summary: FileSummary = {"total": 0, "added": 0, "duplicate": 0}
 
-    summary["total"] = len(processed_rows)
     try:
-        result = QuestionManager.bulk_add(processed_rows, filename)
-        summary["added"] = len(result["added"])
-        summary["duplicate"] = len(result["duplicate"])
+        for chunk in batched(processed_rows, CHUNK_SIZE):
+            summary["total"] += len(chunk)
+            result = QuestionManager.bulk_add(list(chunk), filename)
+            summary["added"] += len(result["added"])
+            summary["duplicate"] += len(result["duplicate"])
     except Exception:
         _logger.exception("Failed to add questions for filename %s to DB:", filename)
 
     return summary
 
 
+def _process_parsed(
+    futures: dict[Future[list[ProcessedRow]], str], summary: dict[str, FileSummary]
+):
+    """Add each file's rows to the DB as soon as its worker has finished parsing it."""
+    for future in as_completed(futures):
+        filename = futures[future]
+        try:
+            processed_rows = future.result()
+        except Exception:
+            _logger.exception("Failed to parse questions for filename %s:", filename)
+            summary[filename] = {"total": 0, "added": 0, "duplicate": 0}
+            continue
+        _logger.info("Parsed %s (%s questions)", filename, len(processed_rows))
+        summary[filename] = _process_rows(processed_rows, filename)
+
+
+def write_batch_requests(
+    folder: Path, out: Path, parser: OpenAiParser | None = None
+) -> int:
+    """Write Batch API requests for the uncached rows of every .xlsx file in the folder (recursively) to a .jsonl file. Returns the number of requests written."""
+    parser = parser or HybridParser()
+    count = 0
+    with out.open("w") as f:
+        for file in folder.glob("**/*.xlsx"):
+            for request in parser.batch_requests(file):
+                f.write(json.dumps(request) + "\n")
+                count += 1
+    _logger.info("Wrote %s batch requests to %s", count, out)
+    return count
+
+
+def default_workers(parser: type[BaseParser]) -> int:
+    """
+    Return how many processes to parse files in by default: one per CPU, or just this one for parsers which call the LLM.
+
+    Each process would run its own `AimdLimiter` with `concurrent_requests` against the same API key (and write to the same parse cache), so more processes only multiply the load on a rate-limited API.
+    """
+    if issubclass(parser, OpenAiParser):
+        return 1
+    return os.cpu_count() or 1
+
+
 def process_folder(
-    folder: Path, parser: type[BaseParser], save_dir: Path | None = None
+    folder: Path,
+    parser: type[BaseParser],
+    save_dir: Path | None = None,
+    workers: int | None = None,
+    batch_results: Path | None = None,
 ) -> dict[str, FileSummary]:
     """Parse a folder containing questions (recursively) with the provided Parser, then adds to DB.
 
     If these are .xlsx files, they are parsed by the Parser.
 
-    If they are .json files, then the stem is used for the filename, and the contents of the JSON file are expected to be list[ProcessedRow]."""
+    If they are .json files, then the stem is used for the filename, and the contents of the JSON file are expected to be list[ProcessedRow].
+
+    Files are parsed in a pool of `workers` processes (see `default_workers`), and added to the DB from this process as each one finishes. With 1 worker, files are parsed in this process instead, and .xlsx rows are streamed into the DB in chunks (unless they also need to be saved to `save_dir`).
+
+    If `batch_results` (a Batch API results file for requests from `write_batch_requests`) is provided, its rows are stored in the LLM parse cache first, so only the rows that are still missing are sent to the API."""
+    if batch_results:
+        OpenAiParser().ingest_batch_results(batch_results)
+
     summary: dict[str, FileSummary] = defaultdict(
         lambda: {"total": 0, "added": 0, "duplicate": 0}
     )
@@ -84,24 +162,42 @@ def process_folder(
     xlsx_files = list(folder.glob("**/*.xlsx"))
     json_files = list(folder.glob("**/*.json"))
 
-    processed_xlsx = _parse_files(xlsx_files, parser)
-
     if save_dir:
         save_dir.mkdir(exist_ok=True)
-        for processed_file in processed_xlsx:
-            with (save_dir / f"{processed_file[0]}.json").open("w") as f:
-                json.dump(to_jsonable_python(processed_file[1]), f, indent=2)
 
-    # .xlsx
-    for filename, processed_rows in processed_xlsx:
-        summary[filename] = _process_rows(processed_rows, filename)
+    workers = workers or default_workers(parser)
+    if workers > 1 and issubclass(parser, OpenAiParser):
+        _logger.warning(
+            "Parsing with %s workers, each sending its own concurrent LLM requests",
+            workers,
+        )
 
-    # .json
-    for file in json_files:
-        with file.open("r") as f:
-            json_data: list = from_json(f.read())
-            processed_rows = [ProcessedRow.model_validate(m) for m in json_data]
-            summary[file.stem] = _process_rows(processed_rows, file.stem)
+    if workers == 1:
+        # .xlsx
+        for file in xlsx_files:
+            processed_rows: Iterable[ProcessedRow] = parser().iter_parse(file)
+            if save_dir:
+                processed_rows = _save_rows(
+                    processed_rows, save_dir / f"{file.name}.json"
+                )
+            summary[file.name] = _process_rows(processed_rows, file.name)
+            _logger.info(
+                "Parsed %s (%s questions)", str(file), summary[file.name]["total"]
+            )
+
+        # .json
+        for file in json_files:
+            summary[file.stem] = _process_rows(_load_json(file), file.stem)
+    else:
+        # Spawn rather than fork, as this process may already have threads (e.g. the DB executor)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(_parse_file, file, parser, save_dir): file.name
+                for file in xlsx_files
+            } | {executor.submit(_load_json, file): file.stem for file in json_files}
+            _process_parsed(futures, summary)
 
     _logger.info("Processed %s .xlsx files", len(xlsx_files))
     _logger.info("Processed %s .json files", len(json_files))
@@ -116,18 +212,52 @@ def _make_path_absolute(path: Path) -> Path:
 if __name__ == "__main__":
     setup_logging()
 
-    if len(sys.argv) < 2:
-        _logger.error(
-            "You must supply a folder where questions will be added (recursively)",
-        )
+    arg_parser = argparse.ArgumentParser(
+        description="Add questions in a folder (recursively) to the DB."
+    )
+    arg_parser.add_argument("folder", type=Path, help="Folder containing questions")
+    arg_parser.add_argument(
+        "save_dir",
+        type=Path,
+        nargs="?",
+        help="Folder to save the parsed .xlsx files to, as .json",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of processes to parse files in (default: 1, as the parser calls the LLM and each process would have its own rate limiting; the number of CPUs for local parsers)",
+    )
+    batch_group = arg_parser.add_mutually_exclusive_group()
+    batch_group.add_argument(
+        "--write-batch",
+        type=Path,
+        metavar="REQUESTS_FILE",
+        help="Write LLM requests for the .xlsx files to a Batch API .jsonl file instead of adding them",
+    )
+    batch_group.add_argument(
+        "--batch-results",
+        type=Path,
+        metavar="RESULTS_FILE",
+        help="Batch API results .jsonl file for requests from --write-batch",
+    )
+    args = arg_parser.parse_args()
+
+    questions_path = _make_path_absolute(args.folder)
+
+    if args.write_batch:
+        write_batch_requests(questions_path, _make_path_absolute(args.write_batch))
         sys.exit()
 
-    # Create DB tables if they didn't exist
-    Base.metadata.create_all(get_engine())
+    # Create DB tables if they didn't exist, and migrate existing ones
+    migrate(get_engine())
 
-    questions_path = _make_path_absolute(Path(sys.argv[1]))
-    save_dir = _make_path_absolute(Path(sys.argv[2]))
+    save_dir = _make_path_absolute(args.save_dir) if args.save_dir else None
+    batch_results = (
+        _make_path_absolute(args.batch_results) if args.batch_results else None
+    )
 
-    result = process_folder(questions_path, OpenAiParser, save_dir)
+    result = process_folder(
+        questions_path, HybridParser, save_dir, args.workers, batch_results
+    )
 
     _log_summary(result)
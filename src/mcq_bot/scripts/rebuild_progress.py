@@ -0,0 +1,36 @@
+import logging
+import sys
+
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.migrations import migrate
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.utils.logger import setup_logging
+
+_logger = logging.getLogger(__name__)
+
+
+def check_and_rebuild(check_only: bool = False) -> bool:
+    """Check the progress counters against `attempt`, rebuilding them if they differ (unless `check_only`). Returns whether they were consistent."""
+    mismatches = ProgressManager.check()
+    for user_id, counters in mismatches.items():
+        for counter, (stored, expected) in counters.items():
+            _logger.warning(
+                "User %s: %s is %s, expected %s", user_id, counter, stored, expected
+            )
+
+    if not mismatches:
+        _logger.info("Progress counters are consistent")
+    elif not check_only:
+        ProgressManager.rebuild()
+
+    return not mismatches
+
+
+if __name__ == "__main__":
+    setup_logging()
+
+    # Create DB tables if they didn't exist, and migrate existing ones
+    migrate(get_engine())
+
+    consistent = check_and_rebuild(check_only="--check" in sys.argv)
+    sys.exit(0 if consistent else 1)
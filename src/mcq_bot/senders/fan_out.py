@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, TypedDict
+
+from telethon.errors import FloodWaitError
+
+_logger = logging.getLogger(__name__)
+
+
+class FanOutSummary(TypedDict):
+    sent: int
+    skipped: int
+    failed: int
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by all senders: allows bursts of up to `capacity` sends, refilled at `rate` per second.
+
+    `pause` stops all acquisitions for a while, e.g. when Telegram asks us to wait.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._loop = asyncio.get_running_loop()
+        self._updated = self._loop.time()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        # Acquisitions are served in order, so waiting senders aren't starved
+        async with self._lock:
+            while True:
+                now = self._loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, self._loop.time() + seconds)
+        self._tokens = 0
+
+
+type Throttle = Callable[[], Awaitable[None]]
+
+
+async def fan_out(
+    user_ids: Iterable[int],
+    send: Callable[[int, Throttle], Awaitable[bool]],
+    concurrency: int,
+    rate: float,
+    max_attempts: int = 3,
+) -> FanOutSummary:
+    """
+    Call `send` for each user, with at most `concurrency` in progress and at most `rate` messages sent per second.
+
+    `send` must await the `Throttle` it is given right before sending, so users who are skipped don't use up the rate limit. It returns whether a message was sent (False if it was skipped). On a FloodWaitError, all sending pauses for the requested time before the user is retried, up to `max_attempts` times. Other exceptions are logged and counted as failed.
+    """
+    summary: FanOutSummary = {"sent": 0, "skipped": 0, "failed": 0}
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _send_one(user_id: int):
+        async with semaphore:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    sent = await send(user_id, bucket.acquire)
+                except FloodWaitError as e:
+                    _logger.warning(
+                        "Flood wait of %ss while sending to %s (attempt %s/%s)",
+                        e.seconds,
+                        user_id,
+                        attempt,
+                        max_attempts,
+                    )
+                    bucket.pause(e.seconds)
+                    continue
+                except Exception:
+                    _logger.exception("Failed to send to user %s", user_id)
+                    summary["failed"] += 1
+                    return
+                summary["sent" if sent else "skipped"] += 1
+                return
+
+            _logger.error("Gave up sending to user %s after flood waits", user_id)
+            summary["failed"] += 1
+
+    await asyncio.gather(*(_send_one(user_id) for user_id in user_ids))
+    return summary
@@ -0,0 +1,48 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, NamedTuple
+
+_logger = logging.getLogger(__name__)
+
+
+class PrefetchedQuestion(NamedTuple):
+    # `question_pool.version` of the user when the question was picked
+    version: tuple[int, int]
+    question_id: int
+    html: str
+    buttons: list[Any]
+
+
+class PrefetchCache:
+    """
+    The next question picked (and rendered) for each user ahead of time, keeping at most `maxsize` users' questions and dropping the least recently prefetched.
+
+    An entry is only used if the user's `question_pool.version` hasn't changed since it was picked, so it can't be a question they have since answered correctly.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, PrefetchedQuestion] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, user_id: int, prefetched: PrefetchedQuestion):
+        with self._lock:
+            self._entries[user_id] = prefetched
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def take(self, user_id: int, version: tuple[int, int]) -> PrefetchedQuestion | None:
+        """Remove and return the user's prefetched question, or None if there isn't one or it is stale."""
+        with self._lock:
+            prefetched = self._entries.pop(user_id, None)
+        if prefetched is None:
+            return None
+        if prefetched.version != version:
+            _logger.debug("Discarded stale prefetched question for user %s", user_id)
+            return None
+        return prefetched
@@ -1,28 +1,39 @@
-from datetime import date
-
 from mcq_bot.client import get_client
-from mcq_bot.managers.user import UserManager
-from mcq_bot.utils.message import get_attempted_today, get_daily_target
+from mcq_bot.managers.utils import run_db
+from mcq_bot.senders.fan_out import Throttle
+from mcq_bot.senders.sender_types import encode_next_question
+from mcq_bot.utils.message import get_daily_target, get_stats
 from telethon import Button
 
 
-async def send_nudge(user_id: int):
+async def send_nudge(user_id: int, throttle: Throttle | None = None) -> bool:
+    """
+    Nudge the user to do questions, returning whether a nudge was sent.
+
+    `throttle` is awaited right before sending, see `fan_out`.
+    """
     client = get_client()
-    attempted = get_attempted_today(user_id)
-    target = get_daily_target(user_id)
-    days_to_exam = UserManager.get_user(user_id).exam_dt - date.today()
+    stats = await run_db(get_stats, user_id)
+    attempted = stats["attempted_today"]
+    target = get_daily_target(stats)
+    days_to_exam = stats["days_till_exam"]
 
     # Don't nudge the user if they've hit their target.
     if attempted >= target:
-        return
+        return False
 
     if not attempted:
-        nudge_message = f"{days_to_exam.days} days to your exam and you haven't done any questions today, time to do at least {target} questions today!"
+        nudge_message = f"{days_to_exam} days to your exam and you haven't done any questions today, time to do at least {target} questions today!"
     else:
         nudge_message = (
             f"You've done {attempted} questions today, {target - attempted} more to go!"
         )
 
+    if throttle:
+        await throttle()
     await client.send_message(
-        user_id, nudge_message, buttons=Button.inline("I'm ready!", data=user_id)
+        user_id,
+        nudge_message,
+        buttons=Button.inline("I'm ready!", data=encode_next_question(user_id)),
     )
+    return True
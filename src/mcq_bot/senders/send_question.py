@@ -1,48 +1,79 @@
+import asyncio
+import contextvars
 import logging
+from typing import Sequence
 
 from mcq_bot.client import get_client
 from mcq_bot.db.db_types import ANSWER_INT_TO_LETTER
-from mcq_bot.db.schema import Answer, Question
+from mcq_bot.managers.catalog import CatalogAnswer, CatalogManager
 from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.question_pool import question_pool
+from mcq_bot.managers.utils import run_db
+from mcq_bot.settings import Settings
 from telethon import Button
 from telethon.events import StopPropagation
 
+from .prefetch import PrefetchCache, PrefetchedQuestion
 from .sender_types import AnswerCallback
 
 logger = logging.getLogger(__file__)
 
+prefetch_cache = PrefetchCache(Settings.PREFETCH_SIZE)
+# Running prefetches, referenced so they aren't garbage collected
+_prefetch_tasks: set[asyncio.Task] = set()
 
-def _prepare_inline_buttons(answers: list[Answer], user_id: int):
+
+def _prepare_inline_buttons(answers: Sequence[CatalogAnswer], user_id: int):
     callbacks = [
         Button.inline(
             ANSWER_INT_TO_LETTER[ans.key],
             AnswerCallback(
                 answer_id=ans.id, question_id=ans.question_id, user_id=user_id
-            ).model_dump_json(),
+            ).encode(),
         )
         for ans in answers
     ]
     return callbacks
 
 
-def _format_question(question: Question):
-    filename = question.filename.path
-    qn_text = question.text
-    answers = "\n\n".join(
-        [f"<b>{ANSWER_INT_TO_LETTER[a.key]}.</b> {a.text}" for a in question.answers]
-    )
+async def _pick_question(user_id: int) -> PrefetchedQuestion | None:
+    """Pick the user's next question (see `QuestionManager.fetch_next_id`) and render it, or return None if there are none left."""
+    # Read first, so a change to the pool while picking makes the result stale
+    version = question_pool.version(user_id)
+    question_id = await run_db(QuestionManager.fetch_next_id, user_id)
+    await CatalogManager.ensure_loaded()
+    question = CatalogManager.get_question(question_id) if question_id else None
+    if not question:
+        return None
+    buttons = _prepare_inline_buttons(question.answers, user_id)
+    return PrefetchedQuestion(version, question.id, question.html, buttons)
+
 
-    return f"<p>{qn_text}<p>\n\n{answers}\n\n<i>From {filename}</i>"
+async def _prefetch(user_id: int):
+    try:
+        if prefetched := await _pick_question(user_id):
+            prefetch_cache.put(user_id, prefetched)
+    except Exception:
+        logger.exception("Failed to prefetch a question for user %s", user_id)
+
+
+def prefetch_question(user_id: int):
+    """Pick and render the user's next question in the background, so `send_question` only has to send it (e.g. while they read an explanation)."""
+    # In a new context, so it doesn't share the caller's `unit_of_work`, which may end first
+    task = asyncio.create_task(_prefetch(user_id), context=contextvars.Context())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
 
 
 async def send_question(user_id: int):
     client = get_client()
-    question = QuestionManager.fetch_random_single(user_id)
+    question = prefetch_cache.take(
+        user_id, question_pool.version(user_id)
+    ) or await _pick_question(user_id)
     if not question:
         await client.send_message(user_id, "You have answered all questions!")
         raise StopPropagation
 
-    buttons = _prepare_inline_buttons(question.answers, user_id)
-    message_text = _format_question(question)
-
-    await client.send_message(user_id, message_text, buttons=buttons, parse_mode="html")
+    await client.send_message(
+        user_id, question.html, buttons=question.buttons, parse_mode="html"
+    )
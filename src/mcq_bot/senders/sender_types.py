@@ -1,18 +1,72 @@
-from pydantic import BaseModel
+import json
+import struct
+from typing import NamedTuple
 
+# Callback data is at most 64 bytes (a Telegram limit), so it is packed as a one byte tag followed by big-endian unsigned ints.
+# The tag identifies both the callback type and the version of its layout. Add a new tag rather than changing an existing layout, as buttons already sent keep their old data.
+ANSWER_CALLBACK_V1 = 0x01
+NEXT_QUESTION_V1 = 0x02
 
-class AnswerCallback(BaseModel):
+_ANSWER_CALLBACK_V1 = struct.Struct(">BQII")  # tag, user_id, answer_id, question_id
+_NEXT_QUESTION_V1 = struct.Struct(">BQ")  # tag, user_id
+
+
+class AnswerCallback(NamedTuple):
     user_id: int
     answer_id: int
     question_id: int
 
+    def encode(self) -> bytes:
+        return _ANSWER_CALLBACK_V1.pack(
+            ANSWER_CALLBACK_V1, self.user_id, self.answer_id, self.question_id
+        )
+
+
+def encode_next_question(user_id: int) -> bytes:
+    return _NEXT_QUESTION_V1.pack(NEXT_QUESTION_V1, user_id)
+
+
+def decode_answer_callback(data: bytes | None) -> AnswerCallback | None:
+    """
+    Return the AnswerCallback in the data, or None if it isn't one.
+
+    Used as the `data` filter of the handler, so the result is available to it as `event.data_match` without decoding again.
+    """
+    if not data:
+        return None
+
+    if data[:1] == bytes([ANSWER_CALLBACK_V1]):
+        if len(data) != _ANSWER_CALLBACK_V1.size:
+            return None
+        _, user_id, answer_id, question_id = _ANSWER_CALLBACK_V1.unpack(data)
+        return AnswerCallback(user_id, answer_id, question_id)
+
+    # Legacy: buttons sent before the packed format held the JSON of the callback
+    if data[:1] == b"{":
+        try:
+            return AnswerCallback(**json.loads(data))
+        except (ValueError, TypeError):
+            return None
+
+    return None
+
+
+def decode_next_question(data: bytes | None) -> int | None:
+    """
+    Return the user_id of a next question callback, or None if it isn't one.
+
+    Used as the `data` filter of the handler, like `decode_answer_callback`.
+    """
+    if not data:
+        return None
 
-NEXT_QUESTION = "next_question"
+    if data[:1] == bytes([NEXT_QUESTION_V1]):
+        if len(data) != _NEXT_QUESTION_V1.size:
+            return None
+        return _NEXT_QUESTION_V1.unpack(data)[1]
 
+    # Legacy: buttons sent before the packed format held the user_id as digits
+    if data.isdigit():
+        return int(data)
 
-def is_answer_callback(data: str):
-    try:
-        AnswerCallback.model_validate_json(data)
-    except Exception:
-        return False
-    return True
+    return None
@@ -1,9 +1,13 @@
 from datetime import time
 from pathlib import Path
+from typing import Literal
 
 from pydantic import IPvAnyAddress, SecretStr
 from pydantic_settings import BaseSettings
 
+# Names of the `STORAGE_PROFILES` in `db/connection.py`
+StorageProfileName = Literal["durable", "throughput"]
+
 
 class _Settings(BaseSettings):
     # Telegram related
@@ -12,13 +16,33 @@ class _Settings(BaseSettings):
     SESSION_FILE: Path
     TELEGRAM_DC: IPvAnyAddress
     DB_PATH: Path
+    # SQLite and connection pool settings, see `STORAGE_PROFILES` in `db/connection.py`
+    DB_PROFILE: StorageProfileName = "durable"
     BOT_TOKEN: SecretStr
 
-    # In SGT
+    # Default nudge times, in TZ. Users can set their own with /nudge.
     # Example: ["0700","1100"]
     DAILY_NUDGE_TIMES: list[time]
 
+    # Nudges are sent to at most NUDGE_CONCURRENCY users at once, and at most NUDGE_RATE per second.
+    # Telegram allows bots around 30 messages per second in total.
+    NUDGE_CONCURRENCY: int = 8
+    NUDGE_RATE: float = 25
+
+    # Attempts are written in one transaction once ATTEMPT_FLUSH_INTERVAL seconds have passed since the first unwritten one, or once ATTEMPT_FLUSH_SIZE are waiting
+    ATTEMPT_FLUSH_INTERVAL: float = 0.01
+    ATTEMPT_FLUSH_SIZE: int = 100
+
+    # Users whose next question is picked ahead of time (while they read the explanation) are kept up to this many
+    PREFETCH_SIZE: int = 1000
+
+    # Serve Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics, if the port is set
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int | None = None
+
     OPENAI_API_KEY: SecretStr
+    # Cache of rows parsed by the LLM, so unchanged rows aren't re-sent when importing again
+    OPENAI_CACHE_PATH: Path = Path("data/openai_cache.db")
     NOTIFY_CHAT_ID: int
     TZ: str
 
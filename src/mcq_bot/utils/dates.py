@@ -0,0 +1,14 @@
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+from mcq_bot.settings import Settings
+
+
+def local_today() -> date:
+    """Return today's date in Settings.TZ."""
+    return datetime.now(ZoneInfo(Settings.TZ)).date()
+
+
+def to_local_date(dt: datetime) -> date:
+    """Return the date in Settings.TZ of a database datetime (naive, in UTC)."""
+    return dt.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(Settings.TZ)).date()
@@ -1,14 +1,11 @@
-from datetime import date, datetime, timezone
+from datetime import date
 from typing import TypedDict, cast
-from zoneinfo import ZoneInfo
 
 from telethon.custom import Message
 from telethon.types import User
 
-from mcq_bot.managers.attempt import AttemptManager
-from mcq_bot.managers.question import QuestionManager
-from mcq_bot.managers.user import UserManager
-from mcq_bot.settings import Settings
+from mcq_bot.managers.stats import StatsManager, UserStats
+from mcq_bot.utils.dates import local_today
 
 
 def get_user_id(message: Message):
@@ -23,6 +20,36 @@ async def get_user_name(message: Message):
     return sender.username
 
 
+# Telegram's maximum message length
+MAX_MESSAGE_LENGTH = 4096
+
+
+def paginate(
+    entries: list[str], sep: str = "\n\n", limit: int = MAX_MESSAGE_LENGTH
+) -> list[str]:
+    """
+    Join entries with `sep` into as few messages as possible, each at most `limit` long.
+
+    Entries are never split across messages, unless a single entry is itself longer than `limit`.
+    """
+    pages: list[str] = []
+    current = ""
+    for entry in entries:
+        candidate = f"{current}{sep}{entry}" if current else entry
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            pages.append(current)
+        while len(entry) > limit:
+            pages.append(entry[:limit])
+            entry = entry[limit:]
+        current = entry
+    if current:
+        pages.append(current)
+    return pages
+
+
 def extract_command_content(text: str):
     splits = text.split(" ", maxsplit=1)
     if len(splits) < 2:
@@ -35,23 +62,31 @@ class Stats(TypedDict):
     attempted: int
     correct: int
     days_till_exam: int
+    attempted_today: int
 
 
-def get_stats(user_id: int) -> Stats:
-    """Obtain useful information about a user's question progress."""
-    total = QuestionManager.count()
-    attempted = AttemptManager.get_attempted(user_id)
-    correct = AttemptManager.get_attempted(user_id, only_correct=True)
-    exam_date = UserManager.get_user(user_id).exam_dt
-    days_till_exam = exam_date - date.today()
+def _to_stats(user_stats: UserStats) -> Stats:
+    days_till_exam = user_stats["exam_dt"] - date.today()
     return {
-        "attempted": attempted,
-        "total": total,
-        "correct": correct,
+        "attempted": user_stats["attempted"],
+        "total": user_stats["total"],
+        "correct": user_stats["correct"],
         "days_till_exam": days_till_exam.days,
+        "attempted_today": user_stats["attempted_today"],
     }
 
 
+def get_stats(user_id: int) -> Stats:
+    """Obtain useful information about a user's question progress, in a single query."""
+    return _to_stats(StatsManager.get_user_stats(user_id, local_today()))
+
+
+def get_all_stats() -> dict[int, Stats]:
+    """Obtain the stats of every user, keyed by user id, in a single query."""
+    all_stats = StatsManager.get_all_user_stats(local_today())
+    return {user_id: _to_stats(stats) for user_id, stats in all_stats.items()}
+
+
 def format_stats_message(stats: Stats) -> str:
     """
     Return stat message to the user in the form of:
@@ -79,19 +114,6 @@ def format_stats_message(stats: Stats) -> str:
     )
 
 
-def get_daily_target(user_id: int) -> int:
+def get_daily_target(stats: Stats) -> int:
     """Return the number of questions the user should do daily."""
-    stats = get_stats(user_id)
     return round((stats["total"] - stats["attempted"]) / stats["days_till_exam"])
-
-
-def get_attempted_today(user_id: int) -> int:
-    """Returns the number of question attempts made by the user today."""
-    # Database times are in UTC, so we convert first
-    since_dt = (
-        datetime.now(ZoneInfo(Settings.TZ))
-        .replace(hour=0, minute=0, second=0, microsecond=0)
-        .astimezone(timezone.utc)
-    )
-    stats = AttemptManager.get_attempt_stats(user_id=user_id, since_dt=since_dt)
-    return len(stats)
@@ -0,0 +1,290 @@
+import asyncio
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Iterator
+
+_logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from catalog lookups (well under a millisecond) to slow Telegram requests
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Label values, in the order of the metric's label names
+type LabelValues = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, buckets: int) -> None:
+        # Per bucket (not cumulative), with the last for values above every bucket
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram:
+    """Distribution of observed values (e.g. latencies in seconds) per set of labels, in fixed buckets."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values: dict[LabelValues, _HistogramValue] = {}
+        # Observed from both the event loop and the db thread
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            histogram = self._values.get(labels)
+            if histogram is None:
+                histogram = self._values[labels] = _HistogramValue(len(self.buckets))
+            histogram.counts[bisect.bisect_left(self.buckets, value)] += 1
+            histogram.count += 1
+            histogram.sum += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of the block, in seconds, including if it raises."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def labels(self) -> list[LabelValues]:
+        with self._lock:
+            return sorted(self._values)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            histogram = self._values.get(labels)
+            return histogram.count if histogram else 0
+
+    def quantile(self, q: float, *labels: str) -> float:
+        """
+        Estimate the q-quantile (0 to 1) of the observed values, interpolating linearly within its bucket like Prometheus' `histogram_quantile`.
+
+        Values above the last bucket are reported as the last bucket's upper bound.
+        """
+        with self._lock:
+            histogram = self._values.get(labels)
+            if not histogram:
+                return 0.0
+            rank = q * histogram.count
+            cumulative = 0
+            for idx, bucket_count in enumerate(histogram.counts):
+                if cumulative + bucket_count >= rank and bucket_count:
+                    if idx == len(self.buckets):
+                        return self.buckets[-1]
+                    lower = self.buckets[idx - 1] if idx else 0.0
+                    upper = self.buckets[idx]
+                    return lower + (upper - lower) * (rank - cumulative) / bucket_count
+                cumulative += bucket_count
+            return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for labels, histogram in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(
+                    (*self.buckets, "+Inf"), histogram.counts
+                ):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(
+                        (*self.label_names, "le"), (*labels, str(bound))
+                    )
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                formatted = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{formatted} {histogram.sum}")
+                lines.append(f"{self.name}_count{formatted} {histogram.count}")
+        return lines
+
+
+class Counter:
+    """Monotonically increasing total per set of labels."""
+
+    def __init__(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                )
+        return lines
+
+
+HANDLER_SECONDS = Histogram(
+    "mcq_bot_handler_seconds",
+    "Time taken by each event handler, including its database calls and Telegram requests.",
+    ("handler",),
+)
+HANDLER_ERRORS = Counter(
+    "mcq_bot_handler_errors_total",
+    "Event handlers which raised an exception (other than StopPropagation).",
+    ("handler",),
+)
+DB_SESSION_SECONDS = Histogram(
+    "mcq_bot_db_session_seconds",
+    "Time taken by each manager call (see `with_session`).",
+    ("call",),
+)
+DB_QUERIES = Counter(
+    "mcq_bot_db_queries_total",
+    "SQL statements executed by each manager call.",
+    ("call",),
+)
+DB_QUERY_SECONDS = Counter(
+    "mcq_bot_db_query_seconds_total",
+    "Time spent executing SQL statements in each manager call.",
+    ("call",),
+)
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "mcq_bot_telegram_request_seconds",
+    "Time taken by each request to Telegram, by request type.",
+    ("request",),
+)
+
+METRICS: list[Histogram | Counter] = [
+    HANDLER_SECONDS,
+    HANDLER_ERRORS,
+    DB_SESSION_SECONDS,
+    DB_QUERIES,
+    DB_QUERY_SECONDS,
+    TELEGRAM_REQUEST_SECONDS,
+]
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def _latency(histogram: Histogram, labels: LabelValues) -> str:
+    count = histogram.count(*labels)
+    p50 = histogram.quantile(0.5, *labels) * 1000
+    p99 = histogram.quantile(0.99, *labels) * 1000
+    return f"{count} calls, p50 {p50:.1f}ms, p99 {p99:.1f}ms"
+
+
+def summarize() -> list[str]:
+    """Summarise the metrics for `/admin metrics`, as one entry per section (latencies are estimated from the histogram buckets)."""
+    handlers = [
+        f"{labels[0]}: {_latency(HANDLER_SECONDS, labels)}"
+        + (
+            f", {errors:.0f} errors"
+            if (errors := HANDLER_ERRORS.value(*labels))
+            else ""
+        )
+        for labels in HANDLER_SECONDS.labels()
+    ]
+    db = []
+    for labels in DB_SESSION_SECONDS.labels():
+        count = DB_SESSION_SECONDS.count(*labels)
+        queries = DB_QUERIES.value(*labels) / count
+        query_ms = DB_QUERY_SECONDS.value(*labels) / count * 1000
+        db.append(
+            f"{labels[0]}: {_latency(DB_SESSION_SECONDS, labels)}, "
+            f"{queries:.1f} queries ({query_ms:.1f}ms) per call"
+        )
+    telegram = [
+        f"{labels[0]}: {_latency(TELEGRAM_REQUEST_SECONDS, labels)}"
+        for labels in TELEGRAM_REQUEST_SECONDS.labels()
+    ]
+    return [
+        "\n".join([f"**{title}**", *(lines or ["No calls yet"])])
+        for title, lines in (
+            ("Handlers", handlers),
+            ("Database", db),
+            ("Telegram", telegram),
+        )
+    ]
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        # Skip the headers
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        method, path, *_ = request_line.decode("latin-1").split() + ["", ""]
+        if method == "GET" and path.split("?")[0] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int) -> asyncio.Server:
+    """Serve the metrics for Prometheus to scrape, at http://host:port/metrics."""
+    server = await asyncio.start_server(_handle_request, host, port)
+    _logger.info("Serving metrics on %s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,11 @@
+import asyncio
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def log_exception(task: asyncio.Future):
+    """Done callback logging the exception a background task ended with, which would otherwise go unnoticed until it is garbage collected (if ever)."""
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        name = task.get_name() if isinstance(task, asyncio.Task) else repr(task)
+        _logger.error("Background task %s failed", name, exc_info=exc)
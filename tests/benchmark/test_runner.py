@@ -0,0 +1,57 @@
+import json
+
+from mcq_bot.benchmark.data import DataSize, generate
+from mcq_bot.benchmark.runner import compare, run
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.stats import StatsManager
+from mcq_bot.utils.dates import local_today
+
+
+def test_generate():
+    user_ids = generate(DataSize(users=3, questions=50, attempts_per_user=10))
+
+    assert user_ids == [1, 2, 3]
+    assert len(CatalogManager.question_ids()) == 50
+    for user_id in user_ids:
+        stats = StatsManager.get_user_stats(user_id, local_today())
+        assert stats["attempted"] == 10
+
+
+def test_run():
+    report = run(DataSize(users=3, questions=50, attempts_per_user=10), iterations=2)
+
+    # Saved as JSON
+    json.dumps(report)
+    assert report["config"]["iterations"] == 2
+    assert report["config"]["profile"] == "durable"
+    assert report["config"]["pragmas"]["foreign_keys"] == 1
+    assert report["environment"]["sqlite"]
+    names = [result["name"] for result in report["results"]]
+    assert "handle_question_callback" in names
+    assert "CatalogManager.reload" in names
+    for result in report["results"]:
+        assert result["iterations"] == 2
+        assert 0 <= result["p50_ms"] <= result["p99_ms"]
+        assert result["queries_per_call"] >= 0
+
+
+def test_run_only():
+    report = run(
+        DataSize(users=2, questions=20, attempts_per_user=5), iterations=1, only="Stats"
+    )
+
+    names = [result["name"] for result in report["results"]]
+    assert names == ["StatsManager.get_user_stats", "StatsManager.get_all_user_stats"]
+
+
+def test_compare():
+    def report(profile: str, p50_ms: float):
+        return {
+            "config": {"profile": profile},
+            "results": [{"name": "handle_stats", "p50_ms": p50_ms}],
+        }
+
+    lines = compare([report("durable", 2), report("throughput", 1)])
+
+    assert lines[0].split() == ["p50", "(ms)", "durable", "throughput"]
+    assert lines[1].split() == ["handle_stats", "2.000", "1.000"]
@@ -0,0 +1,21 @@
+import pytest
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.schema import Base
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.review import ReviewManager
+from mcq_bot.utils.logger import setup_logging
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _setup_logging():
+    setup_logging()
+
+
+@pytest.fixture(autouse=True)
+def _prepare_db():
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+    CatalogManager.invalidate()
+    ReviewManager.invalidate()
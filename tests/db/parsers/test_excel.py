@@ -0,0 +1,51 @@
+import types
+
+import pytest
+from mcq_bot.db.db_types import NoCorrectAnswerException
+from mcq_bot.db.parsers.excel import ExcelParser
+from openpyxl import load_workbook
+from tests.factories import make_rows, make_workbook
+
+
+def test_iter_parse(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 20)
+
+    rows = ExcelParser().iter_parse(path)
+
+    assert isinstance(rows, types.GeneratorType)
+    rows = list(rows)
+    assert [r.question for r in rows] == [r.question for r in make_rows(20)]
+    # Answers are capitalised
+    assert rows[0].answers[0].text == "Answer 0 for question 0"
+    assert [a.is_correct for a in rows[0].answers] == [True] + [False] * 4
+
+
+def test_parse_matches_iter_parse(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    assert ExcelParser().parse(path) == list(ExcelParser().iter_parse(path))
+
+
+def test_skips_rows_without_questions(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 3)
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    sheet.append((4,))
+    wb.save(path)
+
+    assert len(ExcelParser().parse(path)) == 3
+
+
+def test_invalid_answer_reports_row(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 3)
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    sheet["H3"] = "Z"
+    wb.save(path)
+
+    rows = ExcelParser().iter_parse(path)
+    # Rows before the invalid one are still yielded
+    assert next(rows).question == make_rows(1)[0].question
+    with pytest.raises(NoCorrectAnswerException, match="row 3"):
+        next(rows)
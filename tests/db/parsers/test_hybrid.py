@@ -0,0 +1,95 @@
+from mcq_bot.db.parsers.cache import ParseCache
+from mcq_bot.db.parsers.excel import DEFAULT_COLUMNS, ColumnMapping
+from mcq_bot.db.parsers.hybrid import HybridParser
+from openpyxl import Workbook, load_workbook
+from tests.factories import EXCEL_HEADERS, make_workbook
+from tests.fakes import FakeOpenAiClient
+
+
+def _parser(client: FakeOpenAiClient) -> HybridParser:
+    return HybridParser(client=client, cache=ParseCache(":memory:"), retry_delay=0)  # type: ignore[arg-type]
+
+
+def test_infer_default_headers():
+    assert ColumnMapping.infer(EXCEL_HEADERS) == DEFAULT_COLUMNS
+
+
+def test_infer_other_headers():
+    headers = (
+        "Explanation",
+        "Option (A)",
+        "Option (B)",
+        None,
+        "Correct answer",
+        "QUESTION",
+    )
+    assert ColumnMapping.infer(headers) == ColumnMapping(
+        question=5, answers=(1, 2, None, None, None), answer=4, explanation=0
+    )
+
+
+def test_infer_fails():
+    # No answer column
+    assert ColumnMapping.infer(("Question", "A", "B", "C")) is None
+    # Only one option
+    assert ColumnMapping.infer(("Question", "A", "Answer")) is None
+    assert ColumnMapping.infer(("foo", "bar")) is None
+
+
+def test_parses_locally(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 20)
+    client = FakeOpenAiClient()
+
+    rows = _parser(client).parse(path)
+
+    assert client.calls == 0
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(20)]
+    assert [a.is_correct for a in rows[0].answers] == [True] + [False] * 4
+
+
+def test_reordered_columns(tmp_path):
+    """Columns are found by their headers rather than their positions."""
+    order = [8, 1, 7, 2, 3, 4, 5, 6]
+    source = load_workbook(make_workbook(tmp_path / "source.xlsx", 5)).active
+    assert source
+    wb = Workbook()
+    sheet = wb.active
+    assert sheet
+    for row in source.iter_rows(values_only=True):
+        sheet.append([row[i] for i in order])
+    wb.save(tmp_path / "questions.xlsx")
+
+    client = FakeOpenAiClient()
+    rows = _parser(client).parse(tmp_path / "questions.xlsx")
+
+    assert client.calls == 0
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(5)]
+    assert rows[0].question.explanation == "explanation 0"
+
+
+def test_falls_back_to_llm(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    # No valid correct answer in the third question
+    sheet["H4"] = "see explanation"
+    wb.save(path)
+
+    client = FakeOpenAiClient()
+    rows = _parser(client).parse(path)
+
+    assert client.rows_sent == 1
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(5)]
+
+
+def test_unknown_headers_use_llm(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    sheet["H1"] = "Solution"
+    wb.save(path)
+
+    parser = _parser(FakeOpenAiClient())
+    assert len(list(parser.batch_requests(path))) == 1
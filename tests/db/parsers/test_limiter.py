@@ -0,0 +1,60 @@
+import asyncio
+
+from mcq_bot.db.parsers.limiter import AimdLimiter
+
+
+def test_additive_increase():
+    async def _test():
+        limiter = AimdLimiter(initial=2, maximum=3)
+        # About +1 per round of `limit` requests
+        limiter.on_success(latency=0.1)
+        limiter.on_success(latency=0.1)
+        assert 2.5 < limiter.limit < 3
+        for _ in range(5):
+            limiter.on_success(latency=0.1)
+        assert limiter.limit == 3
+
+    asyncio.run(_test())
+
+
+def test_multiplicative_decrease():
+    async def _test():
+        limiter = AimdLimiter(initial=8, maximum=8, cooldown=60)
+        limiter.on_overload()
+        assert limiter.limit == 4
+        # Within the cooldown, e.g. other failures from the same round
+        limiter.on_overload()
+        assert limiter.limit == 4
+        # Slow responses count as overload too
+        limiter.cooldown = 0
+        limiter.on_success(latency=limiter.latency_target + 1)
+        assert limiter.limit == 2
+
+    asyncio.run(_test())
+
+
+def test_minimum():
+    async def _test():
+        limiter = AimdLimiter(initial=1, maximum=8, cooldown=0)
+        limiter.on_overload()
+        assert limiter.limit == 1
+
+    asyncio.run(_test())
+
+
+def test_slot_waits_for_limit():
+    async def _test():
+        limiter = AimdLimiter(initial=2, maximum=2)
+        max_in_flight = 0
+
+        async def _request():
+            nonlocal max_in_flight
+            async with limiter.slot():
+                max_in_flight = max(max_in_flight, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(_request() for _ in range(6)))
+        assert max_in_flight == 2
+        assert limiter.in_flight == 0
+
+    asyncio.run(_test())
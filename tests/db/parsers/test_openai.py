@@ -0,0 +1,199 @@
+import json
+
+from mcq_bot.db.parsers.cache import ParseCache
+from mcq_bot.db.parsers.openai import OpenAiParser, ParsedBatch, response_format
+from mcq_bot.settings import Settings
+from openpyxl import load_workbook
+from pydantic import SecretStr
+from tests.factories import make_workbook
+from tests.fakes import FakeOpenAiClient, fake_batch_result
+
+
+def _parse(path, client, cache, **kwargs):
+    parser = OpenAiParser(client=client, cache=cache, retry_delay=0, **kwargs)  # type: ignore[arg-type]
+    return parser.parse(path)
+
+
+def test_cache_skips_llm(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    client = FakeOpenAiClient()
+
+    first = _parse(path, client, ParseCache(tmp_path / "cache.db"))
+    assert client.rows_sent == 5
+
+    # A new cache instance on the same file, e.g. on the next run
+    cache = ParseCache(tmp_path / "cache.db")
+    second = _parse(path, client, cache)
+    assert client.rows_sent == 5
+    assert cache.stats() == {"hits": 5, "misses": 0}
+    assert second == first
+
+
+def test_cache_changed_row(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    client = FakeOpenAiClient()
+    _parse(path, client, ParseCache(tmp_path / "cache.db"))
+
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    sheet["B2"] = "changed question"
+    wb.save(path)
+
+    cache = ParseCache(tmp_path / "cache.db")
+    rows = _parse(path, client, cache)
+    assert client.rows_sent == 6
+    assert cache.stats() == {"hits": 4, "misses": 1}
+    assert "changed question" in [r.question.text for r in rows]
+
+
+def test_identical_rows_sent_once(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 1)
+    wb = load_workbook(path)
+    sheet = wb.active
+    assert sheet
+    for _ in range(3):
+        sheet.append([c.value for c in sheet[2]])
+    wb.save(path)
+
+    client = FakeOpenAiClient()
+    cache = ParseCache(":memory:")
+    rows = _parse(path, client, cache)
+
+    assert client.rows_sent == 1
+    assert len(rows) == 4
+    assert cache.stats() == {"hits": 3, "misses": 1}
+
+
+def test_cache_key():
+    row = {"Question": "q", "Answer": "A"}
+    key = ParseCache.key(row, "model", "prompt")
+    assert key == ParseCache.key(dict(reversed(row.items())), "model", "prompt")
+    assert key != ParseCache.key(row, "other model", "prompt")
+    assert key != ParseCache.key(row, "model", "other prompt")
+
+
+def test_batches_in_sheet_order(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 50)
+    client = FakeOpenAiClient(max_delay=0.01)
+
+    rows = _parse(path, client, ParseCache(":memory:"), batch_size=7)
+
+    assert client.calls == 8
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(50)]
+
+
+def test_retries_rate_limits(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 10)
+    client = FakeOpenAiClient(rate_limited=3)
+
+    rows = _parse(path, client, ParseCache(":memory:"), batch_size=10)
+
+    assert len(rows) == 10
+    assert client.calls == 4
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 1)
+    client = FakeOpenAiClient(rate_limited=10)
+
+    rows = _parse(path, client, ParseCache(":memory:"), max_attempts=3)
+
+    assert rows == []
+    assert client.calls == 3
+
+
+def test_failed_batch_is_not_split(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 5)
+    client = FakeOpenAiClient(rate_limited=10)
+
+    rows = _parse(path, client, ParseCache(":memory:"), batch_size=5, max_attempts=3)
+
+    # Only the batch's own attempts, not one request per row after it
+    assert rows == []
+    assert client.calls == 3
+
+
+def test_unparseable_batch_is_split(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 8)
+    client = FakeOpenAiClient(failing_question="test question 5")
+
+    rows = _parse(path, client, ParseCache(":memory:"), batch_size=8)
+
+    # 8 rows, then halves of 4, 2 and 1 around the failing row
+    assert client.calls == 7
+    assert [r.question.text for r in rows] == [
+        f"test question {i}" for i in range(8) if i != 5
+    ]
+
+
+def test_sdk_retries_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, "OPENAI_API_KEY", SecretStr("test"))
+
+    parser = OpenAiParser(cache=ParseCache(":memory:"))
+
+    # Retried by the parser instead, so rate limits reach its limiter
+    assert parser.client.max_retries == 0
+
+
+def test_missing_rows_retried_alone(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 10)
+    client = FakeOpenAiClient(drop_last=True)
+
+    rows = _parse(path, client, ParseCache(":memory:"), batch_size=5)
+
+    # 2 batches, then the last row of each on its own
+    assert client.calls == 4
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(10)]
+
+
+def test_concurrency_limit(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 40)
+    client = FakeOpenAiClient(max_delay=0.01)
+
+    _parse(path, client, ParseCache(":memory:"), batch_size=1, concurrent_requests=4)
+
+    assert client.max_in_flight <= 4
+
+
+def test_batch_file_round_trip(tmp_path):
+    path = make_workbook(tmp_path / "questions.xlsx", 25)
+    cache = ParseCache(":memory:")
+    client = FakeOpenAiClient()
+    parser = OpenAiParser(client=client, cache=cache, batch_size=10)  # type: ignore[arg-type]
+
+    requests = list(parser.batch_requests(path))
+    assert len(requests) == 3
+    assert requests[0]["body"]["response_format"]["type"] == "json_schema"
+
+    # The last request failed, and there is a line for an unknown request
+    results = [fake_batch_result(r) for r in requests[:2]]
+    results.append({**results[0], "custom_id": "unknown"})
+    results.append(
+        {"custom_id": requests[2]["custom_id"], "response": None, "error": "failed"}
+    )
+    results_path = tmp_path / "results.jsonl"
+    results_path.write_text("\n".join(json.dumps(r) for r in results))
+
+    assert parser.ingest_batch_results(results_path) == 20
+
+    # Only the rows from the failed request are sent, or written to a new batch file
+    rows = OpenAiParser(client=client, cache=cache).parse(path)  # type: ignore[arg-type]
+    assert client.rows_sent == 5
+    assert [r.question.text for r in rows] == [f"test question {i}" for i in range(25)]
+    assert list(parser.batch_requests(path)) == []
+
+
+def test_response_format():
+    """Strict structured outputs need every object closed, with all of its properties required."""
+    schema_format = response_format(ParsedBatch)
+    assert schema_format["type"] == "json_schema"
+    assert schema_format["json_schema"]["name"] == "ParsedBatch"
+    assert schema_format["json_schema"]["strict"]
+
+    schema = schema_format["json_schema"]["schema"]
+    objects = [schema, *schema["$defs"].values()]
+    assert len(objects) == 5
+    for obj in objects:
+        assert obj["additionalProperties"] is False
+        assert set(obj["required"]) == set(obj["properties"])
@@ -0,0 +1,27 @@
+from typing import get_args
+
+import pytest
+from mcq_bot.db.connection import STORAGE_PROFILES, get_engine, pragmas
+from mcq_bot.settings import StorageProfileName
+
+
+def test_storage_profile_names():
+    assert list(STORAGE_PROFILES) == list(get_args(StorageProfileName))
+
+
+@pytest.mark.parametrize("profile", STORAGE_PROFILES)
+def test_storage_profile_pragmas(tmp_path, profile: StorageProfileName):
+    storage = STORAGE_PROFILES[profile]
+    engine = get_engine(tmp_path / "test.db", profile)
+
+    assert pragmas(engine) == {
+        "journal_mode": "wal",
+        "synchronous": {"FULL": 2, "NORMAL": 1}[storage.synchronous],
+        "foreign_keys": 1,
+        "cache_size": -storage.cache_size_kib,
+        "mmap_size": storage.mmap_size,
+        "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}[storage.temp_store],
+        "busy_timeout": storage.busy_timeout_ms,
+    }
+    assert engine.pool.size() == storage.pool_size  # type: ignore[attr-defined]
+    engine.dispose()
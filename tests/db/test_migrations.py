@@ -0,0 +1,61 @@
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.migrations import MIGRATIONS, get_version, migrate
+from mcq_bot.db.schema import Base
+from sqlalchemy import inspect
+
+_INDEXES = {
+    "attempt": "ix_attempt_user_id_attempt_dt",
+    "answer": "ix_answer_question_id_is_correct",
+    "question": "ix_question_filename_id",
+}
+
+
+def _index_names(engine, table: str) -> set[str]:
+    return {i["name"] for i in inspect(engine).get_indexes(table)}  # type: ignore[misc]
+
+
+def test_new_db(tmp_path):
+    engine = get_engine(tmp_path / "new.db")
+
+    assert migrate(engine) == len(MIGRATIONS)
+
+    with engine.connect() as conn:
+        assert get_version(conn) == len(MIGRATIONS)
+    for table, index in _INDEXES.items():
+        assert index in _index_names(engine, table)
+
+
+def test_existing_db(tmp_path):
+    """A database created before migrations existed (version 0, without the indexes) is brought up to date."""
+    engine = get_engine(tmp_path / "existing.db")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index in _INDEXES.values():
+            conn.exec_driver_sql(f"DROP INDEX {index}")
+
+    assert migrate(engine) == len(MIGRATIONS)
+    for table, index in _INDEXES.items():
+        assert index in _index_names(engine, table)
+
+    # Already up to date
+    assert migrate(engine) == len(MIGRATIONS)
+
+
+def test_add_spaced_repetition(tmp_path):
+    """Users from before spaced repetition existed get the flag, turned off."""
+    engine = get_engine(tmp_path / "users.db")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE "user" (id INTEGER PRIMARY KEY, joined_dt DATETIME, exam_dt DATE NOT NULL, is_scheduled BOOLEAN NOT NULL)'
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO \"user\" VALUES (1, '2024-01-01 00:00:00', '2024-06-01', 1)"
+        )
+        conn.exec_driver_sql("PRAGMA user_version = 1")
+
+    assert migrate(engine) == len(MIGRATIONS)
+
+    with engine.connect() as conn:
+        flag = conn.exec_driver_sql('SELECT spaced_repetition FROM "user"').scalar()
+    assert flag == 0
+    assert "ix_review_user_id_due_dt" in _index_names(engine, "review")
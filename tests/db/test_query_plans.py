@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+import pytest
+from mcq_bot.db.query_recorder import full_scans, query_plan, record_queries
+from mcq_bot.managers.answer import AnswerManager
+from mcq_bot.managers.attempt import AttemptManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.review import ReviewAnswer, ReviewManager
+from mcq_bot.managers.stats import StatsManager
+from mcq_bot.managers.user import UserManager
+from tests.factories import answer_question, make_rows
+
+_USER_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def _data():
+    QuestionManager.bulk_add(make_rows(20), "test")
+    UserManager.add_user(_USER_ID, date.today() + timedelta(days=30))
+    answer_question(_USER_ID, 0, correct=True)
+    answer_question(_USER_ID, 1, correct=False)
+    ReviewManager.set_enabled(_USER_ID, True)
+    # Loaded once at startup
+    ReviewManager.reload()
+    ReviewManager.add_reviews(
+        [ReviewAnswer(_USER_ID, qid, False, datetime(2024, 1, 1)) for qid in (1, 2)]
+    )
+
+
+def _plans(call: Callable) -> list[list[str]]:
+    """Return the query plan of each SELECT made by the call."""
+    with record_queries() as queries:
+        call()
+    return [query_plan(q) for q in queries if q.statement.lstrip().startswith("SELECT")]
+
+
+# Per-user queries made while answering questions, which must not read whole tables
+_HOT_QUERIES: dict[str, Callable] = {
+    "get_attempt_stats": lambda: AttemptManager.get_attempt_stats(
+        _USER_ID, since_dt=datetime(2020, 1, 1)
+    ),
+    "get_attempted": lambda: AttemptManager.get_attempted(_USER_ID, only_correct=True),
+    "get_correct_answer": lambda: AnswerManager.get_correct_answer(3),
+    "fetch_random_single": lambda: QuestionManager.fetch_random_single(
+        _USER_ID, "test"
+    ),
+    "count": lambda: QuestionManager.count("test"),
+    "fetch": lambda: QuestionManager.fetch(3),
+    "add_or_update_user_attempt": lambda: answer_question(_USER_ID, 2, correct=True),
+    "get_user_stats": lambda: StatsManager.get_user_stats(_USER_ID, date.today()),
+    "fetch_next_id": lambda: QuestionManager.fetch_next_id(_USER_ID),
+    "count_due": lambda: ReviewManager.count_due(_USER_ID, datetime(2024, 1, 2)),
+}
+
+
+@pytest.mark.parametrize("call", _HOT_QUERIES.values(), ids=_HOT_QUERIES.keys())
+def test_no_full_scans(call: Callable):
+    with record_queries() as queries:
+        call()
+    selects = [q for q in queries if q.statement.lstrip().startswith("SELECT")]
+    assert selects
+
+    for query in selects:
+        scans = [
+            step
+            for step in full_scans(query)
+            # Counting all questions (for the stats total) reads the smallest index
+            if not step.startswith("SCAN question USING COVERING INDEX")
+        ]
+        assert not scans, query.statement
+
+
+def _uses_index(call: Callable, index: str) -> bool:
+    return any(index in step for plan in _plans(call) for step in plan)
+
+
+def test_attempts_by_user_and_time_use_index():
+    assert _uses_index(
+        _HOT_QUERIES["get_attempt_stats"], "ix_attempt_user_id_attempt_dt"
+    )
+
+
+def test_correct_answer_uses_index():
+    assert _uses_index(
+        _HOT_QUERIES["get_correct_answer"], "ix_answer_question_id_is_correct"
+    )
+
+
+def test_questions_by_filename_use_index():
+    assert _uses_index(_HOT_QUERIES["count"], "ix_question_filename_id")
+    assert _uses_index(_HOT_QUERIES["fetch_random_single"], "ix_question_filename_id")
+
+
+def test_most_overdue_review_uses_index():
+    """Picking the next review is a seek on (user_id, due_dt), rather than sorting the user's reviews."""
+    plans = _plans(_HOT_QUERIES["fetch_next_id"])
+    review = next(plan for plan in plans if any("review" in step for step in plan))
+    assert any("ix_review_user_id_due_dt" in step for step in review)
+    assert not any("TEMP B-TREE" in step for step in review)
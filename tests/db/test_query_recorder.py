@@ -0,0 +1,50 @@
+import pytest
+from mcq_bot.db.query_recorder import (
+    QueryBudgetExceeded,
+    assert_max_queries,
+    duplicate_queries,
+    record_queries,
+)
+from mcq_bot.managers.question import QuestionManager
+from tests.factories import make_rows
+
+
+@pytest.fixture(autouse=True)
+def _data():
+    QuestionManager.bulk_add(make_rows(3), "test")
+
+
+def test_duplicate_queries():
+    with record_queries() as queries:
+        for _ in range(3):
+            QuestionManager.count("test")
+        QuestionManager.fetch(1)
+
+    duplicates = duplicate_queries(queries)
+    assert len(duplicates) == 1
+    query, count = duplicates[0]
+    assert count == 3
+    assert query.parameters == ("test",)
+
+
+def test_assert_max_queries():
+    with assert_max_queries(2) as queries:
+        QuestionManager.count("test")
+        QuestionManager.fetch(1)
+    assert len(queries) == 2
+
+    with pytest.raises(QueryBudgetExceeded, match="Expected at most 1. 2 queries"):
+        with assert_max_queries(1):
+            QuestionManager.count("test")
+            QuestionManager.fetch(1)
+
+
+def test_assert_max_queries_duplicates():
+    with pytest.raises(QueryBudgetExceeded, match="2x SELECT"):
+        with assert_max_queries(10):
+            QuestionManager.count("test")
+            QuestionManager.count("test")
+
+    with assert_max_queries(10, allow_duplicates=True):
+        QuestionManager.count("test")
+        QuestionManager.count("test")
@@ -1,44 +1,14 @@
 import pytest
-from mcq_bot.db.connection import get_engine
 from mcq_bot.db.db_types import AnswerType, ProcessedRow, QuestionType
-from mcq_bot.db.schema import Base
 from mcq_bot.managers.question import QuestionManager
-from mcq_bot.utils.logger import setup_logging
+from tests.factories import make_rows
 
 _COUNT = 10
 
 
-@pytest.fixture(autouse=True, scope="session")
-def _setup_logging():
-    setup_logging()
-
-
-@pytest.fixture(autouse=True)
-def _prepare_db():
-    engine = get_engine()
-    Base.metadata.create_all(engine)
-    yield
-    Base.metadata.drop_all(engine)
-
-
 def get_rows() -> list[ProcessedRow]:
     """Return a normal list of ProcessedRows."""
-    return [
-        ProcessedRow(
-            question=QuestionType(
-                text=f"test question {i}", explanation=f"explanation {i}"
-            ),
-            answers=[
-                AnswerType(
-                    text=f"answer {j} for question {i}",
-                    key=j,
-                    is_correct=True if j == 0 else False,
-                )
-                for j in range(5)
-            ],
-        )
-        for i in range(_COUNT)
-    ]
+    return make_rows(_COUNT)
 
 
 @pytest.fixture
@@ -69,3 +39,22 @@ def test_duplicate_question():
     for _ in range(2):
         QuestionManager.bulk_add(rows, "test")
     assert QuestionManager.count() == _COUNT
+
+
+def test_duplicate_within_batch():
+    """Check that repeated rows within one batch are only added once, and reported as duplicates."""
+    rows = get_rows()
+    result = QuestionManager.bulk_add(rows + rows[:3], "test")
+    assert QuestionManager.count() == _COUNT
+    assert len(result["added"]) == _COUNT
+    assert len(result["duplicate"]) == 3
+
+
+def test_bulk_add_large_batch():
+    """Check that batches larger than one duplicate-lookup chunk are added with their answers."""
+    rows = make_rows(1000)
+    QuestionManager.bulk_add(rows[:500], "test")
+    result = QuestionManager.bulk_add(rows, "test")
+    assert len(result["added"]) == 500
+    assert len(result["duplicate"]) == 500
+    assert QuestionManager.count() == 1000
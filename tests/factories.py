@@ -0,0 +1,67 @@
+from pathlib import Path
+
+from mcq_bot.db.db_types import AnswerType, ProcessedRow, QuestionType
+from mcq_bot.managers.attempt import AttemptManager
+from mcq_bot.managers.question import QuestionManager
+from openpyxl import Workbook
+
+
+def make_rows(count: int) -> list[ProcessedRow]:
+    """Return a normal list of ProcessedRows, where the first answer is the correct one."""
+    return [
+        ProcessedRow(
+            question=QuestionType(
+                text=f"test question {i}", explanation=f"explanation {i}"
+            ),
+            answers=[
+                AnswerType(
+                    text=f"answer {j} for question {i}",
+                    key=j,
+                    is_correct=j == 0,
+                )
+                for j in range(5)
+            ],
+        )
+        for i in range(count)
+    ]
+
+
+def answer_question(user_id: int, question_idx: int, correct: bool):
+    """Record an attempt by the user at a question from `make_rows`."""
+    question = QuestionManager.by_text(f"test question {question_idx}")
+    assert question
+    answer = next(a for a in question.answers if a.is_correct == correct)
+    AttemptManager.add_or_update_user_attempt(user_id, answer.id)
+
+
+EXCEL_HEADERS = (
+    "No.",
+    "Question",
+    "A",
+    "B",
+    "C",
+    "D",
+    "E",
+    "Answer",
+    "Explanation",
+)
+
+
+def make_workbook(path: Path, count: int) -> Path:
+    """Write an .xlsx file in the `ExcelParser` format with `count` questions (the correct answer is always A)."""
+    wb = Workbook()
+    sheet = wb.active
+    assert sheet
+    sheet.append(EXCEL_HEADERS)
+    for i in range(count):
+        sheet.append(
+            (
+                i + 1,
+                f"test question {i}",
+                *(f"answer {j} for question {i}" for j in range(5)),
+                "A",
+                f"explanation {i}",
+            )
+        )
+    wb.save(path)
+    return path
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+import httpx
+from mcq_bot.db.db_types import (
+    VALID_ANSWER_LETTERS,
+    AnswerType,
+    ProcessedRow,
+    QuestionType,
+)
+from openai import LengthFinishReasonError, RateLimitError
+
+
+def fake_parse_row(row: dict[str, str]) -> ProcessedRow:
+    """Parse a formatted row from a sheet written by `factories.make_workbook`."""
+    return ProcessedRow(
+        question=QuestionType(text=row["Question"], explanation=row["Explanation"]),
+        answers=[
+            AnswerType(is_correct=letter == row["Answer"], key=idx, text=row[letter])
+            for idx, letter in enumerate(VALID_ANSWER_LETTERS)
+        ],
+    )
+
+
+def _rows_from_messages(messages: list[dict[str, str]]) -> list[dict]:
+    """Return the indexed rows sent in a request. They are sent as JSON, followed by the prompt on the last line."""
+    content = messages[-1]["content"]
+    return json.loads(content[: content.rindex("\n")])
+
+
+def fake_batch_result(request: dict) -> dict:
+    """Return the Batch API results file line for a request from `OpenAiParser.batch_requests`."""
+    rows = _rows_from_messages(request["body"]["messages"])
+    content = json.dumps(
+        {
+            "rows": [
+                {"index": r["index"], "row": fake_parse_row(r["row"]).model_dump()}
+                for r in rows
+            ]
+        }
+    )
+    return {
+        "id": f"batch_req_{request['custom_id']}",
+        "custom_id": request["custom_id"],
+        "response": {
+            "status_code": 200,
+            "body": {
+                "choices": [
+                    {
+                        "message": {
+                            "role": "assistant",
+                            "content": content,
+                            "refusal": None,
+                        }
+                    }
+                ]
+            },
+        },
+        "error": None,
+    }
+
+
+class FakeOpenAiClient:
+    """
+    Stand-in for `AsyncOpenAI` that parses batches of rows locally.
+
+    rate_limited: Number of requests to fail with a RateLimitError before succeeding.
+    drop_last: Leave the last row out of responses for batches of more than one row.
+    max_delay: Respond after a random delay of up to this many seconds, so responses complete out of order.
+    failing_question: Fail requests containing the row with this question text with a LengthFinishReasonError.
+    """
+
+    def __init__(
+        self,
+        rate_limited: int = 0,
+        drop_last: bool = False,
+        max_delay: float = 0,
+        failing_question: str | None = None,
+    ) -> None:
+        self.calls = 0
+        self.rows_sent = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited = rate_limited
+        self.drop_last = drop_last
+        self.max_delay = max_delay
+        self.failing_question = failing_question
+        self.beta = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(parse=self._parse))
+        )
+
+    async def _parse(self, model: str, messages: list[dict[str, str]], response_format):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, self.max_delay))
+            if self.rate_limited:
+                self.rate_limited -= 1
+                request = httpx.Request("POST", "https://api.openai.com")
+                raise RateLimitError(
+                    "Rate limited",
+                    response=httpx.Response(429, request=request),
+                    body=None,
+                )
+
+            rows = _rows_from_messages(messages)
+            self.rows_sent += len(rows)
+            if any(r["row"]["Question"] == self.failing_question for r in rows):
+                raise LengthFinishReasonError(completion=SimpleNamespace(usage=None))  # type: ignore[arg-type]
+            if self.drop_last and len(rows) > 1:
+                rows = rows[:-1]
+            parsed = response_format(
+                rows=[
+                    {"index": r["index"], "row": fake_parse_row(r["row"])} for r in rows
+                ]
+            )
+            message = SimpleNamespace(parsed=parsed, refusal=None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, cast
+
+import pytest
+from mcq_bot.benchmark.fake_telegram import (
+    FakeCallbackEvent,
+    FakeClient,
+    use_fake_client,
+)
+from mcq_bot.db.query_recorder import assert_max_queries
+from mcq_bot.handlers.admin import handle_admin
+from mcq_bot.handlers.exam import handle_exam_date
+from mcq_bot.handlers.next_question import handle_next_question_callback
+from mcq_bot.handlers.nudge import handle_nudge
+from mcq_bot.handlers.question import handle_question
+from mcq_bot.handlers.question_callback import handle_question_callback
+from mcq_bot.handlers.review import handle_review
+from mcq_bot.handlers.stats import handle_stats
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.review import ReviewManager
+from mcq_bot.managers.user import UserManager
+from mcq_bot.managers.utils import unit_of_work
+from mcq_bot.senders.sender_types import AnswerCallback
+from telethon import events
+from telethon.custom import Message
+from telethon.events import StopPropagation
+from tests.factories import answer_question, make_rows
+
+_USER_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def _data():
+    QuestionManager.bulk_add(make_rows(20), "test")
+    for user_id in (_USER_ID, 2, 3):
+        UserManager.add_user(user_id, date.today() + timedelta(days=30))
+        answer_question(user_id, 0, correct=True)
+        answer_question(user_id, 1, correct=False)
+    CatalogManager.reload()
+    ReviewManager.reload()
+
+
+@pytest.fixture(autouse=True)
+def _no_prefetch(monkeypatch):
+    # Runs in the background, so its queries would count towards the budget only if it happened to start before the handler returned
+    monkeypatch.setattr(
+        "mcq_bot.handlers.question_callback.prefetch_question", lambda user_id: None
+    )
+
+
+def _message(client: FakeClient, text: str) -> Message:
+    return cast(Message, client.message(_USER_ID, text))
+
+
+def _answer_event(client: FakeClient) -> events.CallbackQuery.Event:
+    question = CatalogManager.get_question(CatalogManager.question_ids()[5])
+    assert question
+    message = client.message(_USER_ID, question.html)
+    callback = AnswerCallback(_USER_ID, question.answers[0].id, question.id)
+    return cast(events.CallbackQuery.Event, FakeCallbackEvent(message, callback))
+
+
+def _nudge_event(client: FakeClient) -> events.CallbackQuery.Event:
+    message = client.message(_USER_ID, "Nudge")
+    return cast(events.CallbackQuery.Event, FakeCallbackEvent(message, _USER_ID))
+
+
+# Handler (given the fake client), and the most queries it may make for one update
+_BUDGETS: dict[str, tuple[Callable[[FakeClient], Awaitable[Any]], int]] = {
+    "question": (lambda c: handle_question(_message(c, "/question")), 1),
+    "question_callback": (lambda c: handle_question_callback(_answer_event(c)), 5),
+    "next_question_callback": (
+        lambda c: handle_next_question_callback(_nudge_event(c)),
+        1,
+    ),
+    "stats": (lambda c: handle_stats(_message(c, "/stats")), 1),
+    # One query for all users, not one per user
+    "admin": (lambda c: handle_admin(_message(c, "/admin")), 1),
+    "exam": (lambda c: handle_exam_date(_message(c, "/exam")), 1),
+    "nudge": (lambda c: handle_nudge(_message(c, "/nudge")), 1),
+    "review": (lambda c: handle_review(_message(c, "/review on")), 1),
+}
+
+
+@pytest.mark.parametrize("handler,budget", _BUDGETS.values(), ids=_BUDGETS.keys())
+def test_query_budget(handler: Callable[[FakeClient], Awaitable[Any]], budget: int):
+    async def _test():
+        with use_fake_client(FakeClient()) as client:
+            # As registered, sharing one session
+            with assert_max_queries(budget):
+                async with unit_of_work():
+                    try:
+                        await handler(client)
+                    except StopPropagation:
+                        pass
+            assert client.requests
+
+    asyncio.run(_test())
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from datetime import date
+
+from mcq_bot.db.query_recorder import record_queries
+from mcq_bot.managers.attempt import AttemptManager
+from mcq_bot.managers.attempt_writer import AttemptWriter
+from mcq_bot.managers.catalog import CatalogAnswer, CatalogManager
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.stats import StatsManager
+from mcq_bot.managers.user import UserManager
+from mcq_bot.managers.utils import run_db
+from mcq_bot.utils.dates import local_today
+from sqlalchemy.exc import OperationalError
+from tests.factories import make_rows
+
+_USER_ID = 1
+
+
+def _setup():
+    QuestionManager.bulk_add(make_rows(5), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+
+
+def _answer(question_idx: int, correct: bool) -> CatalogAnswer:
+    question = CatalogManager.get_question(CatalogManager.question_ids()[question_idx])
+    assert question
+    return next(a for a in question.answers if a.is_correct == correct)
+
+
+def test_record_without_start_writes_immediately():
+    _setup()
+    writer = AttemptWriter(flush_interval=60, batch_size=100)
+
+    async def _test():
+        assert await writer.record(_USER_ID, _answer(0, correct=False))
+        assert await writer.record(_USER_ID, _answer(0, correct=True))
+        # Already recorded
+        assert not await writer.record(_USER_ID, _answer(0, correct=True))
+
+    asyncio.run(_test())
+    assert AttemptManager.get_attempted(_USER_ID) == 1
+    assert AttemptManager.get_attempted(_USER_ID, only_correct=True) == 1
+    assert ProgressManager.check() == {}
+
+
+def test_pending_attempts_are_read_and_written_in_one_batch():
+    _setup()
+    writer = AttemptWriter(flush_interval=60, batch_size=100)
+    answers = [
+        _answer(0, correct=False),
+        _answer(0, correct=True),
+        _answer(0, correct=True),  # Duplicate of a queued attempt
+        _answer(1, correct=True),
+        _answer(2, correct=False),
+    ]
+
+    async def _test():
+        writer.start()
+        new = [await writer.record(_USER_ID, answer) for answer in answers]
+        assert new == [True, True, False, True, True]
+
+        # Nothing written yet, but reads include the queued attempts
+        assert AttemptManager.get_attempted(_USER_ID) == 0
+        assert writer.pending_progress(_USER_ID, local_today()) == (3, 2, 4)
+        assert writer.pending_correct(_USER_ID) == {
+            answers[1].question_id,
+            answers[3].question_id,
+        }
+
+        with record_queries() as queries:
+            await writer.stop()
+        return queries
+
+    queries = asyncio.run(_test())
+    inserts = [q for q in queries if q.statement.startswith("INSERT INTO attempt")]
+    assert len(inserts) == 1
+
+    assert AttemptManager.get_attempted(_USER_ID) == 3
+    assert AttemptManager.get_attempted(_USER_ID, only_correct=True) == 2
+    assert ProgressManager.check() == {}
+    assert writer.pending_progress(_USER_ID, local_today()) == (0, 0, 0)
+
+
+def test_flushes_when_batch_is_full():
+    _setup()
+    writer = AttemptWriter(flush_interval=60, batch_size=2)
+
+    async def _test():
+        writer.start()
+        await writer.record(_USER_ID, _answer(0, correct=True))
+        await writer.record(_USER_ID, _answer(1, correct=True))
+        for _ in range(100):
+            if await run_db(AttemptManager.get_attempted, _USER_ID) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(_test())
+    assert AttemptManager.get_attempted(_USER_ID) == 2
+
+
+def test_stats_include_pending_attempts(monkeypatch):
+    _setup()
+    writer = AttemptWriter(flush_interval=60, batch_size=100)
+    monkeypatch.setattr("mcq_bot.managers.stats.attempt_writer", writer)
+    monkeypatch.setattr("mcq_bot.managers.question.attempt_writer", writer)
+    correct = _answer(0, correct=True)
+
+    async def _test():
+        writer.start()
+        await writer.record(_USER_ID, correct)
+        stats = StatsManager.get_user_stats(_USER_ID, local_today())
+        assert (stats["attempted"], stats["correct"], stats["attempted_today"]) == (
+            1,
+            1,
+            1,
+        )
+
+        # A question pool built before the attempt is written still leaves it out
+        CatalogManager.invalidate()
+        for _ in range(20):
+            assert QuestionManager.fetch_random_id(_USER_ID) != correct.question_id
+        await writer.stop()
+
+    asyncio.run(_test())
+    stats = StatsManager.get_user_stats(_USER_ID, local_today())
+    assert (stats["attempted"], stats["correct"], stats["attempted_today"]) == (1, 1, 1)
+
+
+def test_stop_waits_for_write_in_progress():
+    """Stopping while a flush waits for a busy db thread still writes its batch."""
+    _setup()
+    writer = AttemptWriter(flush_interval=0.05, batch_size=100)
+
+    async def _test():
+        writer.start()
+        assert await writer.record(_USER_ID, _answer(0, correct=True))
+        # Keeps the db thread busy past the flush
+        busy = asyncio.create_task(run_db(time.sleep, 0.3))
+        await asyncio.sleep(0.1)
+        assert not writer._pending
+        await writer.stop()
+        await busy
+
+    asyncio.run(_test())
+    assert AttemptManager.get_attempted(_USER_ID) == 1
+    assert ProgressManager.check() == {}
+
+
+def _failing_add_attempts(monkeypatch, failures: int | None) -> list[int]:
+    """Make the first `failures` writes (all of them if None) fail as if the database were locked, returning a list the number of writes is appended to."""
+    add_attempts = AttemptManager.add_attempts
+    calls: list[int] = []
+
+    def _add_attempts(attempts, reviews=()):
+        calls.append(len(calls) + 1)
+        if failures is None or len(calls) <= failures:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return add_attempts(attempts, reviews)
+
+    monkeypatch.setattr(AttemptManager, "add_attempts", _add_attempts)
+    return calls
+
+
+def test_failed_write_is_requeued(monkeypatch):
+    _setup()
+    calls = _failing_add_attempts(monkeypatch, failures=2)
+    writer = AttemptWriter(flush_interval=0.01, batch_size=100, retry_delay=0.01)
+
+    async def _test():
+        writer.start()
+        assert await writer.record(_USER_ID, _answer(0, correct=True))
+        assert await writer.record(_USER_ID, _answer(1, correct=False))
+        for _ in range(100):
+            if len(calls) > 2:
+                break
+            # Still counted while the writes fail
+            assert writer.pending_progress(_USER_ID, local_today()).attempted == 2
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(_test())
+    assert len(calls) == 3
+    assert AttemptManager.get_attempted(_USER_ID) == 2
+    assert ProgressManager.check() == {}
+
+
+def test_run_survives_unexpected_errors(monkeypatch):
+    _setup()
+    writer = AttemptWriter(flush_interval=0.01, batch_size=100, retry_delay=0.01)
+    flush = writer.flush
+    calls: list[int] = []
+
+    async def _flush():
+        calls.append(len(calls) + 1)
+        if len(calls) == 1:
+            raise RuntimeError("Unexpected")
+        return await flush()
+
+    monkeypatch.setattr(writer, "flush", _flush)
+
+    async def _test():
+        writer.start()
+        assert await writer.record(_USER_ID, _answer(0, correct=True))
+        await asyncio.sleep(0.2)
+        assert writer._task and not writer._task.done()
+        assert not writer._pending
+        await writer.stop()
+
+    asyncio.run(_test())
+    assert AttemptManager.get_attempted(_USER_ID) == 1
+
+
+def test_stop_gives_up_after_retries(monkeypatch):
+    _setup()
+    calls = _failing_add_attempts(monkeypatch, failures=None)
+    writer = AttemptWriter(flush_interval=60, batch_size=100, retry_delay=0.01)
+
+    async def _test():
+        # Written straight away, and kept queued when that fails
+        assert await writer.record(_USER_ID, _answer(0, correct=True))
+        assert writer.pending_correct(_USER_ID)
+        await writer.stop()
+
+    asyncio.run(_test())
+    assert len(calls) == 4
+    assert len(writer._pending) == 1
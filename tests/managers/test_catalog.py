@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.question import QuestionManager
+from tests.factories import make_rows
+
+
+def test_catalog_matches_db():
+    QuestionManager.bulk_add(make_rows(2), "test")
+    question = QuestionManager.by_text("test question 1")
+    assert question
+
+    cached = CatalogManager.get_question(question.id)
+    assert cached
+    assert cached.text == question.text
+    assert cached.explanation == question.explanation
+    assert cached.filename == "test"
+    assert [a.id for a in cached.answers] == [a.id for a in question.answers]
+    assert cached.correct_key == 0
+    assert cached.html.startswith("<p>test question 1<p>\n\n<b>A.</b> answer 0")
+    assert cached.html.endswith("<i>From test</i>")
+
+    answer = question.answers[1]
+    assert CatalogManager.get_answer(answer.id) == cached.answers[1]
+    assert CatalogManager.get_question(-1) is None
+
+
+def test_catalog_reloads_after_import():
+    QuestionManager.bulk_add(make_rows(1), "test")
+    assert len(CatalogManager.question_ids()) == 1
+
+    QuestionManager.bulk_add(make_rows(3), "test")
+    assert len(CatalogManager.question_ids()) == 3
+
+
+def test_ensure_loaded_reloads_off_the_event_loop(monkeypatch):
+    QuestionManager.bulk_add(make_rows(2), "test")
+    reload = CatalogManager.reload
+    threads: list[str] = []
+
+    def _reload():
+        threads.append(threading.current_thread().name)
+        return reload()
+
+    monkeypatch.setattr(CatalogManager, "reload", _reload)
+
+    async def _test():
+        await CatalogManager.ensure_loaded()
+        # Already loaded
+        await CatalogManager.ensure_loaded()
+        return CatalogManager.question_ids()
+
+    assert len(asyncio.run(_test())) == 2
+    assert len(threads) == 1
+    assert threads[0] != threading.current_thread().name
@@ -0,0 +1,51 @@
+from datetime import date
+
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.schema import UserProgress
+from mcq_bot.managers.progress import ProgressManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.user import UserManager
+from sqlalchemy import delete, update
+from tests.factories import answer_question, make_rows
+
+_USER_ID = 1
+
+
+def _setup_attempts():
+    QuestionManager.bulk_add(make_rows(3), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+    answer_question(_USER_ID, 0, correct=False)
+    answer_question(_USER_ID, 0, correct=True)
+    answer_question(_USER_ID, 0, correct=True)  # Duplicate, ignored
+    answer_question(_USER_ID, 1, correct=False)
+
+
+def test_counters_match_attempts():
+    _setup_attempts()
+    assert ProgressManager.check() == {}
+    assert not ProgressManager.needs_backfill()
+
+
+def test_rebuild_fixes_mismatch():
+    _setup_attempts()
+    with get_engine().begin() as conn:
+        conn.execute(update(UserProgress).values(attempted=10))
+
+    assert ProgressManager.check() == {_USER_ID: {"attempted": (10, 2)}}
+
+    ProgressManager.rebuild()
+    assert ProgressManager.check() == {}
+
+
+def test_backfill_missing_counters():
+    _setup_attempts()
+    with get_engine().begin() as conn:
+        conn.execute(delete(UserProgress))
+
+    assert ProgressManager.needs_backfill()
+    assert ProgressManager.check() == {
+        _USER_ID: {"attempted": (0, 2), "correct": (0, 1)}
+    }
+
+    ProgressManager.rebuild()
+    assert ProgressManager.check() == {}
@@ -0,0 +1,52 @@
+from datetime import date
+
+from mcq_bot.managers.attempt import AttemptManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.question_pool import question_pool
+from mcq_bot.managers.user import UserManager
+from tests.factories import make_rows
+
+_USER_ID = 1
+
+
+def test_correct_answers_leave_the_pool():
+    QuestionManager.bulk_add(make_rows(3), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+
+    seen: set[int] = set()
+    while question := QuestionManager.fetch_random_single(_USER_ID):
+        assert question.id not in seen
+        seen.add(question.id)
+        correct = next(a for a in question.answers if a.is_correct)
+        AttemptManager.add_or_update_user_attempt(_USER_ID, correct.id)
+
+    assert len(seen) == 3
+
+
+def test_incorrect_answers_stay_in_pool():
+    QuestionManager.bulk_add(make_rows(1), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+
+    question = QuestionManager.fetch_random_single(_USER_ID)
+    assert question
+    incorrect = next(a for a in question.answers if not a.is_correct)
+    AttemptManager.add_or_update_user_attempt(_USER_ID, incorrect.id)
+
+    again = QuestionManager.fetch_random_single(_USER_ID)
+    assert again and again.id == question.id
+
+
+def test_pool_is_rebuilt_from_db():
+    """A fresh pool (e.g. after a restart) must not contain questions already answered correctly."""
+    QuestionManager.bulk_add(make_rows(2), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+
+    question = QuestionManager.fetch_random_single(_USER_ID)
+    assert question
+    correct = next(a for a in question.answers if a.is_correct)
+    AttemptManager.add_or_update_user_attempt(_USER_ID, correct.id)
+
+    question_pool.invalidate()
+    for _ in range(10):
+        other = QuestionManager.fetch_random_single(_USER_ID)
+        assert other and other.id != question.id
@@ -0,0 +1,177 @@
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.schema import Review
+from mcq_bot.managers.attempt_writer import attempt_writer
+from mcq_bot.managers.catalog import CatalogAnswer, CatalogManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.review import (
+    ReviewAnswer,
+    ReviewManager,
+    ReviewState,
+    schedule,
+)
+from mcq_bot.managers.user import UserManager
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.factories import make_rows
+
+_USER_ID = 1
+_NOW = datetime(2024, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def _data():
+    QuestionManager.bulk_add(make_rows(5), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+    assert ReviewManager.set_enabled(_USER_ID, True)
+
+
+def _question_id(question_idx: int) -> int:
+    return CatalogManager.question_ids()[question_idx]
+
+
+def _answer(question_idx: int, correct: bool) -> CatalogAnswer:
+    question = CatalogManager.get_question(_question_id(question_idx))
+    assert question
+    return next(a for a in question.answers if a.is_correct == correct)
+
+
+def _review(question_idx: int) -> Review | None:
+    with Session(get_engine(), expire_on_commit=False) as s:
+        return s.scalar(
+            select(Review)
+            .where(Review.user_id == _USER_ID)
+            .where(Review.question_id == _question_id(question_idx))
+        )
+
+
+def test_schedule():
+    state = schedule(None, is_correct=True, now=_NOW)
+    assert state == ReviewState(_NOW + timedelta(days=1), 1, 1, 2.5)
+
+    state = schedule(state, is_correct=True, now=_NOW)
+    assert state.due_dt == _NOW + timedelta(days=6)
+
+    state = schedule(state, is_correct=True, now=_NOW)
+    assert state.due_dt == _NOW + timedelta(days=15)
+    assert state.repetitions == 3
+
+    # Back to the start, and the interval grows more slowly from now on
+    state = schedule(state, is_correct=False, now=_NOW)
+    assert state == ReviewState(_NOW + timedelta(minutes=10), 0, 0, 2.3)
+    for _ in range(10):
+        state = schedule(state, is_correct=False, now=_NOW)
+    assert state.ease == 1.3
+
+
+def test_add_reviews_in_order():
+    ReviewManager.add_reviews(
+        [
+            ReviewAnswer(_USER_ID, _question_id(0), True, _NOW),
+            ReviewAnswer(_USER_ID, _question_id(0), True, _NOW),
+            ReviewAnswer(_USER_ID, _question_id(1), False, _NOW),
+        ]
+    )
+    ReviewManager.add_reviews([ReviewAnswer(_USER_ID, _question_id(1), True, _NOW)])
+
+    first, second = _review(0), _review(1)
+    assert first and first.repetitions == 2
+    assert first.due_dt == _NOW + timedelta(days=6)
+    assert second and second.repetitions == 1
+    assert second.due_dt == _NOW + timedelta(days=1)
+
+
+def test_set_enabled():
+    assert ReviewManager.is_enabled(_USER_ID)
+    assert ReviewManager.set_enabled(_USER_ID, False)
+    assert not ReviewManager.is_enabled(_USER_ID)
+
+    # Read back from the database
+    ReviewManager.invalidate()
+    assert not ReviewManager.is_enabled(_USER_ID)
+    assert ReviewManager.set_enabled(_USER_ID, True)
+    assert ReviewManager.reload() == 1
+
+    # No such user
+    assert not ReviewManager.set_enabled(2, True)
+
+
+def test_fetch_next_id_prefers_most_overdue():
+    now = datetime.now(UTC).replace(tzinfo=None)
+    ReviewManager.add_reviews(
+        [
+            ReviewAnswer(_USER_ID, _question_id(0), False, now - timedelta(hours=2)),
+            ReviewAnswer(_USER_ID, _question_id(1), False, now - timedelta(hours=1)),
+            ReviewAnswer(_USER_ID, _question_id(2), True, now),
+        ]
+    )
+
+    assert QuestionManager.fetch_next_id(_USER_ID) == _question_id(0)
+    assert ReviewManager.count_due(_USER_ID, now) == 2
+
+    # Not yet due
+    ReviewManager.add_reviews([ReviewAnswer(_USER_ID, _question_id(0), True, now)])
+    assert QuestionManager.fetch_next_id(_USER_ID) == _question_id(1)
+    ReviewManager.add_reviews([ReviewAnswer(_USER_ID, _question_id(1), True, now)])
+
+    # Then questions not reviewed yet
+    new = {QuestionManager.fetch_next_id(_USER_ID) for _ in range(20)}
+    assert new == {_question_id(3), _question_id(4)}
+
+    # Then the review due soonest
+    ReviewManager.add_reviews(
+        [ReviewAnswer(_USER_ID, _question_id(i), True, now) for i in (3, 4)]
+    )
+    ReviewManager.add_reviews([ReviewAnswer(_USER_ID, _question_id(2), True, now)])
+    assert QuestionManager.fetch_next_id(_USER_ID) in {
+        _question_id(i) for i in (0, 1, 3, 4)
+    }
+
+
+def test_fetch_next_id_when_disabled():
+    ReviewManager.set_enabled(_USER_ID, False)
+    now = datetime.now(UTC).replace(tzinfo=None)
+    ReviewManager.add_reviews(
+        [ReviewAnswer(_USER_ID, _question_id(0), False, now - timedelta(days=1))]
+    )
+
+    picked = {QuestionManager.fetch_next_id(_USER_ID) for _ in range(50)}
+    assert len(picked) > 1
+
+
+def test_repeated_answers_are_reviewed():
+    async def _test():
+        # Written straight away
+        assert await attempt_writer.record(_USER_ID, _answer(0, correct=True))
+        # Already attempted, but still a review
+        assert not await attempt_writer.record(_USER_ID, _answer(0, correct=True))
+
+    asyncio.run(_test())
+    review = _review(0)
+    assert review and review.repetitions == 2
+
+
+def test_pending_reviews_are_skipped():
+    now = datetime.now(UTC).replace(tzinfo=None)
+    ReviewManager.add_reviews(
+        [ReviewAnswer(_USER_ID, _question_id(0), False, now - timedelta(days=1))]
+    )
+    assert QuestionManager.fetch_next_id(_USER_ID) == _question_id(0)
+
+    async def _test():
+        attempt_writer.start()
+        try:
+            await attempt_writer.record(_USER_ID, _answer(0, correct=True))
+            assert attempt_writer.pending_reviews(_USER_ID) == {_question_id(0)}
+            # Still overdue in the database, but just answered
+            assert QuestionManager.fetch_next_id(_USER_ID) != _question_id(0)
+        finally:
+            await attempt_writer.stop()
+
+    asyncio.run(_test())
+    assert attempt_writer.pending_reviews(_USER_ID) == set()
+    review = _review(0)
+    assert review and review.due_dt > now
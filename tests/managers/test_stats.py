@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+from mcq_bot.db.db_types import UserNotFound
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.stats import StatsManager
+from mcq_bot.managers.user import UserManager
+from mcq_bot.utils.dates import local_today
+from tests.factories import answer_question, make_rows
+
+_USER_ID = 1
+_EXAM_DT = date(2100, 1, 1)
+
+
+def test_get_user_stats():
+    QuestionManager.bulk_add(make_rows(5), "test")
+    UserManager.add_user(_USER_ID, _EXAM_DT)
+
+    answer_question(_USER_ID, 0, correct=True)
+    answer_question(_USER_ID, 1, correct=False)
+    answer_question(_USER_ID, 1, correct=True)
+    answer_question(_USER_ID, 2, correct=False)
+
+    stats = StatsManager.get_user_stats(_USER_ID, local_today())
+    assert stats == {
+        "total": 5,
+        "attempted": 3,
+        "correct": 2,
+        "exam_dt": _EXAM_DT,
+        "attempted_today": 4,
+    }
+
+    tomorrow = local_today() + timedelta(days=1)
+    assert StatsManager.get_user_stats(_USER_ID, tomorrow)["attempted_today"] == 0
+
+
+def test_get_user_stats_unknown_user():
+    with pytest.raises(UserNotFound):
+        StatsManager.get_user_stats(_USER_ID, local_today())
+
+
+def test_get_all_user_stats():
+    QuestionManager.bulk_add(make_rows(5), "test")
+    UserManager.add_user(_USER_ID, _EXAM_DT)
+    UserManager.add_user(_USER_ID + 1, _EXAM_DT)
+    answer_question(_USER_ID, 0, correct=True)
+
+    all_stats = StatsManager.get_all_user_stats(local_today())
+    assert all_stats == {
+        _USER_ID: StatsManager.get_user_stats(_USER_ID, local_today()),
+        _USER_ID + 1: {
+            "total": 5,
+            "attempted": 0,
+            "correct": 0,
+            "exam_dt": _EXAM_DT,
+            "attempted_today": 0,
+        },
+    }
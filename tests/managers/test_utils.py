@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from datetime import date
+
+import pytest
+from mcq_bot.db.connection import get_engine
+from mcq_bot.db.schema import Base, User
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.user import UserManager
+from mcq_bot.managers import utils
+from mcq_bot.managers.utils import run_db, unit_of_work, with_session
+from mcq_bot.utils.metrics import DB_QUERIES, DB_SESSION_SECONDS
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from tests.factories import make_rows
+
+
+def test_run_db_runs_off_the_event_loop_thread():
+    async def main():
+        return await run_db(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()) != threading.current_thread().name
+
+
+def test_run_db_sees_the_same_database():
+    QuestionManager.bulk_add(make_rows(3), "test")
+
+    async def main():
+        return await run_db(QuestionManager.count, filename="test")
+
+    assert asyncio.run(main()) == 3
+
+
+def test_with_session_records_metrics():
+    QuestionManager.bulk_add(make_rows(3), "test")
+    calls = DB_SESSION_SECONDS.count("QuestionManager.count")
+    queries = DB_QUERIES.value("QuestionManager.count")
+
+    QuestionManager.count("test")
+
+    assert DB_SESSION_SECONDS.count("QuestionManager.count") == calls + 1
+    assert DB_QUERIES.value("QuestionManager.count") == queries + 1
+
+
+class _SessionManager:
+    @classmethod
+    @with_session
+    def session(cls, s: Session) -> Session:
+        return s
+
+    @classmethod
+    @with_session
+    def add_user_and_fail(cls, s: Session, user_id: int):
+        s.add(User(id=user_id, exam_dt=date(2030, 1, 1)))
+        s.flush()
+        raise ValueError
+
+
+def test_unit_of_work_shares_session():
+    async def main():
+        async with unit_of_work():
+            first = await run_db(_SessionManager.session)
+            second = await run_db(_SessionManager.session)
+            async with unit_of_work():
+                nested = await run_db(_SessionManager.session)
+        outside = await run_db(_SessionManager.session)
+        return first, second, nested, outside
+
+    first, second, nested, outside = asyncio.run(main())
+    assert first is second is nested
+    assert outside is not first
+    assert _SessionManager.session() is not _SessionManager.session()
+
+
+def test_unit_of_work_commits_and_discards():
+    async def main():
+        async with unit_of_work():
+            await run_db(UserManager.add_user, 1, date(2030, 1, 1))
+            with pytest.raises(ValueError):
+                await run_db(_SessionManager.add_user_and_fail, 2)
+            # The failed call's changes aren't committed by later ones
+            await run_db(UserManager.add_user, 3, date(2030, 1, 1))
+
+    asyncio.run(main())
+    assert UserManager.get_user(1)
+    with pytest.raises(ValueError):
+        UserManager.get_user(2)
+    assert UserManager.get_user(3)
+
+
+def test_unit_of_work_uses_one_connection(tmp_path, monkeypatch):
+    """More concurrent units than the pool has connections don't block the db thread, as they all use its one connection."""
+    engine = get_engine(tmp_path / "pool.db")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(utils, "get_engine", lambda: engine)
+    units = engine.pool.size() + engine.pool._max_overflow + 5  # type: ignore[attr-defined]
+    checkouts: list[object] = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(args))
+
+    async def handler(read: asyncio.Barrier):
+        async with unit_of_work():
+            await run_db(UserManager.get_all_users)
+            # Every unit is open and has read
+            await read.wait()
+            assert engine.pool.checkedout() == 1  # type: ignore[attr-defined]
+            # E.g. a Telegram request
+            await asyncio.sleep(0.1)
+            await run_db(UserManager.get_all_users)
+        await run_db(UserManager.get_all_users)
+
+    async def main():
+        read = asyncio.Barrier(units)
+        await asyncio.wait_for(
+            asyncio.gather(*(handler(read) for _ in range(units))), 5
+        )
+
+    asyncio.run(main())
+    assert len(checkouts) == 1
@@ -0,0 +1,86 @@
+import json
+import os
+from functools import partial
+from typing import cast
+
+import pytest
+from mcq_bot.db.parsers.excel import ExcelParser
+from mcq_bot.db.parsers.hybrid import HybridParser
+from mcq_bot.db.parsers.openai import OpenAiParser
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.scripts import add_questions
+from mcq_bot.settings import Settings
+from openai import AsyncOpenAI
+from tests.factories import make_rows, make_workbook
+from tests.fakes import FakeOpenAiClient, fake_batch_result
+
+
+def test_process_rows_in_chunks(monkeypatch):
+    monkeypatch.setattr(add_questions, "CHUNK_SIZE", 7)
+    rows = make_rows(20)
+
+    summary = add_questions._process_rows(iter(rows + rows[:5]), "test")
+
+    assert summary == {"total": 25, "added": 20, "duplicate": 5}
+    assert QuestionManager.count() == 20
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_process_folder(tmp_path, workers):
+    make_workbook(tmp_path / "a.xlsx", 10)
+    save_dir = tmp_path / "saved"
+
+    summary = add_questions.process_folder(tmp_path, ExcelParser, save_dir, workers)
+
+    assert summary["a.xlsx"] == {"total": 10, "added": 10, "duplicate": 0}
+    assert (save_dir / "a.xlsx.json").exists()
+    assert QuestionManager.count() == 10
+
+
+def test_process_folder_parse_error(tmp_path):
+    """A file that fails to parse is reported in the summary without stopping the other files."""
+    make_workbook(tmp_path / "a.xlsx", 10)
+    (tmp_path / "b.xlsx").write_text("not a workbook")
+
+    summary = add_questions.process_folder(tmp_path, ExcelParser, workers=2)
+
+    assert summary["a.xlsx"] == {"total": 10, "added": 10, "duplicate": 0}
+    assert summary["b.xlsx"] == {"total": 0, "added": 0, "duplicate": 0}
+    assert QuestionManager.count() == 10
+
+
+def test_process_folder_from_batch_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, "OPENAI_CACHE_PATH", tmp_path / "cache.db")
+    folder = tmp_path / "questions"
+    folder.mkdir()
+    make_workbook(folder / "a.xlsx", 40)
+
+    requests_path = tmp_path / "requests.jsonl"
+    # The hybrid parser wouldn't need the LLM for this sheet
+    count = add_questions.write_batch_requests(folder, requests_path, OpenAiParser())
+    assert count == 4
+
+    # Results for all but one request
+    requests = [json.loads(line) for line in requests_path.read_text().splitlines()]
+    results_path = tmp_path / "results.jsonl"
+    results_path.write_text(
+        "\n".join(json.dumps(fake_batch_result(r)) for r in requests[:-1])
+    )
+
+    client = FakeOpenAiClient()
+    parser = partial(OpenAiParser, client=cast(AsyncOpenAI, client))
+    summary = add_questions.process_folder(
+        folder,
+        parser,  # type: ignore[arg-type]
+        workers=1,
+        batch_results=results_path,
+    )
+
+    assert client.rows_sent == 10
+    assert summary["a.xlsx"] == {"total": 40, "added": 40, "duplicate": 0}
+
+
+def test_default_workers():
+    # One rate-limited process for parsers which call the LLM
+    assert add_questions.default_workers(HybridParser) == 1
+    assert add_questions.default_workers(ExcelParser) == (os.cpu_count() or 1)
@@ -0,0 +1,71 @@
+import asyncio
+
+from mcq_bot.senders.fan_out import Throttle, fan_out
+from telethon.errors import FloodWaitError
+
+
+def test_fan_out_bounds_concurrency_and_counts():
+    in_progress = 0
+    max_in_progress = 0
+
+    async def send(user_id: int, throttle: Throttle) -> bool:
+        nonlocal in_progress, max_in_progress
+        if user_id % 3 == 0:
+            return False
+        if user_id % 5 == 0:
+            raise RuntimeError("boom")
+        await throttle()
+        in_progress += 1
+        max_in_progress = max(max_in_progress, in_progress)
+        await asyncio.sleep(0.001)
+        in_progress -= 1
+        return True
+
+    summary = asyncio.run(fan_out(range(1, 31), send, concurrency=4, rate=1000))
+
+    # 10 multiples of 3 skipped, 4 more multiples of 5 failed
+    assert summary == {"sent": 16, "skipped": 10, "failed": 4}
+    assert max_in_progress <= 4
+
+
+def test_fan_out_rate_limit():
+    async def send(user_id: int, throttle: Throttle) -> bool:
+        await throttle()
+        return True
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        summary = await fan_out(range(30), send, concurrency=30, rate=100)
+        return summary, loop.time() - start
+
+    summary, elapsed = asyncio.run(main())
+    assert summary["sent"] == 30
+    # A burst of 100 is allowed, so this shouldn't wait at all
+    assert elapsed < 0.1
+
+    async def slow():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await fan_out(range(120), send, concurrency=30, rate=100)
+        return loop.time() - start
+
+    # 20 more than the burst at 100 per second
+    assert asyncio.run(slow()) >= 0.15
+
+
+def test_fan_out_retries_flood_wait():
+    calls: dict[int, int] = {}
+
+    async def send(user_id: int, throttle: Throttle) -> bool:
+        await throttle()
+        calls[user_id] = calls.get(user_id, 0) + 1
+        if user_id == 0 and calls[user_id] == 1:
+            raise FloodWaitError(request=None, capture=0)
+        if user_id == 1:
+            raise FloodWaitError(request=None, capture=0)
+        return True
+
+    summary = asyncio.run(fan_out(range(3), send, concurrency=2, rate=1000))
+    assert summary == {"sent": 2, "skipped": 0, "failed": 1}
+    assert calls == {0: 2, 1: 3, 2: 1}
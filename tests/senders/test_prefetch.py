@@ -0,0 +1,90 @@
+import asyncio
+from datetime import date
+
+from mcq_bot.benchmark.fake_telegram import FakeClient, use_fake_client
+from mcq_bot.db.query_recorder import record_queries
+from mcq_bot.managers.catalog import CatalogManager
+from mcq_bot.managers.question import QuestionManager
+from mcq_bot.managers.question_pool import question_pool
+from mcq_bot.managers.user import UserManager
+from mcq_bot.senders.prefetch import PrefetchCache, PrefetchedQuestion
+from mcq_bot.senders.send_question import (
+    _prefetch_tasks,
+    prefetch_cache,
+    prefetch_question,
+    send_question,
+)
+from tests.factories import make_rows
+
+_USER_ID = 1
+
+
+def _prefetched(question_id: int, version=(0, 0)) -> PrefetchedQuestion:
+    return PrefetchedQuestion(version, question_id, f"question {question_id}", [])
+
+
+def test_cache_evicts_least_recently_prefetched():
+    cache = PrefetchCache(maxsize=2)
+    cache.put(1, _prefetched(10))
+    cache.put(2, _prefetched(20))
+    cache.put(1, _prefetched(11))
+    cache.put(3, _prefetched(30))
+
+    assert len(cache) == 2
+    assert cache.take(2, (0, 0)) is None
+    assert cache.take(1, (0, 0)) == _prefetched(11)
+    # Taken entries are removed
+    assert cache.take(1, (0, 0)) is None
+
+
+def test_cache_discards_stale_entries():
+    cache = PrefetchCache(maxsize=2)
+    cache.put(1, _prefetched(10, version=(0, 1)))
+
+    assert cache.take(1, (0, 2)) is None
+    assert len(cache) == 0
+
+
+def _setup():
+    QuestionManager.bulk_add(make_rows(5), "test")
+    UserManager.add_user(_USER_ID, date(2100, 1, 1))
+    CatalogManager.reload()
+
+
+def test_send_prefetched_question():
+    _setup()
+
+    async def _test():
+        with use_fake_client(FakeClient()) as client:
+            prefetch_question(_USER_ID)
+            await asyncio.gather(*_prefetch_tasks)
+            prefetched = prefetch_cache.take(_USER_ID, question_pool.version(_USER_ID))
+            assert prefetched
+            prefetch_cache.put(_USER_ID, prefetched)
+
+            with record_queries() as queries:
+                await send_question(_USER_ID)
+            assert not queries
+            assert client.sent[-1].text == prefetched.html
+
+    asyncio.run(_test())
+
+
+def test_prefetched_question_is_discarded_when_eligibility_changes():
+    _setup()
+
+    async def _test():
+        with use_fake_client(FakeClient()):
+            prefetch_question(_USER_ID)
+            await asyncio.gather(*_prefetch_tasks)
+            prefetched = prefetch_cache.take(_USER_ID, question_pool.version(_USER_ID))
+            assert prefetched
+            prefetch_cache.put(_USER_ID, prefetched)
+
+            # e.g. answered correctly from an older message
+            question_pool.discard(_USER_ID, prefetched.question_id)
+            assert (
+                prefetch_cache.take(_USER_ID, question_pool.version(_USER_ID)) is None
+            )
+
+    asyncio.run(_test())
@@ -0,0 +1,38 @@
+from mcq_bot.senders.sender_types import (
+    AnswerCallback,
+    decode_answer_callback,
+    decode_next_question,
+    encode_next_question,
+)
+
+# Telegram user ids are up to 52 bits
+_USER_ID = 2**52 - 1
+
+
+def test_answer_callback_round_trip():
+    callback = AnswerCallback(user_id=_USER_ID, answer_id=2**32 - 1, question_id=123)
+    data = callback.encode()
+    assert len(data) <= 64
+    assert decode_answer_callback(data) == callback
+    assert decode_next_question(data) is None
+
+
+def test_next_question_round_trip():
+    data = encode_next_question(_USER_ID)
+    assert decode_next_question(data) == _USER_ID
+    assert decode_answer_callback(data) is None
+
+
+def test_legacy_payloads():
+    legacy_answer = b'{"user_id":1,"answer_id":2,"question_id":3}'
+    assert decode_answer_callback(legacy_answer) == AnswerCallback(1, 2, 3)
+    assert decode_next_question(legacy_answer) is None
+
+    assert decode_next_question(b"12345") == 12345
+    assert decode_answer_callback(b"12345") is None
+
+
+def test_invalid_payloads():
+    for data in (None, b"", b"\x01\x00", b"{not json", b"\xff" * 10):
+        assert decode_answer_callback(data) is None
+        assert decode_next_question(data) is None
@@ -0,0 +1,25 @@
+import asyncio
+import os
+import signal
+
+from mcq_bot.main import _disconnect_on_signals
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.disconnected = asyncio.Event()
+
+    async def disconnect(self):
+        self.disconnected.set()
+
+
+def test_sigterm_disconnects_client():
+    """So `docker stop` lets `main` write the queued attempts before exiting."""
+
+    async def _test():
+        client = _Client()
+        _disconnect_on_signals(client)  # type: ignore[arg-type]
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(client.disconnected.wait(), 1)
+
+    asyncio.run(_test())
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+
+from mcq_bot.managers.schedule import ScheduleManager, UserSchedule
+from mcq_bot.managers.user import UserManager
+from mcq_bot.schedule_job import (
+    RETRY_DELAY,
+    NudgeScheduler,
+    last_nudge_dt,
+    next_nudge_dt,
+)
+from mcq_bot.settings import Settings
+from sqlalchemy.exc import OperationalError
+
+_UTC = timezone.utc
+_USER_ID = 1
+
+
+def test_next_nudge_dt():
+    times = [time(7), time(21)]
+    after = datetime(2024, 1, 1, 0, 0, tzinfo=_UTC)  # 08:00 in Singapore
+
+    assert next_nudge_dt(times, "Asia/Singapore", after) == datetime(
+        2024, 1, 1, 13, 0, tzinfo=_UTC
+    )
+    assert next_nudge_dt(times, "Europe/London", after) == datetime(
+        2024, 1, 1, 7, 0, tzinfo=_UTC
+    )
+    # Strictly after
+    assert next_nudge_dt(times, "UTC", datetime(2024, 1, 1, 21, tzinfo=_UTC)) == (
+        datetime(2024, 1, 2, 7, tzinfo=_UTC)
+    )
+    assert next_nudge_dt([], "UTC", after) is None
+
+
+def test_last_nudge_dt():
+    times = [time(7), time(21)]
+    before = datetime(2024, 1, 1, 0, 0, tzinfo=_UTC)  # 08:00 in Singapore
+
+    assert last_nudge_dt(times, "Asia/Singapore", before) == datetime(
+        2023, 12, 31, 23, 0, tzinfo=_UTC
+    )
+    assert last_nudge_dt(times, "Europe/London", before) == datetime(
+        2023, 12, 31, 21, 0, tzinfo=_UTC
+    )
+    # Inclusive
+    assert last_nudge_dt(times, "UTC", datetime(2024, 1, 1, 21, tzinfo=_UTC)) == (
+        datetime(2024, 1, 1, 21, tzinfo=_UTC)
+    )
+    assert last_nudge_dt([], "UTC", before) is None
+
+
+def _schedule(last_nudge_dt: datetime | None) -> UserSchedule:
+    return UserSchedule(_USER_ID, [time(7)], "UTC", last_nudge_dt)
+
+
+def test_missed_nudge_runs_on_startup():
+    now = datetime(2024, 1, 2, 8, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(now - timedelta(days=1)), now)
+    assert scheduler._pop_due(now) == [_USER_ID]
+
+
+def test_long_missed_nudge_is_skipped_on_startup():
+    now = datetime(2024, 1, 2, 18, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(now - timedelta(days=1)), now)
+    assert scheduler._pop_due(now) == []
+    assert scheduler._next[_USER_ID] == datetime(2024, 1, 3, 7, tzinfo=_UTC)
+
+
+def test_missed_nudge_runs_after_long_downtime():
+    """The nudge due just before startup is caught up on, even if the bot was down for days."""
+    now = datetime(2024, 1, 10, 8, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(now - timedelta(days=5)), now)
+    assert scheduler._pop_due(now) == [_USER_ID]
+
+
+def test_nudge_already_sent_is_not_repeated_on_startup():
+    now = datetime(2024, 1, 2, 8, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(datetime(2024, 1, 2, 7, tzinfo=_UTC)), now)
+    assert scheduler._pop_due(now) == []
+    assert scheduler._next[_USER_ID] == datetime(2024, 1, 3, 7, tzinfo=_UTC)
+
+
+def test_due_users_are_retried_after_db_error(monkeypatch):
+    """Users taken off the heap aren't lost if looking up their schedules fails."""
+    now = datetime(2024, 1, 2, 8, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(now - timedelta(days=1)), now)
+
+    def _locked(*args):
+        raise OperationalError("SELECT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(ScheduleManager, "get_scheduled", _locked)
+    with pytest.raises(OperationalError):
+        asyncio.run(scheduler._run_due(now))
+
+    assert scheduler._pop_due(now) == []
+    assert scheduler._pop_due(now + RETRY_DELAY) == [_USER_ID]
+
+
+def test_new_user_is_not_nudged_on_startup():
+    now = datetime(2024, 1, 2, 8, tzinfo=_UTC)
+    scheduler = NudgeScheduler()
+    scheduler._schedule_on_startup(_schedule(None), now)
+    assert scheduler._pop_due(now) == []
+
+
+def test_schedule_manager():
+    UserManager.add_user(_USER_ID, date.today() + timedelta(days=10))
+
+    schedule = ScheduleManager.get(_USER_ID)
+    assert schedule == UserSchedule(
+        _USER_ID, Settings.DAILY_NUDGE_TIMES, Settings.TZ, None
+    )
+
+    ScheduleManager.set_times(_USER_ID, [time(6, 30), time(20)])
+    ScheduleManager.set_tz(_USER_ID, "Europe/London")
+    nudge_dt = datetime(2024, 1, 1, 6, 30, tzinfo=_UTC)
+    ScheduleManager.mark_nudged([_USER_ID], nudge_dt)
+
+    assert ScheduleManager.get_scheduled() == [
+        UserSchedule(_USER_ID, [time(6, 30), time(20)], "Europe/London", nudge_dt)
+    ]
+
+
+def test_exam_over_is_not_scheduled():
+    UserManager.add_user(_USER_ID, date.today() - timedelta(days=1))
+    assert ScheduleManager.get_scheduled() == []
+    assert ScheduleManager.get(_USER_ID) is not None
@@ -1,7 +1,15 @@
-from mcq_bot.utils.message import extract_command_content
+from mcq_bot.utils.message import extract_command_content, paginate
 
 
 def test_extract_command_content():
     text = "/start my extracted text"
     assert extract_command_content(text) == "my extracted text"
     assert extract_command_content("/emptycommand") is None
+
+
+def test_paginate():
+    entries = ["a" * 4, "b" * 4, "c" * 4]
+    assert paginate(entries, sep="\n", limit=9) == ["aaaa\nbbbb", "cccc"]
+    assert paginate(entries, sep="\n", limit=100) == ["aaaa\nbbbb\ncccc"]
+    assert paginate(["a" * 10], limit=4) == ["aaaa", "aaaa", "aa"]
+    assert paginate([]) == []
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from mcq_bot.handlers.register import timed
+from mcq_bot.utils.metrics import (
+    HANDLER_ERRORS,
+    HANDLER_SECONDS,
+    Counter,
+    Histogram,
+    serve_metrics,
+)
+from telethon.events import StopPropagation
+
+
+def test_histogram_render():
+    histogram = Histogram("latency_seconds", "Latency.", ("name",), buckets=(0.1, 1))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{name="a",le="0.1"} 1',
+        'latency_seconds_bucket{name="a",le="1"} 2',
+        'latency_seconds_bucket{name="a",le="+Inf"} 3',
+        'latency_seconds_sum{name="a"} 5.55',
+        'latency_seconds_count{name="a"} 3',
+    ]
+
+
+def test_histogram_quantile():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.25) == 1
+    assert histogram.quantile(0.5) == 1.5
+    assert histogram.quantile(1) == 4
+    assert Histogram("empty", "Empty.").quantile(0.5) == 0
+
+
+def test_counter_escapes_labels():
+    counter = Counter("calls_total", "Calls.", ("call",))
+    counter.inc(2, 'say "hi"')
+
+    assert counter.render()[-1] == 'calls_total{call="say \\"hi\\""} 2'
+
+
+def test_timed_handler():
+    async def handle_ok(event):
+        raise StopPropagation
+
+    async def handle_error(event):
+        raise ValueError
+
+    ok_count = HANDLER_SECONDS.count("handle_ok")
+    error_count = HANDLER_ERRORS.value("handle_error")
+
+    with pytest.raises(StopPropagation):
+        asyncio.run(timed(handle_ok)(None))
+    with pytest.raises(ValueError):
+        asyncio.run(timed(handle_error)(None))
+
+    assert HANDLER_SECONDS.count("handle_ok") == ok_count + 1
+    assert HANDLER_ERRORS.value("handle_ok") == 0
+    assert HANDLER_ERRORS.value("handle_error") == error_count + 1
+
+
+def test_serve_metrics():
+    HANDLER_SECONDS.observe(0.01, "handle_served")
+
+    async def get(path: str) -> bytes:
+        server = await serve_metrics("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+    response = asyncio.run(get("/metrics"))
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert b'mcq_bot_handler_seconds_count{handler="handle_served"} 1' in response
+
+    assert asyncio.run(get("/other")).startswith(b"HTTP/1.1 404")
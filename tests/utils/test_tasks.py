@@ -0,0 +1,37 @@
+import asyncio
+import logging
+
+from mcq_bot.utils import tasks
+from mcq_bot.utils.tasks import log_exception
+
+
+class _Records(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+
+def test_log_exception():
+    async def _fail():
+        raise ValueError("boom")
+
+    async def _test():
+        task = asyncio.create_task(_fail(), name="failing")
+        task.add_done_callback(log_exception)
+        await asyncio.wait([task])
+        # Callbacks run on the next loop iteration
+        await asyncio.sleep(0)
+
+    handler = _Records()
+    tasks._logger.addHandler(handler)
+    try:
+        asyncio.run(_test())
+    finally:
+        tasks._logger.removeHandler(handler)
+
+    [record] = handler.records
+    assert record.getMessage() == "Background task failing failed"
+    assert record.exc_info and isinstance(record.exc_info[1], ValueError)